@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+"""
+Heater output drivers.
+
+pid_control_loop only talks to the Actuator interface (set_duty/off/close); which backend
+switches the SSR is a config choice:
+
+    time_proportioning - (default) one on-pulse per window of `heater_window` seconds, its
+                         length quantized to mains half-cycles. A zero-cross SSR can only
+                         switch on half-cycle boundaries anyway, so this is the finest
+                         resolution the heater can actually deliver, with two pin writes
+                         per window instead of RPi.GPIO's 100 Hz software PWM thread.
+    software_pwm       - RPi.GPIO software PWM at `pwm_frequency` Hz (the original driver).
+    hardware_pwm       - the kernel PWM peripheral via sysfs, with the window as its period.
+                         Needs the SSR on a PWM-capable pin (GPIO 12/13/18/19) and the
+                         pwm overlay enabled.
+    pigpio             - time proportioning as a DMA-timed pigpio waveform (needs pigpiod).
+
+Run `python actuators.py --bench` to measure the time-proportioning driver's CPU use and
+output resolution against a recording pin, without a Pi.
+"""
+import argparse
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+log = logging.getLogger(__name__)
+
+DRIVERS = ("time_proportioning", "software_pwm", "hardware_pwm", "pigpio")
+
+
+def clamp_duty(duty):
+    return max(0.0, min(100.0, float(duty)))
+
+
+class Actuator:
+    """The interface the control loop drives. `duty` is the last commanded duty in percent."""
+
+    duty = 0.0
+
+    def set_duty(self, duty):
+        raise NotImplementedError
+
+    def off(self):
+        self.set_duty(0)
+
+    def close(self):
+        self.off()
+
+
+class HalfCycleQuantizer:
+    """Converts a duty to a whole number of mains half-cycles per window."""
+
+    def __init__(self, window=1.0, mains_hz=60.0):
+        self.window = float(window)
+        self.half_cycle = 1.0 / (2.0 * mains_hz)
+        self.steps = max(1, int(round(self.window / self.half_cycle)))
+
+    @property
+    def resolution(self):
+        """Smallest duty step in percent."""
+        return 100.0 / self.steps
+
+    def on_steps(self, duty):
+        return int(round(clamp_duty(duty) / 100.0 * self.steps))
+
+    def on_time(self, duty):
+        return self.on_steps(duty) * self.half_cycle
+
+
+# -------------------------
+# Backends
+# -------------------------
+def gpio_writer(pin):
+    """Sets `pin` up as an RPi.GPIO output (BCM numbering) and returns write(level)."""
+    import RPi.GPIO as GPIO
+    GPIO.setwarnings(False)
+    GPIO.setmode(GPIO.BCM)
+    GPIO.setup(pin, GPIO.OUT, initial=GPIO.LOW)
+
+    def write(level):
+        GPIO.output(pin, GPIO.HIGH if level else GPIO.LOW)
+
+    return write
+
+
+class ProportioningGroup:
+    """
+    The thread behind TimeProportioning. One group can drive any number of outputs with the
+    same window (e.g. the heaters of several ovens): at the start of each window it raises
+    every output with a non-zero duty, then drops each one after its on-time, so it wakes at
+    most once per output plus once per window.
+    """
+
+    def __init__(self, window=1.0):
+        self.window = float(window)
+        self._outputs = []
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread = None
+
+    def add(self, output):
+        self._outputs = self._outputs + [output]
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def remove(self, output):
+        self._outputs = [o for o in self._outputs if o is not output]
+
+    def _sleep_until(self, deadline):
+        remaining = deadline - time.monotonic()
+        if remaining > 0:
+            self._wake.wait(remaining)
+
+    def _run(self):
+        window_start = time.monotonic()
+        while not self._stopping:
+            pulse_ends = []
+            for output in self._outputs:
+                on_steps = output._start_window()
+                if 0 < on_steps < output.quantizer.steps:
+                    pulse_ends.append((window_start + on_steps * output.quantizer.half_cycle, output))
+            pulse_ends.sort(key=lambda end: end[0])
+            for deadline, output in pulse_ends:
+                self._sleep_until(deadline)
+                output._end_pulse()
+            window_start += self.window
+            now = time.monotonic()
+            if now - window_start > self.window:
+                # Stalled for more than a window; start a fresh one rather than bursting.
+                window_start = now
+            self._sleep_until(window_start)
+
+    def close(self):
+        self._stopping = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2 * self.window)
+
+
+class TimeProportioning(Actuator):
+    """
+    Drives a pin high for duty% of each window, in whole mains half-cycles.
+
+    A ProportioningGroup thread raises the pin at the start of each window and drops it
+    after the on-time, so it wakes at most twice per window. Duty changes take effect at
+    the next window; off() and close() drop the pin immediately.
+    """
+
+    def __init__(self, write, window=1.0, mains_hz=60.0, group=None):
+        """
+        Args:
+            write (callable): write(level) drives the SSR pin; see gpio_writer().
+            window (float): Window length in seconds (ignored with `group`, which sets it).
+            mains_hz (float): Mains frequency; on-times are whole half-cycles of it.
+            group (ProportioningGroup): Shared thread to run on; by default the output gets
+                a group (and thread) of its own.
+        """
+        self.write = write
+        self.quantizer = HalfCycleQuantizer(group.window if group is not None else window, mains_hz)
+        self.window = self.quantizer.window
+        self.duty = 0.0
+        self.switches = 0
+        self._on_steps = 0
+        self._level = False
+        self._lock = threading.Lock()
+        self.write(False)
+        self._own_group = group is None
+        self.group = ProportioningGroup(self.window) if group is None else group
+        self.group.add(self)
+
+    @property
+    def resolution(self):
+        return self.quantizer.resolution
+
+    def _set_level(self, level):
+        if level != self._level:
+            self.write(level)
+            self._level = level
+            self.switches += 1
+
+    def set_duty(self, duty):
+        self.duty = clamp_duty(duty)
+        self._on_steps = self.quantizer.on_steps(self.duty)
+
+    def off(self):
+        with self._lock:
+            self.duty = 0.0
+            self._on_steps = 0
+            self._set_level(False)
+
+    def _start_window(self):
+        """Called by the group at the start of each window; returns this window's on-steps."""
+        with self._lock:
+            on_steps = self._on_steps
+            self._set_level(on_steps > 0)
+        return on_steps
+
+    def _end_pulse(self):
+        with self._lock:
+            self._set_level(False)
+
+    def close(self):
+        self.group.remove(self)
+        if self._own_group:
+            self.group.close()
+        self.off()
+
+
+class SoftwarePWM(Actuator):
+    """RPi.GPIO software PWM on `pin` (the original 100 Hz driver)."""
+
+    def __init__(self, pin, frequency=100):
+        import RPi.GPIO as GPIO
+        gpio_writer(pin)
+        self._pwm = GPIO.PWM(pin, frequency)
+        self._pwm.start(0)
+
+    def set_duty(self, duty):
+        self.duty = clamp_duty(duty)
+        self._pwm.ChangeDutyCycle(self.duty)
+
+    def close(self):
+        self.off()
+        self._pwm.stop()
+
+
+class HardwarePWM(Actuator):
+    """
+    Kernel PWM channel (/sys/class/pwm) with a period of one window, so the peripheral does
+    the time proportioning in hardware. Duty is still quantized to mains half-cycles.
+    """
+
+    def __init__(self, chip=0, channel=0, window=1.0, mains_hz=60.0):
+        self.quantizer = HalfCycleQuantizer(window, mains_hz)
+        chip_path = f"/sys/class/pwm/pwmchip{chip}"
+        self.path = f"{chip_path}/pwm{channel}"
+        if not os.path.isdir(self.path):
+            self._write(f"{chip_path}/export", channel)
+            # udev fixes up permissions on the new channel asynchronously.
+            deadline = time.monotonic() + 1.0
+            while not os.access(f"{self.path}/enable", os.W_OK) and time.monotonic() < deadline:
+                time.sleep(0.05)
+        self.period_ns = int(self.quantizer.window * 1e9)
+        self._write(f"{self.path}/duty_cycle", 0)
+        self._write(f"{self.path}/period", self.period_ns)
+        self._write(f"{self.path}/enable", 1)
+
+    @staticmethod
+    def _write(path, value):
+        with open(path, "w") as f:
+            f.write(str(value))
+
+    def set_duty(self, duty):
+        self.duty = clamp_duty(duty)
+        on_ns = int(self.quantizer.on_time(self.duty) * 1e9)
+        self._write(f"{self.path}/duty_cycle", min(on_ns, self.period_ns))
+
+    def close(self):
+        self.off()
+        self._write(f"{self.path}/enable", 0)
+
+
+class PigpioTimeProportioning(Actuator):
+    """
+    Time proportioning as a repeating pigpio waveform: the on/off pulse pair is timed by DMA,
+    so no Python thread runs per window. A new duty switches over at the end of the current
+    window (WAVE_MODE_REPEAT_SYNC).
+    """
+
+    def __init__(self, pin, window=1.0, mains_hz=60.0, host=None):
+        import pigpio
+        self.pigpio = pigpio
+        self.pin = pin
+        self.quantizer = HalfCycleQuantizer(window, mains_hz)
+        self.pi = pigpio.pi(host) if host else pigpio.pi()
+        if not self.pi.connected:
+            raise OSError("pigpio daemon is not running")
+        self.pi.set_mode(pin, pigpio.OUTPUT)
+        self.pi.write(pin, 0)
+        self._steps = 0
+        self._wave = None
+        self._retired = []  # (wave id, time it stopped being sent)
+
+    def _stop_wave(self):
+        if self._wave is not None:
+            self.pi.wave_tx_stop()
+            self._retired.append((self._wave, 0.0))
+            self._wave = None
+
+    def _delete_retired(self):
+        # A retired wave may still be finishing its last window; only delete it after that.
+        now = time.monotonic()
+        keep = []
+        for wave, retired_at in self._retired:
+            if now - retired_at > self.quantizer.window:
+                self.pi.wave_delete(wave)
+            else:
+                keep.append((wave, retired_at))
+        self._retired = keep
+
+    def set_duty(self, duty):
+        self.duty = clamp_duty(duty)
+        steps = self.quantizer.on_steps(self.duty)
+        if steps == self._steps:
+            return
+        self._steps = steps
+        self._delete_retired()
+        if steps == 0 or steps == self.quantizer.steps:
+            self._stop_wave()
+            self.pi.write(self.pin, 1 if steps else 0)
+            return
+        on_us = int(steps * self.quantizer.half_cycle * 1e6)
+        off_us = int(self.quantizer.window * 1e6) - on_us
+        mask = 1 << self.pin
+        self.pi.wave_add_generic([self.pigpio.pulse(mask, 0, on_us), self.pigpio.pulse(0, mask, off_us)])
+        wave = self.pi.wave_create()
+        self.pi.wave_send_using_mode(wave, self.pigpio.WAVE_MODE_REPEAT_SYNC)
+        if self._wave is not None:
+            self._retired.append((self._wave, time.monotonic()))
+        self._wave = wave
+
+    def close(self):
+        self._stop_wave()
+        self.pi.write(self.pin, 0)
+        self._steps = 0
+        self.duty = 0.0
+        for wave, _ in self._retired:
+            self.pi.wave_delete(wave)
+        self._retired = []
+        self.pi.stop()
+
+
+def create_heater(driver, pin, window=1.0, mains_hz=60.0, pwm_frequency=100, pwm_chip=0, pwm_channel=0,
+                  group=None):
+    """
+    Builds the configured backend (one of DRIVERS) for the SSR on `pin`. Time-proportioning
+    heaters run on `group` if one is given, so several heaters share one thread.
+    """
+    if driver == "time_proportioning":
+        return TimeProportioning(gpio_writer(pin), window, mains_hz, group=group)
+    if driver == "software_pwm":
+        return SoftwarePWM(pin, pwm_frequency)
+    if driver == "hardware_pwm":
+        return HardwarePWM(pwm_chip, pwm_channel, window, mains_hz)
+    if driver == "pigpio":
+        return PigpioTimeProportioning(pin, window, mains_hz)
+    raise ValueError(f"Unknown heater driver {driver!r}; expected one of {DRIVERS}")
+
+
+# -------------------------
+# Fakes for testing and benchmarking
+# -------------------------
+class RecordingPin:
+    """Stands in for a GPIO pin: records every level change as (monotonic time, level)."""
+
+    def __init__(self, size=100000):
+        self.transitions = deque(maxlen=size)
+
+    def __call__(self, level):
+        self.transitions.append((time.monotonic(), bool(level)))
+
+    def on_fraction(self, start, end):
+        """Fraction of [start, end] the pin was high."""
+        high = 0.0
+        level, since = False, start
+        for t, new_level in self.transitions:
+            if t <= start:
+                level = new_level
+                continue
+            if t >= end:
+                break
+            if level:
+                high += t - since
+            level, since = new_level, t
+        if level:
+            high += end - since
+        return high / (end - start)
+
+
+class RecordingActuator(Actuator):
+    """Records every commanded duty as (time, duty) instead of driving anything."""
+
+    def __init__(self, clock=time, size=100000):
+        self.clock = clock
+        self.history = deque(maxlen=size)
+
+    def set_duty(self, duty):
+        self.duty = clamp_duty(duty)
+        self.history.append((self.clock.time(), self.duty))
+
+
+def benchmark(window=0.25, windows=8, duties=(0.3, 12.5, 33.3, 50.0, 99.7), mains_hz=60.0):
+    """
+    Runs TimeProportioning against a RecordingPin for `windows` windows per duty.
+
+    Returns:
+        list of dict: requested and delivered duty, switches per window and the process CPU
+        time spent per second of output.
+    """
+    results = []
+    for duty in duties:
+        pin = RecordingPin()
+        heater = TimeProportioning(pin, window, mains_hz)
+        heater.set_duty(duty)
+        # Let the first window (started at duty 0) pass, then measure whole windows.
+        time.sleep(window * 1.05)
+        switches_before = heater.switches
+        cpu_start, start = time.process_time(), time.monotonic()
+        time.sleep(window * windows)
+        cpu, end = time.process_time() - cpu_start, time.monotonic()
+        heater.close()
+        results.append({
+            "requested": duty,
+            "delivered": round(100.0 * pin.on_fraction(start, end), 2),
+            "quantized": round(heater.quantizer.on_steps(duty) * heater.resolution, 2),
+            "switches_per_window": (heater.switches - switches_before) / windows,
+            "cpu_per_second": cpu / (end - start),
+        })
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the time-proportioning heater driver.")
+    parser.add_argument("--bench", action="store_true", required=True)
+    parser.add_argument("--window", type=float, default=0.25, help="window length in seconds")
+    parser.add_argument("--windows", type=int, default=8, help="windows measured per duty")
+    parser.add_argument("--mains-hz", type=float, default=60.0)
+    args = parser.parse_args()
+    quantizer = HalfCycleQuantizer(args.window, args.mains_hz)
+    print(f"Window {args.window} s = {quantizer.steps} half-cycles; resolution {quantizer.resolution:.2f}%")
+    for r in benchmark(args.window, args.windows, mains_hz=args.mains_hz):
+        print(f"requested {r['requested']:6.2f}%  quantized {r['quantized']:6.2f}%  delivered {r['delivered']:6.2f}%  "
+              f"switches/window {r['switches_per_window']:.1f}  CPU {100 * r['cpu_per_second']:.3f}%")
@@ -1,555 +1,1215 @@
+import time
+IMPORT_START = time.perf_counter()  # Start of the cold-start time reported by serve()
+
 import os
 # Do not force the use of /dev/mem so that RPi.GPIO uses /dev/gpiomem.
 # os.environ["GPIO_USE_DEV_MEM"] = "1"
 
-from flask import Flask, render_template, request, jsonify
+from flask import Blueprint, Flask, Response, abort, g, render_template, request, jsonify
+import atexit
 import json
-import time
+import logging
+import math
+import signal
+import sqlite3
 import threading
-from datetime import datetime, timedelta
-from temperature_sensor import read_temperature  # Your sensor reading function
-from db import get_db, init_db  # Database helper functions
+from datetime import datetime
+import temperature_sensor
+from temperature_sensor import read_sensor  # Your sensor reading function
+from db import init_db, read_db, ReadingWriter  # Database helper functions
+from sensor_sampler import SamplerGroup
+from config_store import ConfigStore
+from oven import DEFAULT_OVEN_ID, PID_TIMINGS, OvenController, load_oven_settings, oven_probes, sample_event
+import rollups
+import http_cache
+import profiles
+from metrics import REGISTRY
+import actuators
 import sys
+from jobs import JobConflict, JobRunner
+import oven_sim
 
-# Import the PID auto-tune algorithm
-from pid_autotune import auto_tune_pid
+# NumPy and the modules built on it (cycle_archive, downsample, replay, pid_autotune) are
+# imported by the routes that use them, and spidev/RPi.GPIO when the hardware is first
+# touched, so none of them is on the path to serving the first page.
 
 app = Flask(__name__)
+log = logging.getLogger("pcoven")
 
-CONFIG_FILE = "config.json"
-
-
-def load_config():
-    if os.path.exists(CONFIG_FILE):
-        with open(CONFIG_FILE, "r") as f:
-            config = json.load(f)
-            # Ensure calibration keys exist
-            if "calibration_offset" not in config:
-                config["calibration_offset"] = 0.0
-            if "calibration_scale" not in config:
-                config["calibration_scale"] = 1.0
-            return config
-    return {
-        "temp_offset": 0.0,
-        "pid_tunings": [1.0, 0.1, 0.05],
-        "target_temperature": 350,
-        "oven_on": False,
-        "light_on": False,
-        "timer_running": False,
-        "time_remaining": 0,
-        "calibration_offset": 0.0,
-        "calibration_scale": 1.0
-    }
-
-
-def save_config(config):
-    with open(CONFIG_FILE, "w") as f:
-        json.dump(config, f, indent=4)
+# With PCOVEN_SIMULATE set, the sensors, heaters and clock all come from the oven simulator,
+# and `clock` may run faster than real time. Every control/logging loop sleeps on `clock`.
+# Both are set by create_app().
+simulation = None
+clock = time
 
+CONFIG_FILE = "config.json"
 
-config = load_config()
 
-# Initialize the database at startup.
-init_db()
+DEFAULT_CONFIG = {
+    "temp_offset": 0.0,
+    "pid_tunings": [1.0, 0.1, 0.05],
+    "target_temperature": 350,
+    "oven_on": False,
+    "light_on": False,
+    "timer_running": False,
+    "time_remaining": 0,
+    "timer_deadline": None,
+    "calibration_offset": 0.0,
+    "calibration_scale": 1.0,
+    "sample_interval": 0.5,
+    "sample_buffer_size": 1200,
+    "sensor_oversample": 1,
+    "sensor_reduce": "median",
+    "db_batch_size": 12,
+    "db_flush_interval": 30,
+    "config_save_debounce": 5,
+    "summary_band": 10.0,
+    "max_cycles": 1000,
+    "pid_period": 1.0,
+    "pid_overrun": "skip",
+    "heater_driver": "time_proportioning",
+    "heater_window": 1.0,
+    "mains_hz": 60,
+    "server": "waitress",
+    "server_threads": 16
+}
 
-# Global variables for PWM and GPIO pins
-pwm = None
-SSR_PIN = 17  # GPIO pin for SSR control
-LIGHT_PIN = 27  # GPIO pin for light control
 
+def load_config():
+    config = ConfigStore(CONFIG_FILE, DEFAULT_CONFIG)
+    config.debounce = config.get("config_save_debounce", 5)
+    # Ensure calibration keys exist
+    if "calibration_offset" not in config:
+        config["calibration_offset"] = 0.0
+    if "calibration_scale" not in config:
+        config["calibration_scale"] = 1.0
+    return config
+
+
+def save_config(config, immediate=False):
+    """
+    Persists the config. Routine changes are debounced; pass immediate=True for
+    safety-relevant transitions (oven on/off) that must survive a power loss.
+    """
+    config.save(immediate=immediate)
+
+
+def configure_logging():
+    # Per-iteration messages (logger, PID loop, history polls, sensor faults) are logged at
+    # DEBUG, so they stay out of the journal unless PCOVEN_LOG_LEVEL=DEBUG.
+    logging.basicConfig(level=os.environ.get("PCOVEN_LOG_LEVEL", "INFO").upper(),
+                        format="%(levelname)s %(name)s: %(message)s")
+    if not log.isEnabledFor(logging.DEBUG):
+        # Werkzeug logs every request at INFO, i.e. every poll from every browser.
+        logging.getLogger("werkzeug").setLevel(logging.WARNING)
+
+
+config = None  # The ConfigStore, loaded by create_app()
+# Single long-lived write connection shared by every oven; readings are batched in memory
+# between flushes. Created by create_app().
+writer = None
 
 # -------------------------
-# Function to Initialize GPIO using RPi.GPIO
+# Ovens (see oven.py)
 # -------------------------
-def init_gpio():
-    global pwm
-    if sys.platform.startswith("linux"):
-        try:
-            import RPi.GPIO as GPIO
-            GPIO.setwarnings(False)
-            GPIO.setmode(GPIO.BCM)
-            # Setup SSR control pin
-            GPIO.setup(SSR_PIN, GPIO.OUT)
-            pwm = GPIO.PWM(SSR_PIN, 100)
-            pwm.start(0)  # Start with 0% duty cycle (heater off)
-            # Setup Light control pin
-            GPIO.setup(LIGHT_PIN, GPIO.OUT)
-            GPIO.output(LIGHT_PIN, GPIO.LOW)  # Light off by default
-            print("GPIO initialized successfully.")
-        except Exception as e:
-            print("Error setting up GPIO:", e)
-            pwm = None
-    else:
-        pwm = None
-
+ovens = {}  # Oven id -> OvenController, in configuration order
+simulations = {}  # Oven id -> oven_sim.Simulation, when simulating
+
+
+def count_sample(oven, sample):
+    REGISTRY.counter("pcoven_sensor_samples_total", "Sensor samples taken.", oven=str(oven.id)).inc()
+    if sample.fault is not None:
+        REGISTRY.counter("pcoven_sensor_faults_total", "Sensor reads that returned a fault, by fault.",
+                         oven=str(oven.id), fault=sample.fault).inc()
+    if oven.probe_names and sample.probes is not None:
+        for name, reading in zip(oven.probe_names, sample.probes):
+            if reading.fault is not None:
+                REGISTRY.counter("pcoven_probe_faults_total", "Faulted reads of each probe of multi-probe ovens.",
+                                 oven=str(oven.id), probe=name, fault=reading.fault).inc()
+
+
+def oven_sensor(oven_id, settings):
+    """
+    Returns (read function, probe names) for an oven's thermocouple, its ProbeArray (probe
+    names given) or its simulated oven.
+    """
+    probes = oven_probes(settings)
+    oversample = settings.get("sensor_oversample", 1)
+    reduce = settings.get("sensor_reduce", "median")
+    if simulation is not None:
+        sim = simulations[oven_id] = simulation if not simulations else simulation.add_oven()
+        if probes is None:
+            return sim.read_sensor, None
+        array = temperature_sensor.open_probe_array(probes, settings["probe_fusion"], sim.spi_factory)
+        return array.read, array.names
+    if probes is not None:
+        array = temperature_sensor.open_probe_array(probes, settings["probe_fusion"], oversample=oversample,
+                                                    reduce=reduce)
+        return array.read, array.names
+    device = temperature_sensor.open_sensor(settings["spi_bus"], settings["spi_device"], oversample, reduce)
+    return (lambda: read_sensor(device)), None
+
+
+def probe_temperature(oven, index):
+    sample = oven.sampler.latest()
+    return sample.probes[index].temperature if sample is not None and sample.probes else None
+
+
+def add_oven(oven_id, settings):
+    read, probe_names = oven_sensor(oven_id, settings)
+    oven = OvenController(oven_id, settings, read, writer, clock=clock, on_sample=count_sample,
+                          on_cycle_end=lambda oven, cycle_id: purge_old_cycles(), probe_names=probe_names)
+    ovens[oven_id] = oven
+    labels = {"oven": str(oven_id)}
+    for i, name in enumerate(probe_names or []):
+        REGISTRY.gauge("pcoven_probe_temperature_degrees", "Latest calibrated temperature of each probe (°F).",
+                       fn=lambda i=i: probe_temperature(oven, i), oven=str(oven_id), probe=name)
+    REGISTRY.register("pcoven_sensor_read_seconds", "Time per sensor read, including oversampling.",
+                      oven.sampler.read_latency, **labels)
+    for name in PID_TIMINGS:
+        REGISTRY.register("pcoven_pid_loop_seconds", "Control loop timings: phases of each iteration, "
+                          "wake-up lateness and the actual period.", oven.timing[name], timing=name, **labels)
+    REGISTRY.counter("pcoven_pid_missed_deadlines_total", "Control loop deadlines skipped or run late.",
+                     fn=lambda: oven.scheduler.missed if oven.scheduler else 0, **labels)
+    REGISTRY.counter("pcoven_heater_switches_total", "SSR on/off transitions made by the heater driver.",
+                     fn=lambda: getattr(oven.heater, "switches", 0), **labels)
+    REGISTRY.gauge("pcoven_pid_duty_percent", "Heater duty cycle set by the controller.",
+                   fn=lambda: oven.current_duty, **labels)
+    REGISTRY.gauge("pcoven_pid_error_degrees", "Setpoint minus temperature at the last PID step (°F).",
+                   fn=lambda: oven.last_error, **labels)
+    REGISTRY.gauge("pcoven_pid_integral", "PID integral term state.", fn=lambda: oven.integral, **labels)
+    REGISTRY.gauge("pcoven_oven_on", "1 while the oven is on.", fn=lambda: int(oven.on), **labels)
+    REGISTRY.gauge("pcoven_setpoint_degrees", "Target temperature (°F).",
+                   fn=lambda: oven.settings["target_temperature"], **labels)
+    REGISTRY.gauge("pcoven_temperature_degrees", "Latest calibrated temperature (°F).",
+                   fn=oven.temperature, **labels)
+    REGISTRY.gauge("pcoven_sse_clients", "Connected server-sent event streams.",
+                   fn=oven.broker.subscriber_count, **labels)
+    return oven
+
+
+default_oven = None  # ovens[DEFAULT_OVEN_ID]
 
 # -------------------------
-# Calibration Helper Function
+# Shared Sensor Sampler (the only code that reads the sensors; one thread for all ovens)
 # -------------------------
-def get_calibrated_temperature():
-    raw = read_temperature()
-    offset = config.get("calibration_offset", 0.0)
-    scale = config.get("calibration_scale", 1.0)
-    return (raw - offset) / scale
-
+sampler_group = None
 
 # -------------------------
-# Cycle Management Functions
+# Heater actuators (see actuators.py) and GPIO pins
 # -------------------------
-current_cycle_id = None
+heater_group = None  # actuators.ProportioningGroup shared by the time-proportioning heaters
 
 
-def start_new_cycle():
-    global current_cycle_id
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("INSERT INTO cycles (start_time) VALUES (?)", (datetime.now(),))
-    current_cycle_id = cur.lastrowid
-    conn.commit()
-    conn.close()
-    print(f"Started new cycle, id {current_cycle_id}")
-    return current_cycle_id
+def init_gpio():
+    global heater_group
+    if simulation is not None:
+        for oven in ovens.values():
+            oven.heater = simulations[oven.id].heater
+        return
+    if not sys.platform.startswith("linux"):
+        return
+    heater_group = actuators.ProportioningGroup(config.get("heater_window", 1.0))
+    for oven in ovens.values():
+        settings = oven.settings
+        try:
+            # SSR control, through the configured driver
+            window = float(settings.get("heater_window", 1.0))
+            oven.heater = actuators.create_heater(
+                settings.get("heater_driver", "time_proportioning"),
+                settings["ssr_pin"],
+                window=window,
+                mains_hz=settings.get("mains_hz", 60),
+                pwm_frequency=settings.get("pwm_frequency", 100),
+                pwm_chip=settings.get("pwm_chip", 0),
+                pwm_channel=settings.get("pwm_channel", 0),
+                group=heater_group if window == heater_group.window else None,
+            )
+            # Light control pin, off by default
+            if settings["light_pin"] is not None:
+                oven.light = actuators.gpio_writer(settings["light_pin"])
+            log.info("%s: GPIO initialized successfully (heater driver %s).", oven.name,
+                     type(oven.heater).__name__)
+        except Exception as e:
+            log.error("Error setting up GPIO for %s: %s", oven.name, e)
+            oven.heater = None
 
 
-def end_current_cycle():
-    global current_cycle_id
-    if current_cycle_id is not None:
-        conn = get_db()
+# -------------------------
+# Cycle Management Functions
+# -------------------------
+def purge_old_cycles():
+    """Deletes finished cycles beyond the newest `max_cycles` (finished cycles are archived compactly)."""
+    with writer.connection() as conn:
         cur = conn.cursor()
-        cur.execute("UPDATE cycles SET end_time = ? WHERE id = ?", (datetime.now(), current_cycle_id))
-        conn.commit()
-        conn.close()
-        print(f"Ended cycle, id {current_cycle_id}")
-        current_cycle_id = None
-        purge_old_cycles()
+        cur.execute("""
+            SELECT id FROM cycles
+            WHERE end_time IS NOT NULL
+            ORDER BY end_time DESC
+            LIMIT -1 OFFSET ?
+        """, (config.get("max_cycles", 1000),))
+        rows = cur.fetchall()
+        if rows:
+            ids = [str(row["id"]) for row in rows]
+            forget_cycles([row["id"] for row in rows])
+            placeholders = ",".join("?" for _ in ids)
+            cur.execute(f"DELETE FROM readings WHERE cycle_id IN ({placeholders})", ids)
+            cur.execute(f"DELETE FROM cycle_archive WHERE cycle_id IN ({placeholders})", ids)
+            cur.execute(f"DELETE FROM cycle_summary WHERE cycle_id IN ({placeholders})", ids)
+            cur.execute(f"DELETE FROM cycles WHERE id IN ({placeholders})", ids)
+            conn.commit()
+            log.info("Purged cycles: %s", ids)
 
 
-def purge_old_cycles():
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT id FROM cycles
-        WHERE end_time IS NOT NULL
-        ORDER BY end_time DESC
-        LIMIT -1 OFFSET 20
-    """)
-    rows = cur.fetchall()
-    if rows:
-        ids = [str(row["id"]) for row in rows]
-        placeholders = ",".join("?" for _ in ids)
-        cur.execute(f"DELETE FROM readings WHERE cycle_id IN ({placeholders})", ids)
-        cur.execute(f"DELETE FROM cycles WHERE id IN ({placeholders})", ids)
-        conn.commit()
-        print(f"Purged cycles: {ids}")
-    conn.close()
-
-
-# -------------------------
-# Background Temperature Logger (uses calibrated temperature)
+# -------------------------
+# Background Temperature Logger (uses calibrated temperature; one thread for all ovens)
 # -------------------------
 def temperature_logger():
-    global current_cycle_id
     while True:
-        current_temp = get_calibrated_temperature()
-        print(f"[Logger] calibrated_temp={current_temp}, oven_on={config['oven_on']}, cycle_id={current_cycle_id}")
-        if config["oven_on"] and current_cycle_id is not None:
-            conn = get_db()
-            cur = conn.cursor()
-            cur.execute("""
-                INSERT INTO readings (cycle_id, timestamp, temperature, set_temperature)
-                VALUES (?, ?, ?, ?)
-            """, (current_cycle_id, datetime.now(), current_temp, config["target_temperature"]))
-            conn.commit()
-            conn.close()
-            print("[Logger] Inserted calibrated reading into DB.")
-        else:
-            print("[Logger] Not logging because oven_off or no active cycle.")
-        time.sleep(5)
+        for oven in ovens.values():
+            oven.log_reading()
+        if wait(5):
+            return
 
 
-logger_thread = threading.Thread(target=temperature_logger, daemon=True)
-logger_thread.start()
+logger_thread = None
 
 # -------------------------
 # Timer Logic
 # -------------------------
-timer_running = config.get("timer_running", False)
-time_remaining = config.get("time_remaining", 0)
-timer_start_time = None
+# The timer is shared by all ovens. While running, it is stored as an absolute wall-clock
+# deadline, so nothing has to be written every second and a restart resumes the countdown
+# where it would have been.
+timer_running = False
+time_remaining = 0  # Seconds left while paused
+timer_deadline = None  # Epoch seconds while running
 timer_lock = threading.Lock()
 
 
+def load_timer():
+    global timer_running, time_remaining, timer_deadline
+    timer_running = config.get("timer_running", False)
+    time_remaining = config.get("time_remaining", 0)
+    timer_deadline = config.get("timer_deadline")
+    if timer_running and timer_deadline is None:
+        timer_deadline = clock.time() + time_remaining
+
+
+def get_time_remaining():
+    if timer_running:
+        return max(0, timer_deadline - clock.time())
+    return time_remaining
+
+
+def timer_state():
+    return {"timer_running": timer_running, "time_remaining": int(get_time_remaining())}
+
+
+def store_timer_state():
+    config["timer_running"] = timer_running
+    config["time_remaining"] = int(time_remaining)
+    config["timer_deadline"] = timer_deadline
+    save_config(config)
+
+
+def publish_timer(state):
+    for oven in ovens.values():
+        oven.broker.publish("timer", state)
+
+
 def timer_thread():
-    global time_remaining, timer_running, timer_start_time
+    global time_remaining, timer_running, timer_deadline
     while True:
         with timer_lock:
-            if timer_running and time_remaining > 0:
-                elapsed = time.time() - timer_start_time
-                time_remaining = max(0, time_remaining - elapsed)
-                config["time_remaining"] = int(time_remaining)
-                save_config(config)
-                if time_remaining <= 0:
+            if timer_running:
+                if get_time_remaining() <= 0:
                     timer_running = False
-                    config["timer_running"] = False
-                    save_config(config)
-            timer_start_time = time.time()
-        time.sleep(1)
-
-
-timer_thread_instance = threading.Thread(target=timer_thread, daemon=True)
-timer_thread_instance.start()
-
-# -------------------------
-# PID Control for SSR Output (using calibrated temperature and tuned PID parameters)
-# -------------------------
-integral = 0.0
-last_error = 0.0
-pid_thread = None
-
-
-def pid_control_loop():
-    global integral, last_error
-    last_time = time.time()
-    max_integral = 500  # Anti-windup limit
-    while config["oven_on"]:
-        # Retrieve tuned PID parameters from configuration; default if not set
-        tuned = config.get("pid_tunings", [1.0, 0.1, 0.05])
-        Kp = tuned[0]
-        Ki = tuned[1]
-        Kd = tuned[2]
-
-        current_temp = get_calibrated_temperature()
-        setpoint = config["target_temperature"]
-        error = setpoint - current_temp
-        current_time = time.time()
-        dt = current_time - last_time if (current_time - last_time) > 0 else 1
-
-        integral += error * dt
-        integral = max(min(integral, max_integral), -max_integral)
-        derivative = (error - last_error) / dt
-        output = Kp * error + Ki * integral + Kd * derivative
-        duty_cycle = max(0, min(100, output))
-        print(
-            f"PID: setpoint={setpoint}, calibrated_current={current_temp:.2f}, error={error:.2f}, duty={duty_cycle:.2f}")
-        if pwm is not None:
-            print(f"Calling pwm.ChangeDutyCycle({duty_cycle})")
-            pwm.ChangeDutyCycle(duty_cycle)
-        last_error = error
-        last_time = current_time
-        time.sleep(1)
-    if pwm is not None:
-        pwm.ChangeDutyCycle(0)
-    print("PID control loop ended.")
+                    time_remaining = 0
+                    timer_deadline = None
+                    store_timer_state()
+                publish_timer(timer_state())
+        if wait(1):
+            return
+
+
+timer_thread_instance = None
+
+# -------------------------
+# HTTP Metrics
+# -------------------------
+# Routes the web UI polls (at the root or under OVEN_PREFIX); distinct clients polling them
+# are reported as pcoven_poll_clients.
+POLL_ROUTES = {"/current_temperature", "/current_temp_history", "/get_timer", "/get_temperature", "/status"}
+POLL_CLIENT_WINDOW = 30  # Seconds since its last poll for a client to count as active
+poll_clients = {}
+
+
+def active_poll_clients():
+    cutoff = time.monotonic() - POLL_CLIENT_WINDOW
+    for addr in [a for a, seen in list(poll_clients.items()) if seen < cutoff]:
+        poll_clients.pop(addr, None)
+    return len(poll_clients)
+
+
+REGISTRY.gauge("pcoven_poll_clients", f"Clients that polled the UI endpoints in the last {POLL_CLIENT_WINDOW} s.",
+               fn=active_poll_clients)
+
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response):
+    start = g.pop("request_start", None)
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        REGISTRY.histogram("pcoven_http_request_seconds", "Time to produce each response, by route.",
+                           route=route, method=request.method).observe(time.perf_counter() - start)
+        if route.removeprefix(OVEN_PREFIX) in POLL_ROUTES:
+            poll_clients[request.remote_addr] = time.monotonic()
+    return response
+
+
+# -------------------------
+# HTTP Caching (see http_cache.py)
+# -------------------------
+# Part of every finished-cycle ETag and of the data URL the cycle page fetches; bump it when
+# the /cycles/<id>/data payload changes so no browser keeps using an old immutable copy.
+CYCLE_PAYLOAD_VERSION = 1
+payload_cache = http_cache.PayloadCache()
+finished_cycles = {}  # Cycle id -> end_time, for cycles known to be finished
+template_fingerprints = http_cache.FileFingerprints(os.path.join(app.root_path, app.template_folder))
+REGISTRY.counter("pcoven_cycle_cache_hits_total", "Finished-cycle payloads served from memory.",
+                 fn=lambda: payload_cache.hits)
+REGISTRY.counter("pcoven_cycle_cache_misses_total", "Finished-cycle payloads built from the database.",
+                 fn=lambda: payload_cache.misses)
+REGISTRY.gauge("pcoven_cycle_cache_bytes", "Size of the cached finished-cycle payloads.",
+               fn=lambda: payload_cache.size)
+
+
+def finished_cycle_end(cycle_id):
+    """
+    end_time of a finished cycle, or None while it is running (or does not exist). Once a
+    cycle is known to be finished the answer comes from memory.
+    """
+    end_time = finished_cycles.get(cycle_id)
+    if end_time is None:
+        with read_db() as conn:
+            row = conn.execute("SELECT end_time FROM cycles WHERE id = ?", (cycle_id,)).fetchone()
+        if row is not None and row["end_time"] is not None:
+            end_time = finished_cycles[cycle_id] = str(row["end_time"])
+    return end_time
+
+
+def forget_cycles(cycle_ids):
+    """Drops purged cycles from the finished-cycle map and the payload cache."""
+    for cycle_id in cycle_ids:
+        finished_cycles.pop(cycle_id, None)
+    payload_cache.invalidate(cycle_ids)
+
+
+def cycle_etag(cycle_id, end_time, kind):
+    """Strong ETag of a finished cycle's `kind` of response (ETags cannot contain spaces)."""
+    stamp = "".join(ch for ch in end_time if ch.isdigit())
+    return f"cycle-{cycle_id}-{stamp}-{kind}-v{CYCLE_PAYLOAD_VERSION}"
+
+
+def not_modified(etag, cache_control):
+    response = Response(status=304)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = cache_control
+    return response
+
+
+# -------------------------
+# Oven-scoped Routes
+# -------------------------
+# Routes on oven_routes act on one oven. Each is served twice: at the root for the first
+# oven, so existing URLs keep working, and under OVEN_PREFIX for any oven. Handlers find
+# their oven in g.oven; templates get `oven`, `ovens` and `base`, the prefix of the current
+# oven's URLs ("" for the first oven).
+OVEN_PREFIX = "/ovens/<int:oven_id>"
+oven_routes = Blueprint("oven", __name__)
+
+
+@oven_routes.url_value_preprocessor
+def select_oven(endpoint, values):
+    oven_id = values.pop("oven_id", DEFAULT_OVEN_ID) if values else DEFAULT_OVEN_ID
+    if oven_id not in ovens:
+        abort(404)
+    g.oven = ovens[oven_id]
+    g.base = "" if oven_id == DEFAULT_OVEN_ID else f"/ovens/{oven_id}"
+
+
+@app.context_processor
+def oven_context():
+    return {"oven": g.get("oven", default_oven), "ovens": list(ovens.values()), "base": g.get("base", "")}
 
 
 # -------------------------
 # Calibration Routes
 # -------------------------
-@app.route('/calibrate_temperature', methods=['GET'])
+@oven_routes.route('/calibrate_temperature', methods=['GET'])
 def calibrate_temperature_page():
     return render_template('calibrate.html')
 
 
-@app.route('/calibrate_temperature/ice', methods=['POST'])
+@oven_routes.route('/calibrate_temperature/ice', methods=['POST'])
 def calibrate_ice():
-    raw_ice = read_temperature()
-    config["calibration_ice"] = raw_ice
-    save_config(config)
-    print(f"Calibrated ice value: {raw_ice}")
+    oven = g.oven
+    raw_ice = oven.raw_temperature()
+    if raw_ice is None:
+        return jsonify({"error": "Temperature sensor read failed."}), 500
+    oven.settings["calibration_ice"] = raw_ice
+    oven.settings.save()
+    log.info("%s: calibrated ice value: %s", oven.name, raw_ice)
     return jsonify({"ice": raw_ice})
 
 
-@app.route('/calibrate_temperature/boiling', methods=['POST'])
+@oven_routes.route('/calibrate_temperature/boiling', methods=['POST'])
 def calibrate_boiling():
-    raw_boiling = read_temperature()
-    config["calibration_boiling"] = raw_boiling
+    settings = g.oven.settings
+    raw_boiling = g.oven.raw_temperature()
+    if raw_boiling is None:
+        return jsonify({"error": "Temperature sensor read failed."}), 500
+    settings["calibration_boiling"] = raw_boiling
     expected_ice = 32.0
     expected_boiling = 212.0
-    if "calibration_ice" not in config:
+    if "calibration_ice" not in settings:
         return jsonify({"error": "Ice calibration value not set."}), 400
-    raw_ice = config["calibration_ice"]
+    raw_ice = settings["calibration_ice"]
     try:
         scale = (raw_boiling - raw_ice) / (expected_boiling - expected_ice)
     except ZeroDivisionError:
         scale = 1.0
     offset = raw_ice - scale * expected_ice
-    config["calibration_scale"] = scale
-    config["calibration_offset"] = offset
+    settings["calibration_scale"] = scale
+    settings["calibration_offset"] = offset
     # Remove temporary calibration values
-    config.pop("calibration_ice", None)
-    config.pop("calibration_boiling", None)
-    save_config(config)
-    print(f"Calibration complete: scale={scale}, offset={offset}")
+    settings.pop("calibration_ice", None)
+    settings.pop("calibration_boiling", None)
+    settings.save(immediate=True)
+    log.info("%s: calibration complete: scale=%s, offset=%s", g.oven.name, scale, offset)
     return jsonify({"scale": scale, "offset": offset, "message": "Calibration complete."})
 
 
 # -------------------------
 # PID Auto-Tune Route (with auto-tuning algorithm)
 # -------------------------
-@app.route('/pid_autotune', methods=['GET', 'POST'])
+jobs = JobRunner()
+# Job names get the oven id appended: one auto-tune at a time per oven.
+AUTOTUNE_JOBS = ("autotune-relay", "autotune-history", "autotune-step")
+# Jobs that drive the heater directly; the oven has to stay off while one runs.
+HEATER_JOBS = ("autotune-relay", "autotune-step", "test-pwm")
+
+
+def oven_jobs(oven, *groups):
+    """The names of the jobs in `groups` (AUTOTUNE_JOBS, HEATER_JOBS) for this oven."""
+    return {f"{name}-{oven.id}" for group in groups for name in group}
+
+
+def heater_test_running(oven):
+    return any(jobs.active(name) for name in oven_jobs(oven, HEATER_JOBS))
+
+
+def job_conflict_response(oven, conflict, heater_message):
+    """409 for a JobConflict: another auto-tune, or another job driving the heater."""
+    if conflict.job.name in oven_jobs(oven, AUTOTUNE_JOBS):
+        return jsonify({"error": "An auto-tune is already running"}), 409
+    return jsonify({"error": heater_message}), 409
+
+
+@oven_routes.route('/pid_autotune', methods=['GET', 'POST'])
 def pid_autotune():
+    """
+    GET renders the auto-tune page. POST starts the relay auto-tune (up to 10 minutes) in
+    the background and returns its job id; poll /pid_autotune/jobs/<id> for the result.
+    """
+    oven = g.oven
     if request.method == 'POST':
-        tuned = auto_tune_pid()
-        config["pid_tunings"] = [tuned["Kp"], tuned["Ki"], tuned["Kd"]]
-        save_config(config)
-        print(f"PID Auto-Tune complete: {tuned}")
-        return jsonify({"message": "PID auto-tune complete", "tuned": tuned})
+        message = "Turn the oven off before running the relay test"
+        if oven.on:
+            return jsonify({"error": message}), 409
+        set_output = oven.heater.set_duty if oven.heater is not None else None
+        try:
+            job = jobs.submit(f"autotune-relay-{oven.id}", relay_tune, oven, set_output,
+                              on_done=lambda job: apply_tuned_gains(oven, job),
+                              exclusive=oven_jobs(oven, AUTOTUNE_JOBS, HEATER_JOBS))
+        except JobConflict as e:
+            return job_conflict_response(oven, e, message)
+        return jsonify({"job_id": job.id}), 202
     else:
         return render_template('pid_autotune.html')
 
 
+def relay_tune(job, oven, set_output):
+    from pid_autotune import auto_tune_pid
+
+    tuned = auto_tune_pid(read_temperature=oven.temperature, set_output=set_output, clock=clock, job=job)
+    log.info("%s: PID Auto-Tune complete: %s", oven.name, tuned)
+    tuned["applied"] = tuned_gains_usable(tuned)
+    if not tuned["applied"]:
+        job.message = "The oscillation estimate did not converge; the current tunings were kept."
+    return tuned
+
+
+def tuned_gains_usable(tuned):
+    """
+    Relay-test gains are only trusted once their oscillation estimate has converged.
+    Model-based results carry no "analysis" and are always usable.
+    """
+    if "analysis" not in tuned:
+        return True
+    return bool(tuned["analysis"] and tuned["analysis"]["converged"])
+
+
+def apply_tuned_gains(oven, job):
+    tuned = job.result
+    if not tuned_gains_usable(tuned):
+        log.warning("%s: auto-tune estimate did not converge; keeping PID tunings %s", oven.name,
+                    oven.settings["pid_tunings"])
+        return
+    oven.settings["pid_tunings"] = [tuned["Kp"], tuned["Ki"], tuned["Kd"]]
+    oven.settings.save(immediate=True)
+
+
+def load_tuning_cycles(oven):
+    import replay
+
+    with read_db() as conn:
+        return replay.load_recorded_cycles(conn, assumed_gains=oven.settings["pid_tunings"], oven_id=oven.id)
+
+
+@oven_routes.route('/pid_autotune/model', methods=['POST'])
+def pid_autotune_model():
+    """
+    Starts a model-based auto-tune of the oven in the background and returns its job id.
+
+    JSON body (all optional):
+        source       - "history" (fit the oven's recorded cycles, default) or "step" (run a step test)
+        duty         - step test heater duty in percent (default 50)
+        duration     - step test length in seconds (default 300)
+        setpoint     - temperature to tune for with a step test (default: target temperature)
+    """
+    oven = g.oven
+    params = request.get_json(silent=True) or {}
+    source = params.get("source", "history")
+    if source not in ("history", "step"):
+        return jsonify({"error": "source must be 'history' or 'step'"}), 400
+    step = None
+    exclusive = oven_jobs(oven, AUTOTUNE_JOBS)
+    message = "Turn the oven off before running a step test"
+    if source == "step":
+        exclusive |= oven_jobs(oven, HEATER_JOBS)
+        if oven.on:
+            return jsonify({"error": message}), 409
+        if oven.heater is None:
+            return jsonify({"error": "Heater output is not initialized"}), 500
+        try:
+            step = {
+                "read_temperature": oven.temperature,
+                "set_output": oven.heater.set_duty,
+                "clock": clock,
+                "duty": float(params.get("duty", 50)),
+                "duration": float(params.get("duration", 300)),
+                "setpoint": float(params.get("setpoint", oven.settings["target_temperature"])),
+            }
+        except (TypeError, ValueError):
+            return jsonify({"error": "duty, duration and setpoint must be numbers"}), 400
+    from pid_autotune import model_based_tune
+
+    try:
+        job = jobs.submit(f"autotune-{source}-{oven.id}", model_based_tune, lambda: load_tuning_cycles(oven),
+                          step=step, on_done=lambda job: apply_tuned_gains(oven, job), exclusive=exclusive)
+    except JobConflict as e:
+        return job_conflict_response(oven, e, message)
+    return jsonify({"job_id": job.id}), 202
+
+
+@app.route('/pid_autotune/jobs/<int:job_id>', methods=['GET'])
+def pid_autotune_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job.to_dict())
+
+
+@app.route('/pid_autotune/jobs/<int:job_id>/cancel', methods=['POST'])
+def cancel_pid_autotune_job(job_id):
+    job = jobs.cancel(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job.to_dict())
+
+
+# -------------------------
+# Cure Profile Routes
+# -------------------------
+# Profiles are shared by all ovens; running one (start/stop/status) is per oven.
+@oven_routes.route('/profiles', methods=['GET'])
+def profiles_page():
+    return render_template('profiles.html')
+
+
+@oven_routes.route('/profiles/data', methods=['GET'])
+def profiles_data():
+    with read_db() as conn:
+        return jsonify({"profiles": profiles.list_profiles(conn), "running": g.oven.profile_state()})
+
+
+@app.route('/profiles', methods=['POST'])
+def save_profile():
+    """Creates a profile, or replaces it if the JSON body has an `id`: {"name", "segments": [...]}."""
+    data = request.get_json(silent=True) or {}
+    name = str(data.get("name", "")).strip()
+    if not name:
+        return jsonify({"error": "A profile needs a name"}), 400
+    profile_id = data.get("id")
+    if profile_id is not None and (isinstance(profile_id, bool) or not isinstance(profile_id, int)):
+        return jsonify({"error": "id must be an integer"}), 400
+    try:
+        segments = profiles.parse_segments(data.get("segments"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        with writer.connection() as conn:
+            with conn:
+                profile_id = profiles.save_profile(conn, name, segments, profile_id)
+    except profiles.ProfileNotFound as e:
+        return jsonify({"error": str(e)}), 404
+    except sqlite3.IntegrityError:
+        return jsonify({"error": f"A profile named {name!r} already exists"}), 409
+    return jsonify({"id": profile_id}), 201
+
+
+@app.route('/profiles/<int:profile_id>/delete', methods=['POST'])
+def delete_profile(profile_id):
+    with writer.connection() as conn:
+        with conn:
+            deleted = profiles.delete_profile(conn, profile_id)
+    if not deleted:
+        return jsonify({"error": "Unknown profile"}), 404
+    return jsonify({"deleted": profile_id})
+
+
+@oven_routes.route('/profiles/<int:profile_id>/start', methods=['POST'])
+def start_profile(profile_id):
+    """Turns the oven on and runs the profile, starting from the current oven temperature."""
+    oven = g.oven
+    if oven.on:
+        return jsonify({"error": "Turn the oven off before starting a profile"}), 409
+    if heater_test_running(oven):
+        return jsonify({"error": "A heater test is running"}), 409
+    temperature = oven.temperature()
+    if temperature is None:
+        return jsonify({"error": "No valid temperature reading"}), 500
+    with read_db() as conn:
+        profile = profiles.load_profile(conn, profile_id)
+    if profile is None:
+        return jsonify({"error": "Unknown profile"}), 404
+    name, segments = profile
+    run = profiles.ProfileRun(profile_id, name, segments, temperature, period=oven.settings.get("pid_period", 1.0))
+    log.info("%s: starting profile %s from %.1f °F", oven.name, name, temperature)
+    oven.set_power(True, run)
+    return jsonify(oven.profile_state())
+
+
+@oven_routes.route('/profiles/stop', methods=['POST'])
+def stop_profile_endpoint():
+    """Stops the running profile; the oven stays on, holding the current setpoint."""
+    g.oven.stop_profile(hold=True)
+    return jsonify(g.oven.profile_state())
+
+
+@oven_routes.route('/profile_status', methods=['GET'])
+def profile_status():
+    return jsonify(g.oven.profile_state())
+
+
 # -------------------------
 # Other Routes
 # -------------------------
-@app.route('/')
+@oven_routes.route('/')
 def dashboard():
     return render_template('dashboard.html')
 
 
-@app.route('/settings')
+@oven_routes.route('/settings')
 def settings():
     return render_template('settings.html')
 
 
-@app.route('/toggle_light', methods=['POST'])
+@oven_routes.route('/toggle_light', methods=['POST'])
 def toggle_light():
-    config["light_on"] = not config.get("light_on", False)
-    save_config(config)
-    try:
-        import RPi.GPIO as GPIO
-        if config["light_on"]:
-            GPIO.output(LIGHT_PIN, GPIO.HIGH)
-        else:
-            GPIO.output(LIGHT_PIN, GPIO.LOW)
-    except Exception as e:
-        print("Error toggling light output:", e)
-    return jsonify({"light_on": config["light_on"]})
+    oven = g.oven
+    oven.set_light(not oven.settings.get("light_on", False))
+    return jsonify({"light_on": oven.settings["light_on"]})
 
 
-@app.route('/power', methods=['POST'])
+@oven_routes.route('/power', methods=['POST'])
 def toggle_oven():
-    global current_cycle_id, pid_thread
-    print("Received /power request")
-    config["oven_on"] = not config.get("oven_on", False)
-    print(f"Setting oven_on to {config['oven_on']}")
-    if config["oven_on"]:
-        start_new_cycle()
-        if pid_thread is None or not pid_thread.is_alive():
-            pid_thread = threading.Thread(target=pid_control_loop, daemon=True)
-            pid_thread.start()
-    else:
-        end_current_cycle()
-    save_config(config)
-    print(f"Oven status now: {config['oven_on']}")
-    return jsonify({"oven_on": config["oven_on"]})
+    oven = g.oven
+    if not oven.on and heater_test_running(oven):
+        return jsonify({"error": "A heater test is running"}), 409
+    oven.set_power(not oven.on)
+    return jsonify({"oven_on": oven.on})
 
 
 @app.route('/toggle_timer', methods=['POST'])
 def toggle_timer():
-    global timer_running, timer_start_time, time_remaining
+    global timer_running, timer_deadline, time_remaining
     with timer_lock:
         if timer_running:
-            elapsed = time.time() - timer_start_time
-            time_remaining = max(0, time_remaining - elapsed)
+            time_remaining = get_time_remaining()
+            timer_deadline = None
             timer_running = False
         else:
-            timer_start_time = time.time()
+            timer_deadline = clock.time() + time_remaining
             timer_running = True
-        config["timer_running"] = timer_running
-        config["time_remaining"] = int(time_remaining)
-        save_config(config)
-    return jsonify({"timer_running": timer_running, "time_remaining": int(time_remaining)})
+        store_timer_state()
+        state = timer_state()
+    publish_timer(state)
+    return jsonify(state)
 
 
 @app.route('/set_timer', methods=['POST'])
 def set_timer():
-    global time_remaining, timer_running
+    global time_remaining, timer_running, timer_deadline
     data = request.get_json()
     with timer_lock:
         time_remaining = data.get("time", 0) * 60
         timer_running = False
-        config["timer_running"] = False
-        config["time_remaining"] = int(time_remaining)
-        save_config(config)
+        timer_deadline = None
+        store_timer_state()
+    publish_timer(timer_state())
     return jsonify({"time_remaining": int(time_remaining)})
 
 
 @app.route('/get_timer', methods=['GET'])
 def get_timer():
-    global timer_running, time_remaining
-    return jsonify({"timer_running": timer_running, "time_remaining": int(time_remaining)})
+    return jsonify(timer_state())
 
 
-@app.route('/set_temperature', methods=['POST'])
+@oven_routes.route('/set_temperature', methods=['POST'])
 def set_temperature_endpoint():
     data = request.get_json()
-    config["target_temperature"] = data.get("temperature", 350)
-    save_config(config)
-    return jsonify({"target_temperature": config["target_temperature"]})
+    # A manual setpoint takes the oven off the running profile.
+    g.oven.set_target(data.get("temperature", 350))
+    return jsonify({"target_temperature": g.oven.settings["target_temperature"]})
 
 
-@app.route('/get_temperature', methods=['GET'])
+@oven_routes.route('/get_temperature', methods=['GET'])
 def get_temperature_endpoint():
-    return jsonify({"target_temperature": config["target_temperature"]})
+    return jsonify({"target_temperature": g.oven.settings["target_temperature"]})
 
 
-@app.route('/current_temperature', methods=['GET'])
+@oven_routes.route('/current_temperature', methods=['GET'])
 def current_temperature():
-    temp = get_calibrated_temperature()
-    return jsonify({"current_temperature": temp})
+    """The latest control temperature; multi-probe ovens add each probe's reading."""
+    oven = g.oven
+    sample = oven.sampler.latest()
+    if sample is None:
+        return jsonify({"current_temperature": None})
+    event = sample_event(sample, oven.probe_names)
+    return jsonify({"current_temperature": sample.temperature, "cold_junction": sample.internal,
+                    **({"probes": event["probes"]} if "probes" in event else {})})
+
+
+# Open event streams are capped when the server has a fixed worker pool (see serve()).
+max_event_streams = None
+STREAM_RETRY_MS = 30000
+
+
+def event_streams():
+    return sum(oven.broker.subscriber_count() for oven in ovens.values())
+
+
+@oven_routes.route('/events')
+def events():
+    """
+    Server-sent event stream of one oven's live data. Event types:
+        sample   - every sensor sample: {"t", "temperature", "fault"}
+        reading  - every reading logged to the active cycle: {"cycle_id", "x", "y_actual", "y_set"}
+        state    - oven/light changes: {"oven_on", "light_on"}
+        setpoint - target temperature changes: {"target_temperature"}
+        timer    - timer ticks and changes: {"timer_running", "time_remaining"}
+        profile  - cure profile start/stop and segment changes: ProfileRun.state(), or
+                   {"profile_id": null} when no profile is running
+    A snapshot of the current state is sent first on every (re)connect. When all the
+    streams the server has room for are open, only the snapshot is sent and the browser
+    reconnects after STREAM_RETRY_MS.
+    """
+    oven = g.oven
+    broker = oven.broker
+
+    def snapshot():
+        yield broker.format("state", oven.state())
+        yield broker.format("setpoint", {"target_temperature": oven.current_setpoint()})
+        yield broker.format("timer", timer_state())
+        yield broker.format("profile", oven.profile_state())
+        sample = oven.sampler.latest()
+        if sample is not None:
+            yield broker.format("sample", sample_event(sample, oven.probe_names))
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    if max_event_streams is not None and event_streams() >= max_event_streams:
+        # Every stream would hold a server worker: send the snapshot and have the browser
+        # reconnect later rather than leave no workers for the polls.
+        body = "".join(snapshot()) + f"retry: {STREAM_RETRY_MS}\n\n"
+        return Response(body, mimetype="text/event-stream", headers=headers)
+
+    q = broker.subscribe()
+
+    def stream():
+        try:
+            yield from snapshot()
+            yield from broker.stream(q)
+        finally:
+            broker.unsubscribe(q)
 
+    return Response(stream(), mimetype="text/event-stream", headers=headers)
 
-@app.route('/temperature_graph')
+
+@oven_routes.route('/temperature_graph')
 def temperature_graph():
     return render_template('current_temp_history.html')
 
 
 # -------------------------
-# Modified /current_temp_history Route
+# Chart Payload Helpers
+# -------------------------
+def readings_to_points(rows, points=None, mode="lttb"):
+    """
+    Converts (ts, temperature, set_temperature) rows to chart points. If `points` is given
+    and there are more rows than that, the series is decimated first (LTTB or min/max per
+    bucket on the actual temperature, always keeping setpoint changes) so the payload and
+    the browser's render time stay bounded regardless of cycle length.
+    """
+    if points and len(rows) > points:
+        import numpy as np
+
+        return series_to_points(np.array([tuple(r) for r in rows], dtype=float), points, mode)
+    return [{"x": r["ts"], "y_actual": r["temperature"], "y_set": r["set_temperature"]} for r in rows]
+
+
+def series_to_points(data, points=None, mode="lttb", probe_names=()):
+    """
+    Like readings_to_points, for an (n, 3) array of ts, temperature and set_temperature.
+    With `probe_names`, one column per probe follows (NaN where the probe faulted) and
+    each point gets a "probes" object.
+    """
+    if points and len(data) > points:
+        import downsample
+
+        idx = downsample.decimate(data[:, 0], data[:, 1], points, mode,
+                                  keep=downsample.step_change_indices(data[:, 2]))
+        data = data[idx]
+    if probe_names:
+        return [{"x": int(row[0]), "y_actual": row[1], "y_set": row[2],
+                 "probes": {name: None if math.isnan(t) else t for name, t in zip(probe_names, row[3:])}}
+                for row in data.tolist()]
+    return [{"x": int(x), "y_actual": t, "y_set": sp} for x, t, sp in data.tolist()]
+
+
+def decimation_args():
+    """Reads the optional ?points=N&mode=lttb|minmax query parameters."""
+    import downsample
+
+    points = request.args.get("points", type=int)
+    mode = request.args.get("mode", "lttb")
+    if mode not in downsample.MODES:
+        mode = "lttb"
+    if points is not None:
+        points = max(3, points)
+    return points, mode
+
+
+def segment_filter():
+    """SQL condition and parameters for the optional ?segment=N (profile segment) filter."""
+    segment = request.args.get("segment", type=int)
+    if segment is None:
+        return "", ()
+    return " AND segment = ?", (segment,)
+
+
+# -------------------------
+# Incremental /current_temp_history Route
 # -------------------------
-@app.route('/current_temp_history')
+@oven_routes.route('/current_temp_history')
 def current_temp_history():
-    if current_cycle_id is None:
+    """
+    Returns the oven's active cycle's readings newer than the `since` cursor (epoch ms).
+
+    Clients pass back the `cursor` from the previous response together with the `cycle` it
+    belongs to, so each poll only carries the points logged since the last one. If the
+    active cycle differs from `cycle`, the whole cycle is sent and `reset` is true.
+    Optional `points`/`mode` parameters decimate the response (see readings_to_points), and
+    `segment` limits it to one profile segment.
+    """
+    oven = g.oven
+    cycle_id = oven.current_cycle_id
+    if cycle_id is None:
         now = datetime.now()
         dummy = [{
             "x": int(now.timestamp() * 1000),
-            "y_actual": get_calibrated_temperature(),
-            "y_set": config["target_temperature"]
+            "y_actual": oven.temperature(),
+            "y_set": oven.current_setpoint()
         }]
-        print("No active cycle; returning dummy data.")
-        return jsonify(dummy)
-
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT CAST((julianday(timestamp, 'utc') - 2440587.5)*86400 AS INTEGER) AS ts,
-               temperature,
-               set_temperature
-        FROM readings
-        WHERE cycle_id = ?
-        ORDER BY timestamp ASC
-    """, (current_cycle_id,))
-    rows = cur.fetchall()
-    conn.close()
-
-    if not rows:
-        now = datetime.now()
-        dummy = [{
-            "x": int(now.timestamp() * 1000),
-            "y_actual": get_calibrated_temperature(),
-            "y_set": config["target_temperature"]
-        }]
-        print("No readings found for current cycle; returning dummy data.")
-        return jsonify(dummy)
+        log.debug("No active cycle; returning dummy data.")
+        return jsonify({"cycle_id": None, "points": dummy, "cursor": None, "reset": True})
 
-    print(f"current_temp_history: Found {len(rows)} readings for cycle {current_cycle_id}")
-    data = []
-    for r in rows:
-        data.append({
-            "x": int(r["ts"]) * 1000,
-            "y_actual": r["temperature"],
-            "y_set": r["set_temperature"]
-        })
-    return jsonify(data)
+    since = request.args.get("since", 0, type=int)
+    reset = request.args.get("cycle", type=int) != cycle_id
+    if reset:
+        since = 0
+
+    condition, params = segment_filter()
+    with read_db() as conn:
+        cur = conn.cursor()
+        cur.execute(f"""
+            SELECT ts, temperature, set_temperature
+            FROM readings
+            WHERE cycle_id = ? AND ts > ?{condition}
+            ORDER BY ts ASC
+        """, (cycle_id, since, *params))
+        rows = cur.fetchall()
+
+    log.debug("current_temp_history: Found %d new readings for cycle %s", len(rows), cycle_id)
+    data = readings_to_points(rows, *decimation_args())
+    cursor = rows[-1]["ts"] if rows else since
+    return jsonify({"cycle_id": cycle_id, "points": data, "cursor": cursor, "reset": reset})
 
 
 @app.route('/cycles')
 def list_cycles():
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT id, start_time, end_time
-        FROM cycles
-        WHERE end_time IS NOT NULL
-        ORDER BY end_time DESC
-        LIMIT 10
-    """)
-    cycles = cur.fetchall()
-    conn.close()
-    return render_template('cycles.html', cycles=cycles)
+    """
+    Recent finished cycles; ?profile=<id> shows only cycles that ran that profile and
+    ?oven=<id> only those of one oven.
+    """
+    profile_id = request.args.get("profile", type=int)
+    oven_id = request.args.get("oven", type=int)
+    conditions, params = [], []
+    if profile_id is not None:
+        conditions.append("AND c.profile_id = ?")
+        params.append(profile_id)
+    if oven_id is not None:
+        conditions.append("AND c.oven_id = ?")
+        params.append(oven_id)
+    condition = " ".join(conditions)
+    with read_db() as conn:
+        cur = conn.cursor()
+        cur.execute(f"""
+            SELECT c.id, c.start_time, c.end_time, c.profile_id, c.oven_id, p.name AS profile_name, s.*
+            FROM cycles c
+            LEFT JOIN cycle_summary s ON s.cycle_id = c.id
+            LEFT JOIN profiles p ON p.id = c.profile_id
+            WHERE c.end_time IS NOT NULL {condition}
+            ORDER BY c.end_time DESC
+            LIMIT 10
+        """, params)
+        cycles = cur.fetchall()
+        profile_names = cur.execute("SELECT id, name FROM profiles ORDER BY name").fetchall()
+    return render_template('cycles.html', cycles=cycles, profiles=profile_names, profile_id=profile_id,
+                           oven_id=oven_id)
 
 
 @app.route('/cycles/<int:cycle_id>')
 def show_cycle(cycle_id):
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("SELECT start_time, end_time FROM cycles WHERE id = ?", (cycle_id,))
-    row = cur.fetchone()
-    conn.close()
+    # The page of a finished cycle only changes if the template does, so browsers may keep
+    # it and revalidate against an ETag of the cycle plus the template's fingerprint.
+    end_time = finished_cycle_end(cycle_id)
+    etag = None
+    if end_time is not None:
+        etag = cycle_etag(cycle_id, end_time, "page-" + template_fingerprints.fingerprint("cycle_graph.html"))
+        if http_cache.etag_matches(request.if_none_match, etag):
+            return not_modified(etag, http_cache.REVALIDATE)
+    with read_db() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT start_time, end_time FROM cycles WHERE id = ?", (cycle_id,))
+        row = cur.fetchone()
     if row:
         dt = row["end_time"] if row["end_time"] else row["start_time"]
         if isinstance(dt, str):
             try:
                 dt = datetime.strptime(dt, "%Y-%m-%d %H:%M:%S")
             except Exception as e:
-                print("Error parsing date:", e)
+                log.warning("Error parsing date: %s", e)
                 dt = datetime.now()
         cycle_date_str = dt.strftime("%B %d, %Y")
     else:
         cycle_date_str = "Unknown"
-    return render_template('cycle_graph.html', cycle_id=cycle_id, cycle_date=cycle_date_str)
+    response = app.make_response(render_template('cycle_graph.html', cycle_id=cycle_id, cycle_date=cycle_date_str,
+                                                 data_version=CYCLE_PAYLOAD_VERSION))
+    if etag is not None:
+        response.set_etag(etag)
+    response.headers["Cache-Control"] = http_cache.REVALIDATE
+    return response
 
 
 @app.route('/cycles/<int:cycle_id>/data')
 def cycle_data(cycle_id):
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT CAST((julianday(timestamp, 'utc') - 2440587.5)*86400 AS INTEGER) AS ts,
-               temperature,
-               set_temperature
-        FROM readings
-        WHERE cycle_id = ?
-        ORDER BY timestamp ASC
-    """, (cycle_id,))
-    rows = cur.fetchall()
-    conn.close()
-    print(f"Cycle {cycle_id} data: Found {len(rows)} readings")
-    data = []
-    for r in rows:
-        data.append({
-            "x": int(r["ts"]) * 1000,
-            "y_actual": r["temperature"],
-            "y_set": r["set_temperature"]
-        })
-    return jsonify(data)
-
-
-@app.route('/status')
+    """
+    Chart points of one cycle. A finished cycle never changes, so its payload carries a
+    strong ETag and an immutable Cache-Control, conditional requests are answered with a
+    304 from memory, and serialized payloads are kept in payload_cache.
+    """
+    end_time = finished_cycle_end(cycle_id)
+    if end_time is None:
+        response = jsonify(cycle_points(cycle_id))
+        response.headers["Cache-Control"] = http_cache.REVALIDATE
+        return response
+    etag = cycle_etag(cycle_id, end_time, "data")
+    if http_cache.etag_matches(request.if_none_match, etag):
+        return not_modified(etag, http_cache.IMMUTABLE)
+    key = (cycle_id, request.query_string)
+    cached = payload_cache.get(key)
+    if cached is None:
+        body = jsonify(cycle_points(cycle_id)).get_data()
+        payload_cache.put(key, etag, body)
+    else:
+        body = cached[1]
+    response = Response(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = http_cache.IMMUTABLE
+    return response
+
+
+def cycle_points(cycle_id):
+    """
+    Chart points of one cycle, decoded from the archive once the cycle has been archived.
+    With ?probes=1, points of a multi-probe cycle also carry every probe's temperature.
+    """
+    if request.args.get("probes"):
+        return cycle_probe_points(cycle_id)
+    import cycle_archive
+    import numpy as np
+
+    with read_db() as conn:
+        archived = cycle_archive.load_archived(conn, cycle_id)
+    if archived is not None:
+        data = np.column_stack((archived.ts, archived.temperature, archived.set_temperature))
+        segment = request.args.get("segment", type=int)
+        if segment is not None:
+            data = data[archived.segment == segment]
+        log.debug("Cycle %s data: Decoded %d archived readings", cycle_id, len(data))
+        return series_to_points(data, *decimation_args())
+
+    condition, params = segment_filter()
+    with read_db() as conn:
+        cur = conn.cursor()
+        cur.execute(f"""
+            SELECT ts, temperature, set_temperature
+            FROM readings
+            WHERE cycle_id = ?{condition}
+            ORDER BY ts ASC
+        """, (cycle_id, *params))
+        rows = cur.fetchall()
+    log.debug("Cycle %s data: Found %d readings", cycle_id, len(rows))
+    return readings_to_points(rows, *decimation_args())
+
+
+def cycle_probe_points(cycle_id):
+    import cycle_archive
+    import numpy as np
+
+    with read_db() as conn:
+        row = conn.execute("SELECT probes FROM cycles WHERE id = ?", (cycle_id,)).fetchone()
+        data = cycle_archive.load_cycle(conn, cycle_id)
+    names = json.loads(row["probes"]) if row is not None and row["probes"] else []
+    names = names[:data.probes.shape[1]]
+    series = np.column_stack((data.ts, data.temperature, data.set_temperature, data.probes[:, :len(names)]))
+    segment = request.args.get("segment", type=int)
+    if segment is not None:
+        series = series[data.segment == segment]
+    return series_to_points(series, *decimation_args(), probe_names=names)
+
+
+@oven_routes.route('/history')
+def history():
+    """
+    Long-range history of the oven from the rollup tiers (see rollups.py), across cycles.
+
+    Query parameters: `start` and `end` in epoch ms (default: the last 30 days) and `points`,
+    the maximum number of buckets (default 300). Returns the tier used, the bucket size in
+    seconds and one entry per non-empty bucket with count and min/max/mean of temperature
+    and of error (temperature minus setpoint).
+    """
+    end = request.args.get("end", int(clock.time() * 1000), type=int)
+    start = request.args.get("start", end - 30 * 24 * 3600 * 1000, type=int)
+    points = request.args.get("points", rollups.DEFAULT_POINTS, type=int)
+    if start >= end:
+        return jsonify({"error": "start must be before end"}), 400
+    with read_db() as conn:
+        resolution, step, rows = rollups.query(conn, start, end, min(max(points, 1), 5000), oven_id=g.oven.id)
+    return jsonify({"resolution": resolution, "step": step, "points": rows})
+
+
+@oven_routes.route('/pid_timing', methods=['GET'])
+def pid_timing_endpoint():
+    """
+    Control loop scheduling statistics of the oven (see OvenController.pid_timing). Pass
+    ?reset=1 to start a new window after reading them; /metrics keeps counting.
+    """
+    return jsonify(g.oven.pid_timing(reset=bool(request.args.get("reset"))))
+
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus text exposition of every in-process metric."""
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+
+@oven_routes.route('/status')
 def status():
     return jsonify({
-        "oven_on": config.get("oven_on", False),
-        "timer_running": timer_running,
-        "time_remaining": int(time_remaining)
+        "oven_on": g.oven.on,
+        **timer_state()
     })
 
 
-@app.route('/test_pwm', methods=['GET'])
+@oven_routes.route('/test_pwm', methods=['GET'])
 def test_pwm():
-    def pwm_test():
-        if pwm is not None:
-            print("Forcing PWM to 100% duty for 10 seconds")
-            pwm.ChangeDutyCycle(100)
-            time.sleep(10)
-            pwm.ChangeDutyCycle(0)
-            print("PWM test complete")
+    """Forces the heater to 100% duty for 10 seconds as a background job (cancel to stop early)."""
+    oven = g.oven
+    if oven.heater is None:
+        return jsonify({"error": "Heater output is not initialized"}), 500
+    message = "Turn the oven off before testing the heater"
+    if oven.on:
+        return jsonify({"error": message}), 409
+    try:
+        job = jobs.submit(f"test-pwm-{oven.id}", pwm_test, oven.heater, exclusive=oven_jobs(oven, HEATER_JOBS))
+    except JobConflict:
+        return jsonify({"error": message}), 409
+    return jsonify({"message": "PWM test started", "job_id": job.id}), 202
 
-    threading.Thread(target=pwm_test, daemon=True).start()
-    return "PWM test started"
+
+def pwm_test(job, heater, seconds=10):
+    log.info("Forcing heater to 100%% duty for %d seconds", seconds)
+    heater.set_duty(100)
+    try:
+        end = clock.time() + seconds
+        while clock.time() < end:
+            job.check_cancelled()
+            job.progress(1 - (end - clock.time()) / seconds)
+            clock.sleep(0.5)
+    finally:
+        heater.off()
+    log.info("Heater test complete")
 
 
 @app.route('/test_readings')
 def test_readings():
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT cycle_id, timestamp, temperature, set_temperature
-        FROM readings
-        ORDER BY timestamp DESC
-        LIMIT 10
-    """)
-    rows = cur.fetchall()
-    conn.close()
+    with read_db() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT cycle_id, timestamp, temperature, set_temperature
+            FROM readings
+            ORDER BY id DESC
+            LIMIT 10
+        """)
+        rows = cur.fetchall()
     result = []
     for r in rows:
         result.append({
@@ -561,6 +1221,182 @@ def test_readings():
     return jsonify(result)
 
 
+app.register_blueprint(oven_routes)
+app.register_blueprint(oven_routes, url_prefix=OVEN_PREFIX, name="oven_scoped")
+
+
+# -------------------------
+# Application Lifecycle
+# -------------------------
+# Importing this module only defines the app and its routes. create_app() loads the config,
+# database and ovens; start() then touches the hardware and starts the background threads,
+# and stop() undoes it. Tools can call create_app() alone to get a working app (routes,
+# test client) without any thread or sensor read.
+stopping = threading.Event()
+startup_times = {}  # Phase -> seconds: import, create_app, start, and "ready" (all of them plus binding)
+for _phase in ("import", "create_app", "start", "ready"):
+    REGISTRY.gauge("pcoven_startup_seconds", "Time spent in each startup phase of the current process.",
+                   fn=lambda phase=_phase: startup_times.get(phase), phase=_phase)
+
+
+def wait(seconds):
+    """Sleeps `seconds` on the app clock. Returns True if stop() was called meanwhile."""
+    return stopping.wait(seconds / getattr(clock, "speed", 1.0))
+
+
+def create_app():
+    """
+    Loads the configuration, brings the database schema up to date and builds the ovens,
+    without starting anything. Safe to call more than once.
+
+    Returns:
+        Flask: The app.
+    """
+    global simulation, clock, config, writer, default_oven, sampler_group
+    if config is not None:
+        return app
+    started = time.perf_counter()
+    startup_times["import"] = started - IMPORT_START
+    configure_logging()
+    if oven_sim.enabled():
+        simulation = oven_sim.Simulation.from_env()
+        clock = simulation.clock
+        log.info("Running against the simulated oven at %gx real time.", clock.speed)
+    config = load_config()
+    init_db()
+    writer = ReadingWriter(
+        batch_size=config.get("db_batch_size", 12),
+        flush_interval=config.get("db_flush_interval", 30),
+    )
+    REGISTRY.register("pcoven_db_batch_rows", "Readings per committed batch insert.", writer.batch_sizes)
+    REGISTRY.register("pcoven_db_flush_seconds", "Time to insert and commit one batch of readings.",
+                      writer.flush_latency)
+    REGISTRY.counter("pcoven_db_flush_errors_total", "Batch inserts that failed and were requeued.",
+                     fn=lambda: writer.flush_errors)
+    REGISTRY.gauge("pcoven_db_pending_rows", "Readings queued in memory for the next batch.",
+                   fn=writer.pending_count)
+    for oven_id, settings in load_oven_settings(config):
+        add_oven(oven_id, settings)
+    default_oven = ovens[DEFAULT_OVEN_ID]
+    sampler_group = SamplerGroup([oven.sampler for oven in ovens.values()],
+                                 interval=config.get("sample_interval", 0.5), clock=clock)
+    load_timer()
+    startup_times["create_app"] = time.perf_counter() - started
+    return app
+
+
+def start():
+    """
+    Sets up the heaters and lights, then starts the database writer, the sampler, the
+    logger and the timer, so the first sensor read happens with the outputs initialized.
+    Does nothing if already started.
+    """
+    global logger_thread, timer_thread_instance
+    create_app()
+    if logger_thread is not None:
+        return
+    started = time.perf_counter()
+    stopping.clear()
+    init_gpio()
+    writer.start()
+    sampler_group.start()
+    logger_thread = threading.Thread(target=temperature_logger, daemon=True, name="logger")
+    logger_thread.start()
+    timer_thread_instance = threading.Thread(target=timer_thread, daemon=True, name="timer")
+    timer_thread_instance.start()
+    atexit.register(stop)
+    startup_times["start"] = time.perf_counter() - started
+
+
+def stop():
+    """
+    Stops the PID loops and the background threads, writes out pending readings and
+    settings, and releases the heater outputs. Ovens keep their on/off setting. Does
+    nothing if not started.
+    """
+    global logger_thread, timer_thread_instance, heater_group
+    if logger_thread is None:
+        return
+    atexit.unregister(stop)
+    stopping.set()
+    # Nothing may drive a heater once its output is closed below.
+    for oven in ovens.values():
+        oven.stop_control()
+    sampler_group.stop()
+    for thread in (logger_thread, timer_thread_instance):
+        thread.join(timeout=5)
+    logger_thread = timer_thread_instance = None
+    writer.stop()
+    for oven in ovens.values():
+        if oven.heater is not None:
+            oven.heater.close()
+    if heater_group is not None:
+        heater_group.close()
+        heater_group = None
+    config.close()
+    log.info("Stopped.")
+
+
+def handle_sigterm(signum, frame):
+    # Turn systemd's SIGTERM into a normal exit so the atexit hooks flush pending readings.
+    sys.exit(0)
+
+
+# -------------------------
+# Serving
+# -------------------------
+SERVERS = ("waitress", "threaded", "dev")
+# Waitress workers kept free of /events streams for polls and page loads.
+STREAM_RESERVE = 4
+
+
+def serve(host='0.0.0.0', port=5000, server=None, threads=None):
+    """
+    Starts the app (see start()) and serves it until the process is stopped. The cold-start
+    time, from the first line of this module to the server listening, is logged and kept
+    in startup_times["ready"].
+
+    Args:
+        server: "waitress" (default) runs the production WSGI server with a fixed pool of
+            `threads` workers. Every open /events stream holds a worker for as long as the
+            dashboard is open, so size `server_threads` for the number of dashboards plus
+            STREAM_RESERVE for polls and page loads; streams beyond that are turned away.
+            "threaded" is werkzeug's server with one thread per request (used when waitress
+            is not installed); "dev" is the Flask debug server.
+            Defaults to $PCOVEN_SERVER, then the `server` config setting.
+        threads: waitress worker threads (default: the `server_threads` config setting).
+    """
+    start()
+    server = server or os.environ.get("PCOVEN_SERVER") or config.get("server", "waitress")
+    if server not in SERVERS:
+        raise ValueError(f"server must be one of {', '.join(SERVERS)}, not {server!r}")
+    if server == "waitress":
+        try:
+            import waitress
+        except ImportError:
+            log.warning("waitress is not installed; falling back to the threaded werkzeug server")
+            server = "threaded"
+    if server == "waitress":
+        global max_event_streams
+        threads = threads or config.get("server_threads", 16)
+        max_event_streams = max(1, threads - STREAM_RESERVE)
+        # send_bytes=1 writes each server-sent event out as soon as it is yielded instead of
+        # buffering 18 kB per connection.
+        httpd = waitress.create_server(app, host=host, port=port, threads=threads, send_bytes=1, ident="pcoven")
+        log_ready(host, port, server)
+        httpd.run()
+    else:
+        log_ready(host, port, server)
+        app.run(host=host, port=port, debug=(server == "dev"), use_reloader=False, threaded=True)
+
+
+def log_ready(host, port, server):
+    startup_times["ready"] = time.perf_counter() - IMPORT_START
+    log.info("Serving on %s:%d with the %s server; cold start %.0f ms (import %.0f ms, setup %.0f ms, "
+             "start %.0f ms)", host, port, server, *(startup_times[phase] * 1e3 for phase in
+                                                     ("ready", "import", "create_app", "start")))
+
+
 if __name__ == '__main__':
-    init_gpio()  # Initialize GPIO now
-    app.run(host='0.0.0.0', port=5000, debug=True, use_reloader=False)
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    serve()
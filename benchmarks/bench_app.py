@@ -0,0 +1,159 @@
+"""
+App-level benchmarks, each run in a fresh process in a scratch copy of the repository with
+the oven simulator:
+
+    startup - importing app.py, create_app() (config, schema check, ovens) and the first request
+    data    - /cycles/<id>/data latency for 1k/10k/100k-reading cycles, live (readings
+              table) and archived (decoded per request, then from the payload cache)
+    purge   - purge_old_cycles() with max_cycles finished cycles plus a backlog to delete
+"""
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+
+from common import per_call, result, scratch_copy
+
+CYCLE_SIZES = (1000, 10000, 100000)
+READING_INTERVAL = 5  # seconds, as logged by temperature_logger
+
+
+def worker_env():
+    return dict(os.environ, PCOVEN_SIMULATE="1", PCOVEN_SIM_SPEED="1", PCOVEN_LOG_LEVEL="WARNING")
+
+
+def run_worker(workdir, task, quick):
+    args = [sys.executable, os.path.abspath(__file__), "--worker", task] + (["--quick"] if quick else [])
+    out = subprocess.run(args, cwd=workdir, env=worker_env(), capture_output=True, text=True, timeout=600)
+    if out.returncode != 0:
+        raise RuntimeError(f"{task} benchmark failed:\n{out.stderr}")
+    return json.loads(out.stdout)
+
+
+def run(quick=False):
+    workdir = scratch_copy()
+    try:
+        # The first start creates the database; time the ones after it, as on every boot.
+        run_worker(workdir, "startup", quick)
+        startups = [run_worker(workdir, "startup", quick) for _ in range(3 if quick else 5)]
+        results = [
+            result("app.import", round(statistics.median(s["import_s"] for s in startups) * 1e3, 1), "ms"),
+            result("app.create_app", round(statistics.median(s["create_app_s"] for s in startups) * 1e3, 1), "ms"),
+            result("app.first_request", round(statistics.median(s["first_request_s"] for s in startups) * 1e3, 1),
+                   "ms"),
+        ]
+        for task in ("data", "purge"):
+            results.extend(run_worker(workdir, task, quick))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+# -------------------------
+# Worker side (runs in the scratch directory)
+# -------------------------
+def add_cycle(app, readings, finished):
+    """Inserts a cycle with `readings` readings, archived if `finished`. Returns its id."""
+    import numpy as np
+
+    import cycle_archive
+
+    start = time.time() - readings * READING_INTERVAL
+    ts = (start + np.arange(readings) * READING_INTERVAL) * 1000
+    temperature = 350.0 + 5.0 * np.sin(np.arange(readings) / 50.0)
+    set_temperature = np.full(readings, 350.0)
+    with app.writer.connection() as conn:
+        cycle_id = conn.execute("INSERT INTO cycles (start_time, end_time) VALUES (?, ?)",
+                                (time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(start)),
+                                 time.strftime("%Y-%m-%d %H:%M:%S") if finished else None)).lastrowid
+        if finished:
+            blob = cycle_archive.encode(ts.astype(np.int64), temperature, set_temperature)
+            conn.execute("INSERT INTO cycle_archive (cycle_id, readings, first_ts, last_ts, data) VALUES (?, ?, ?, ?, ?)",
+                         (cycle_id, readings, int(ts[0]), int(ts[-1]), blob))
+        else:
+            conn.executemany(app.writer.INSERT_SQL, (
+                (cycle_id, time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(t / 1000)), int(t), temp, 350.0,
+                 50.0, None, 1, None)
+                for t, temp in zip(ts, temperature)))
+        conn.commit()
+    return cycle_id
+
+
+def data_worker(app, quick):
+    client = app.app.test_client()
+    sizes = CYCLE_SIZES[:2] if quick else CYCLE_SIZES
+    repeat = 3 if quick else 7
+    results = []
+    for readings in sizes:
+        live = add_cycle(app, readings, finished=False)
+        archived = add_cycle(app, readings, finished=True)
+        results.append(result("app.cycle_data", round(per_call(lambda: client.get(f"/cycles/{live}/data"),
+                                                               repeat=repeat) * 1e3, 2),
+                              "ms", readings=readings, source="live"))
+        # A distinct query string per call misses the payload cache, so every call decodes.
+        misses = iter(range(1_000_000))
+        results.append(result("app.cycle_data", round(per_call(
+            lambda: client.get(f"/cycles/{archived}/data?nocache={next(misses)}"), repeat=repeat) * 1e3, 2),
+            "ms", readings=readings, source="archive"))
+        client.get(f"/cycles/{archived}/data")
+        results.append(result("app.cycle_data", round(per_call(lambda: client.get(f"/cycles/{archived}/data"),
+                                                               number=20, repeat=repeat) * 1e3, 3),
+                              "ms", readings=readings, source="cached"))
+    return results
+
+
+def purge_worker(app, quick):
+    import numpy as np
+
+    import cycle_archive
+
+    keep = app.config.get("max_cycles", 1000)
+    backlog = 50
+    readings = 1440  # two hours at one reading per 5 s
+    ts = (time.time() - readings * READING_INTERVAL + np.arange(readings) * READING_INTERVAL) * 1000
+    blob = cycle_archive.encode(ts.astype(np.int64), np.full(readings, 350.0), np.full(readings, 350.0))
+    with app.writer.connection() as conn:
+        for i in range(keep + backlog):
+            end = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(time.time() - (keep + backlog - i) * 3600))
+            cycle_id = conn.execute("INSERT INTO cycles (start_time, end_time) VALUES (?, ?)", (end, end)).lastrowid
+            conn.execute("INSERT INTO cycle_archive (cycle_id, readings, first_ts, last_ts, data) VALUES (?, ?, ?, ?, ?)",
+                         (cycle_id, readings, int(ts[0]), int(ts[-1]), blob))
+        conn.commit()
+    start = time.perf_counter()
+    app.purge_old_cycles()
+    purge_s = time.perf_counter() - start
+    # Every later cycle end runs the purge with nothing (or one cycle) to delete.
+    idle_s = per_call(app.purge_old_cycles, number=5)
+    return [
+        result("app.purge", round(purge_s * 1e3, 2), "ms", cycles=keep + backlog, deleted=backlog),
+        result("app.purge", round(idle_s * 1e3, 2), "ms", cycles=keep, deleted=0),
+    ]
+
+
+def worker(task, quick):
+    sys.path.insert(0, os.getcwd())
+    start = time.perf_counter()
+    import app
+
+    imported = time.perf_counter()
+    app.create_app()
+    created = time.perf_counter()
+    if task == "startup":
+        app.app.test_client().get("/status")
+        return {"import_s": imported - start, "create_app_s": created - imported,
+                "first_request_s": time.perf_counter() - created}
+    return {"data": data_worker, "purge": purge_worker}[task](app, quick)
+
+
+if __name__ == '__main__':
+    if "--worker" in sys.argv:
+        output = worker(sys.argv[sys.argv.index("--worker") + 1], "--quick" in sys.argv)
+        print(json.dumps(output))
+        # Nothing was started; the scratch directory is discarded.
+        sys.stdout.flush()
+        os._exit(0)
+    for r in run("--quick" in sys.argv):
+        print(json.dumps(r))
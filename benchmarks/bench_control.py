@@ -0,0 +1,82 @@
+"""
+Control path: PID step cost and relay auto-tune analysis time on recorded traces.
+"""
+import logging
+import random
+
+import numpy as np
+
+from common import per_call, result
+
+import oven_sim
+from pid import pid_step
+from pid_autotune import analyze_oscillation, auto_tune_pid
+
+# Ovens to record relay tests from (oven_sim.ThermalOven parameters).
+TRACE_OVENS = {
+    "default": {},
+    "slow": {"air_capacity": 24000.0, "dead_time": 10.0, "sensor_lag": 15.0},
+}
+
+
+class ManualClock:
+    """A clock whose sleep() advances time instantly, so a 10-minute test runs at CPU speed."""
+
+    def __init__(self, start=1_700_000_000.0):
+        self.now = start
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += max(0.0, seconds)
+
+
+def record_relay_trace(**oven_params):
+    """Runs auto_tune_pid's relay test against the oven model. Returns the temperatures it read."""
+    random.seed(2)
+    clock = ManualClock()
+    oven = oven_sim.ThermalOven(clock, **oven_params)
+    temps = []
+
+    def read():
+        temps.append(oven.measured_temperature())
+        return temps[-1]
+
+    auto_tune_pid(read_temperature=read, set_output=oven.set_duty, clock=clock)
+    return temps
+
+
+def replay_relay_trace(temps):
+    """Runs auto_tune_pid over a recorded trace: the analysis cost of one whole relay test."""
+    samples = iter(temps)
+    return auto_tune_pid(read_temperature=lambda: next(samples, None), set_output=None, clock=ManualClock())
+
+
+def run(quick=False):
+    steps = 20000 if quick else 200000
+    pid_s = per_call(lambda: pid_step(5.0, 5.5, 10.0, 1.0, 2.0, 0.1, 5.0), number=steps)
+    results = [result("control.pid_step", round(pid_s * 1e9, 1), "ns")]
+
+    candidates = 1000
+    kp, ki, kd = (np.random.default_rng(3).uniform(0.0, 10.0, candidates) for _ in range(3))
+    error = np.full(candidates, 5.0)
+    integral = np.zeros(candidates)
+    batch_s = per_call(lambda: pid_step(error, error, integral, 1.0, kp, ki, kd, clip=np.clip),
+                       number=200 if quick else 2000)
+    results.append(result("control.pid_step_vectorized", round(batch_s * 1e6, 2), "us", candidates=candidates))
+
+    # The relay test logs every toggle and warns that these short traces do not converge;
+    # keep the benchmark output readable.
+    logging.getLogger("pid_autotune").setLevel(logging.ERROR)
+    for name, params in TRACE_OVENS.items():
+        temps = record_relay_trace(**params)
+        t = np.arange(len(temps), dtype=float)
+        results.append(result("autotune.analyze", round(per_call(lambda: analyze_oscillation(t, temps)) * 1e3, 3),
+                              "ms", trace=name, samples=len(temps)))
+        replay_s = per_call(lambda: replay_relay_trace(temps), repeat=3 if quick else 5)
+        results.append(result("autotune.relay_test", round(replay_s * 1e3, 2), "ms", trace=name, samples=len(temps)))
+    return results
@@ -0,0 +1,51 @@
+"""
+Logger write path: ReadingWriter insert throughput with one commit per reading versus
+batched commits, against a fresh database (synchronous=FULL, as on the Pi).
+"""
+import os
+import shutil
+import tempfile
+import time
+
+from common import result
+
+import db
+from db import ReadingWriter
+
+
+def fresh_db(path):
+    db.DB_FILE = path
+    db.init_db()
+
+
+def insert_rate(path, rows, batch_size):
+    """Readings per second through ReadingWriter.add() with a commit every `batch_size` rows."""
+    writer = ReadingWriter(db_file=path, batch_size=batch_size)
+    with writer.connection() as conn:
+        cycle_id = conn.execute("INSERT INTO cycles (start_time) VALUES (CURRENT_TIMESTAMP)").lastrowid
+        conn.commit()
+    now = time.time()
+    start = time.perf_counter()
+    for i in range(rows):
+        writer.add(cycle_id, now + i * 5, 350.0 + (i % 7) * 0.25, 350.0, duty=42.0, segment=None)
+        if writer.pending_count() >= batch_size:
+            writer.flush()
+    writer.flush()
+    elapsed = time.perf_counter() - start
+    writer.stop()
+    return rows / elapsed
+
+
+def run(quick=False):
+    workdir = tempfile.mkdtemp(prefix="pcoven-bench-db-")
+    results = []
+    try:
+        for batch_size, rows in ((1, 500 if quick else 2000), (12, 6000 if quick else 24000),
+                                 (100, 20000 if quick else 100000)):
+            path = os.path.join(workdir, f"batch{batch_size}.db")
+            fresh_db(path)
+            rate = insert_rate(path, rows, batch_size)
+            results.append(result("db.insert", round(rate), "rows/s", better="higher", batch_size=batch_size))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
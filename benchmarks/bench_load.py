@@ -0,0 +1,205 @@
+"""
+Load benchmark for the web server.
+
+Starts the app against the oven simulator in a scratch copy of the repository, once per
+server mode (see app.serve), and drives it with N simulated dashboards plus one chart
+client:
+
+    dashboard - holds a /events stream open, as the dashboard page does, and polls
+                /current_temperature and /status every `--poll` seconds
+    chart     - reloads the full chart payload (/current_temp_history) back to back
+
+Reports the p50/p99 latency of /current_temperature for each mode.
+
+Usage:
+    python benchmarks/bench_load.py --dashboards 8 --duration 30
+    python benchmarks/bench_load.py --servers dev waitress --json load.json
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from common import scratch_copy
+
+# Runs in the scratch directory: app.py keeps its database and config in the working directory.
+LAUNCHER = """
+import sys
+import app
+app.serve(host="127.0.0.1", port=int(sys.argv[1]), server=sys.argv[2])
+"""
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100 * len(values)))]
+
+
+class Server:
+    """The app running in a subprocess with the simulated oven."""
+
+    def __init__(self, mode, sim_speed=10):
+        self.mode = mode
+        self.port = free_port()
+        self.base = f"http://127.0.0.1:{self.port}"
+        self.dir = scratch_copy()
+        env = dict(os.environ, PCOVEN_SIMULATE="1", PCOVEN_SIM_SPEED=str(sim_speed), PCOVEN_LOG_LEVEL="WARNING")
+        self.proc = subprocess.Popen([sys.executable, "-c", LAUNCHER, str(self.port), mode], cwd=self.dir,
+                                     env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def wait_ready(self, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.proc.poll() is not None:
+                raise RuntimeError(f"{self.mode} server exited with status {self.proc.returncode}")
+            try:
+                urllib.request.urlopen(self.base + "/status", timeout=1).read()
+                return
+            except (urllib.error.URLError, OSError):
+                time.sleep(0.2)
+        raise RuntimeError(f"{self.mode} server did not start within {timeout} s")
+
+    def stop(self):
+        self.proc.terminate()
+        try:
+            self.proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+            self.proc.wait()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+
+def timed_get(url, timeout=30):
+    """Returns the request latency in seconds, or None if it failed."""
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            response.read()
+    except (urllib.error.URLError, OSError):
+        return None
+    return time.perf_counter() - start
+
+
+def dashboard(base, poll, stop, latencies, errors):
+    stream = None
+    try:
+        stream = urllib.request.urlopen(base + "/events", timeout=30)
+        stream.readline()
+    except (urllib.error.URLError, OSError):
+        errors.append("events")
+
+    def drain():
+        # Reads until the server goes away; the stream is closed by this thread only.
+        try:
+            while not stop.is_set() and stream.readline():
+                pass
+        except (OSError, ValueError):
+            pass
+        finally:
+            stream.close()
+
+    if stream is not None:
+        threading.Thread(target=drain, daemon=True).start()
+    while not stop.is_set():
+        latency = timed_get(base + "/current_temperature")
+        if latency is None:
+            errors.append("current_temperature")
+        else:
+            latencies.append(latency)
+        if timed_get(base + "/status") is None:
+            errors.append("status")
+        stop.wait(poll)
+
+
+def chart(base, stop, latencies, errors):
+    while not stop.is_set():
+        latency = timed_get(base + "/current_temp_history")
+        if latency is None:
+            errors.append("current_temp_history")
+        else:
+            latencies.append(latency)
+
+
+def run(mode, dashboards=4, duration=20.0, poll=1.0, warmup=5.0, sim_speed=10):
+    """
+    Benchmarks one server mode and returns a dict of results (latencies in milliseconds).
+    """
+    server = Server(mode, sim_speed)
+    try:
+        server.wait_ready()
+        # Turn the oven on so readings, events and the chart payload keep changing.
+        urllib.request.urlopen(urllib.request.Request(server.base + "/power", method="POST"), timeout=5).read()
+        time.sleep(warmup)
+        stop = threading.Event()
+        poll_latencies, chart_latencies, errors = [], [], []
+        threads = [threading.Thread(target=dashboard, args=(server.base, poll, stop, poll_latencies, errors))
+                   for _ in range(dashboards)]
+        threads.append(threading.Thread(target=chart, args=(server.base, stop, chart_latencies, errors)))
+        for t in threads:
+            t.start()
+        time.sleep(duration)
+        stop.set()
+        for t in threads:
+            t.join(timeout=35)
+    finally:
+        server.stop()
+    ms = lambda v: None if v is None else round(v * 1000, 2)
+    return {
+        "server": mode,
+        "dashboards": dashboards,
+        "duration_s": duration,
+        "current_temperature": {
+            "requests": len(poll_latencies),
+            "p50_ms": ms(percentile(poll_latencies, 50)),
+            "p99_ms": ms(percentile(poll_latencies, 99)),
+        },
+        "chart": {
+            "requests": len(chart_latencies),
+            "p50_ms": ms(percentile(chart_latencies, 50)),
+            "p99_ms": ms(percentile(chart_latencies, 99)),
+        },
+        "errors": len(errors),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--servers", nargs="+", default=["dev", "waitress"],
+                        help="server modes to compare (dev, threaded, waitress)")
+    parser.add_argument("--dashboards", type=int, default=4, help="simulated dashboards")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds of load per server")
+    parser.add_argument("--poll", type=float, default=1.0, help="dashboard poll interval in seconds")
+    parser.add_argument("--sim-speed", type=float, default=10, help="oven simulator speed-up")
+    parser.add_argument("--json", metavar="PATH", help="also write the results to PATH as JSON")
+    args = parser.parse_args(argv)
+
+    results = [run(mode, args.dashboards, args.duration, args.poll, sim_speed=args.sim_speed)
+               for mode in args.servers]
+    print(f"{'server':<10} {'requests':>9} {'p50 ms':>8} {'p99 ms':>8} {'chart p50':>10} {'errors':>7}")
+    for r in results:
+        poll = r["current_temperature"]
+        print(f"{r['server']:<10} {poll['requests']:>9} {poll['p50_ms']!s:>8} {poll['p99_ms']!s:>8} "
+              f"{r['chart']['p50_ms']!s:>10} {r['errors']:>7}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+"""
+Sensor path: MAX31855 frame decoding and driver reads against FakeSpiDev.
+"""
+import random
+
+from common import per_call, result
+
+import temperature_sensor
+from temperature_sensor import FakeSpiDev, MAX31855, decode_max31855, encode_max31855
+
+
+def frames(count=1000, fault_every=50):
+    """Realistic frames: oven temperatures with cold-junction drift and the odd fault."""
+    rng = random.Random(1)
+    out = []
+    for i in range(count):
+        fault = temperature_sensor.FAULT_OPEN_CIRCUIT if i % fault_every == 0 else None
+        out.append(encode_max31855(rng.uniform(20.0, 230.0), rng.uniform(20.0, 45.0), fault))
+    return out
+
+
+def run(quick=False):
+    raw = frames()
+    rounds = 20 if quick else 200
+
+    def decode_all():
+        for frame in raw:
+            decode_max31855(frame)
+
+    decode_s = per_call(decode_all, number=rounds) / len(raw)
+    results = [result("sensor.decode", round(1 / decode_s), "frames/s", better="higher")]
+
+    reads = 2000 if quick else 20000
+    for oversample in (1, 4):
+        driver = MAX31855(spi_factory=lambda: FakeSpiDev(temperature_c=200.0, noise_c=0.5), oversample=oversample)
+        read_s = per_call(driver.read, number=reads)
+        results.append(result("sensor.driver_read", round(1 / read_s), "reads/s", better="higher",
+                              oversample=oversample))
+    return results
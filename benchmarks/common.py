@@ -0,0 +1,61 @@
+"""
+Helpers shared by the benchmarks: importing the app's modules from the repository, scratch
+copies of it for benchmarks that need the whole app, timing and result records.
+"""
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO not in sys.path:
+    sys.path.insert(0, REPO)
+
+COPY = ("templates", "static", "schema.sql", "config.json")
+
+
+def scratch_copy():
+    """
+    Copies the app's code, templates and config into a temporary directory, so a benchmark
+    can run the app (which keeps its database and config in the working directory) without
+    touching the checkout. The caller removes it.
+    """
+    path = tempfile.mkdtemp(prefix="pcoven-bench-")
+    for name in os.listdir(REPO):
+        if name.endswith(".py") or name in COPY:
+            src = os.path.join(REPO, name)
+            if os.path.isdir(src):
+                shutil.copytree(src, os.path.join(path, name))
+            else:
+                shutil.copy(src, path)
+    return path
+
+
+def per_call(fn, number=1, repeat=5):
+    """
+    Calls fn() `number` times per run, `repeat` runs. Returns the median seconds per call,
+    which is steadier than the mean on a shared box.
+    """
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        runs.append((time.perf_counter() - start) / number)
+    return statistics.median(runs)
+
+
+def result(name, value, unit, better="lower", **params):
+    """
+    One benchmark result.
+
+    Args:
+        name: dotted name, stable between versions so results can be compared.
+        value: the measurement, in `unit`.
+        better: "lower" (times) or "higher" (throughputs); run.py uses it to tell a
+            regression from an improvement.
+        params: sizes and settings the value depends on (part of the comparison key).
+    """
+    return {"name": name, "value": value, "unit": unit, "better": better, "params": params}
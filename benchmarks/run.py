@@ -0,0 +1,115 @@
+"""
+Runs the benchmark suite and writes the results as JSON, optionally comparing them with the
+results of an earlier version.
+
+Usage:
+    python benchmarks/run.py --output before.json
+    (change things)
+    python benchmarks/run.py --output after.json --compare before.json
+
+Groups (all by default): sensor, control, db, app. `--quick` uses smaller sizes for a fast
+smoke run. Everything runs on any Linux box: the sensor is FakeSpiDev and the app runs
+against the oven simulator in a scratch directory. The load benchmark (bench_load.py) takes
+minutes and is run on its own.
+"""
+import argparse
+import datetime
+import json
+import platform
+import subprocess
+import sys
+import time
+
+import bench_app
+import bench_control
+import bench_db
+import bench_sensor
+from common import REPO
+
+GROUPS = {
+    "sensor": bench_sensor.run,
+    "control": bench_control.run,
+    "db": bench_db.run,
+    "app": bench_app.run,
+}
+
+
+def git_revision():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO, capture_output=True, text=True)
+    except OSError:
+        return None
+    return out.stdout.strip() or None
+
+
+def key(r):
+    return r["name"], json.dumps(r["params"], sort_keys=True)
+
+
+def compare(old, new, threshold):
+    """
+    Prints old vs new for every result present in both. Returns the results that got worse
+    by more than `threshold` (a fraction).
+    """
+    before = {key(r): r for r in old["results"]}
+    regressions = []
+    print(f"{'benchmark':<48} {'before':>12} {'after':>12} {'change':>8}")
+    for r in new["results"]:
+        o = before.get(key(r))
+        if o is None or not o["value"]:
+            continue
+        change = (r["value"] - o["value"]) / o["value"]
+        worse = change > threshold if r["better"] == "lower" else change < -threshold
+        params = ",".join(f"{k}={v}" for k, v in r["params"].items())
+        label = f"{r['name']}[{params}]" if params else r["name"]
+        print(f"{label:<48} {o['value']:>12} {r['value']:>12} {change:>+8.1%} {r['unit']}"
+              + ("  REGRESSION" if worse else ""))
+        if worse:
+            regressions.append(r)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the PCoven benchmark suite.")
+    parser.add_argument("groups", nargs="*", help=f"groups to run: {', '.join(GROUPS)} (default: all)")
+    parser.add_argument("--quick", action="store_true", help="smaller sizes for a fast smoke run")
+    parser.add_argument("--output", "-o", metavar="PATH", help="write the results to PATH (default: stdout)")
+    parser.add_argument("--compare", metavar="PATH", help="results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="relative change counted as a regression (default 0.15)")
+    args = parser.parse_args(argv)
+    unknown = set(args.groups) - set(GROUPS)
+    if unknown:
+        parser.error(f"unknown groups: {', '.join(sorted(unknown))}")
+
+    results = []
+    for group in args.groups or GROUPS:
+        start = time.perf_counter()
+        results.extend(GROUPS[group](quick=args.quick))
+        print(f"{group}: {time.perf_counter() - start:.1f} s", file=sys.stderr)
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "platform": platform.platform(),
+            "quick": args.quick,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), report, args.threshold)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+import json
+import logging
+import os
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+
+class ConfigStore(dict):
+    """
+    The settings dict, kept in memory and written back to disk lazily.
+
+    Callers mutate it like a normal dict and then call save(). A plain save() only marks
+    the store dirty; a background thread writes it out `debounce` seconds after the first
+    unsaved change, so a burst of updates (arrow clicks, keypad entries) costs one write.
+    save(immediate=True) writes synchronously and is used for safety-relevant transitions
+    such as the oven turning on or off. Every write goes to a temporary file that is fsynced
+    and then renamed over the original, so a power loss leaves either the old or the new
+    file, never a truncated one.
+    """
+
+    def __init__(self, path, defaults=None, debounce=5.0):
+        super().__init__()
+        self.path = path
+        self.debounce = debounce
+        self._dirty_since = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                self.update(json.load(f))
+        elif defaults:
+            self.update(defaults)
+
+    def save(self, immediate=False):
+        """Marks the store dirty, or writes it now if `immediate` is set."""
+        if immediate:
+            self.flush()
+            return
+        with self._lock:
+            if self._dirty_since is None:
+                self._dirty_since = time.monotonic()
+        self._ensure_flusher()
+        self._wake.set()
+
+    def flush(self):
+        """Writes the store to disk now. The store stays dirty if the write fails."""
+        with self._lock:
+            text = self._serialize()
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                f.write(text)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            self._dirty_since = None
+
+    def _serialize(self, attempts=3):
+        # Request handlers change nested values (pid_tunings, the ovens list) in place
+        # without the lock; json.dumps walks the whole tree at once, and a dump that races
+        # such a change ("changed size during iteration") is simply redone.
+        for attempt in range(attempts):
+            try:
+                return json.dumps(self, indent=4)
+            except RuntimeError:
+                if attempt == attempts - 1:
+                    raise
+
+    def close(self):
+        """Writes any pending changes; called on shutdown."""
+        with self._lock:
+            dirty = self._dirty_since is not None
+        if dirty:
+            self.flush()
+
+    def _ensure_flusher(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            while True:
+                with self._lock:
+                    dirty_since = self._dirty_since
+                if dirty_since is None:
+                    break
+                remaining = dirty_since + self.debounce - time.monotonic()
+                if remaining <= 0:
+                    try:
+                        self.flush()
+                    except Exception:
+                        # Still dirty: try again after another debounce period.
+                        log.exception("Error saving config")
+                        time.sleep(self.debounce)
+                        continue
+                    break
+                time.sleep(remaining)
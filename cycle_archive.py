@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Compact archive of finished cycles.
+
+While a cycle runs its readings are rows in `readings` (one row, plus an index entry, per
+reading). When it ends, end_current_cycle() packs them into one compressed blob in
+`cycle_archive` and deletes the rows, so finished cycles take a few bytes per reading and
+far more of them fit on the SD card.
+
+Blob layout (version 2): a fixed header followed by zlib-compressed columns:
+
+    ts               int32 deltas in ms (the first relative to the header's first_ts)
+    temperature      int32 deltas of the temperature in RESOLUTION_F steps (one MAX31855
+                     bit, so calibrated values are kept within half the sensor's resolution)
+    duty             uint16 in DUTY_QUANTUM steps, DUTY_NULL where it was not recorded
+    set_temperature  run-length encoded: int32 values in SETPOINT_QUANTUM steps, uint32 lengths
+    segment          run-length encoded: int32 values (-1 for none), uint32 lengths
+    probes           one column per probe of a multi-probe oven: int32 deltas in
+                     RESOLUTION_F steps, PROBE_NULL where the probe faulted
+
+Version 1 blobs (no probe columns, no probe count in the header) are still read.
+
+While a cycle runs, the per-probe temperatures of each reading are packed into the row's
+`probes` column (pack_probes: one int16 per probe) instead of a row per probe.
+
+Every column is byte-shuffled (all first bytes, then all second bytes, ...) before
+compression, so the mostly-zero high bytes of small deltas compress to almost nothing.
+
+Run `python cycle_archive.py --backfill` to archive cycles that ended before this existed.
+"""
+import logging
+import struct
+import sys
+import zlib
+from collections import namedtuple
+from contextlib import closing
+
+import numpy as np
+
+from temperature_sensor import RESOLUTION_F
+
+log = logging.getLogger(__name__)
+
+FORMAT_VERSION = 2
+SETPOINT_QUANTUM = 0.01  # °F; profile ramps produce fractional setpoints
+DUTY_QUANTUM = 0.01  # percent
+DUTY_NULL = 0xFFFF
+PROBE_NULL = -0x8000
+COMPRESSION_LEVEL = 9
+
+# version, readings, first_ts, set_temperature runs, segment runs, probes
+_HEADER = struct.Struct("<BIqIIB")
+_HEADER_V1 = struct.Struct("<BIqII")
+
+# Decoded cycle: float arrays, one element per reading. duty and segment are NaN where
+# they were not recorded. probes is an (n, probes) array, NaN where a probe faulted, with
+# no columns for single-thermocouple ovens.
+CycleData = namedtuple("CycleData", ["ts", "temperature", "set_temperature", "duty", "segment", "probes"],
+                       defaults=(None,))
+
+
+def _shuffle(array):
+    return array.view(np.uint8).reshape(-1, array.itemsize).T.tobytes()
+
+
+def _unshuffle(buf, dtype, n):
+    dtype = np.dtype(dtype)
+    return np.frombuffer(buf, dtype=np.uint8).reshape(dtype.itemsize, n).T.copy().view(dtype).ravel()
+
+
+def _run_lengths(values):
+    """Returns (run values, run lengths) of an integer array."""
+    if len(values) == 0:
+        return values[:0], np.empty(0, dtype=np.uint32)
+    starts = np.flatnonzero(np.diff(values, prepend=values[0] - 1))
+    lengths = np.diff(np.append(starts, len(values)))
+    return values[starts], lengths.astype(np.uint32)
+
+
+def pack_probes(temperatures):
+    """Packs one reading's per-probe temperatures (°F, None where faulted) for the readings table."""
+    return struct.pack(f"<{len(temperatures)}h", *(
+        PROBE_NULL if t is None else max(-0x7FFF, min(0x7FFF, round(t / RESOLUTION_F)))
+        for t in temperatures))
+
+
+def unpack_probes(blobs):
+    """Returns the (n, probes) float array of n pack_probes() blobs (None blobs become NaN rows)."""
+    k = max((len(b) for b in blobs if b is not None), default=0) // 2
+    null_row = struct.pack(f"<{k}h", *[PROBE_NULL] * k)
+    raw = np.frombuffer(b"".join(b if b is not None and len(b) == 2 * k else null_row for b in blobs),
+                        dtype="<i2").reshape(len(blobs), k)
+    probes = np.round(raw * RESOLUTION_F, 2)
+    probes[raw == PROBE_NULL] = np.nan
+    return probes
+
+
+def encode(ts, temperature, set_temperature, duty=None, segment=None, probes=None):
+    """
+    Packs one cycle's readings into an archive blob.
+
+    Args:
+        ts (np.ndarray): Reading times in epoch milliseconds, ascending.
+        temperature (np.ndarray): Measured temperatures in °F.
+        set_temperature (np.ndarray): Setpoints in °F.
+        duty (np.ndarray): Heater duty in percent (NaN where unknown), or None.
+        segment (np.ndarray): Profile segment index (NaN for none), or None.
+        probes (np.ndarray): (n, probes) per-probe temperatures in °F (NaN where faulted),
+            or None.
+
+    Returns:
+        bytes
+    """
+    ts = np.asarray(ts, dtype=np.int64)
+    n = len(ts)
+    first_ts = int(ts[0]) if n else 0
+    ts_delta = np.diff(ts, prepend=first_ts).astype(np.int32)
+
+    temp_q = np.rint(np.asarray(temperature, dtype=float) / RESOLUTION_F).astype(np.int32)
+    temp_delta = np.diff(temp_q, prepend=np.int32(0)).astype(np.int32)
+
+    duty = np.full(n, np.nan) if duty is None else np.asarray(duty, dtype=float)
+    duty_q = np.where(np.isnan(duty), DUTY_NULL,
+                      np.rint(np.clip(np.nan_to_num(duty), 0, 100) / DUTY_QUANTUM)).astype(np.uint16)
+
+    set_q = np.rint(np.asarray(set_temperature, dtype=float) / SETPOINT_QUANTUM).astype(np.int32)
+    set_values, set_lengths = _run_lengths(set_q)
+
+    segment = np.full(n, np.nan) if segment is None else np.asarray(segment, dtype=float)
+    seg_values, seg_lengths = _run_lengths(np.where(np.isnan(segment), -1, segment).astype(np.int32))
+
+    probes = np.empty((n, 0)) if probes is None else np.asarray(probes, dtype=float).reshape(n, -1)
+    probe_q = np.where(np.isnan(probes), PROBE_NULL, np.rint(np.nan_to_num(probes) / RESOLUTION_F))
+    probe_delta = np.diff(probe_q.astype(np.int32), axis=0, prepend=np.zeros((1, probes.shape[1]), np.int32))
+
+    columns = [ts_delta, temp_delta, duty_q, set_values, set_lengths, seg_values, seg_lengths]
+    columns += [np.ascontiguousarray(probe_delta[:, j], dtype=np.int32) for j in range(probes.shape[1])]
+    body = b"".join(_shuffle(a) for a in columns)
+    header = _HEADER.pack(FORMAT_VERSION, n, first_ts, len(set_values), len(seg_values), probes.shape[1])
+    return header + zlib.compress(body, COMPRESSION_LEVEL)
+
+
+def decode(blob):
+    """Unpacks an archive blob. Returns CycleData."""
+    version = blob[0]
+    if version == 1:
+        header = _HEADER_V1
+        _, n, first_ts, set_runs, seg_runs = header.unpack_from(blob)
+        k = 0
+    elif version == FORMAT_VERSION:
+        header = _HEADER
+        _, n, first_ts, set_runs, seg_runs, k = header.unpack_from(blob)
+    else:
+        raise ValueError(f"Unsupported cycle archive version {version}")
+    body = zlib.decompress(blob[header.size:])
+    columns = []
+    offset = 0
+    for dtype, count in ((np.int32, n), (np.int32, n), (np.uint16, n), (np.int32, set_runs),
+                         (np.uint32, set_runs), (np.int32, seg_runs), (np.uint32, seg_runs),
+                         *[(np.int32, n)] * k):
+        size = np.dtype(dtype).itemsize * count
+        columns.append(_unshuffle(body[offset:offset + size], dtype, count))
+        offset += size
+    ts_delta, temp_delta, duty_q, set_values, set_lengths, seg_values, seg_lengths = columns[:7]
+
+    ts = (first_ts + np.cumsum(ts_delta, dtype=np.int64)).astype(float)
+    # Round away the float noise of the quantum multiplication so the JSON stays short.
+    temperature = np.round(np.cumsum(temp_delta, dtype=np.int64) * RESOLUTION_F, 2)
+    duty = np.where(duty_q == DUTY_NULL, np.nan, np.round(duty_q * DUTY_QUANTUM, 2))
+    set_temperature = np.round(np.repeat(set_values, set_lengths) * SETPOINT_QUANTUM, 2)
+    segment = np.repeat(seg_values, seg_lengths).astype(float)
+    segment[segment < 0] = np.nan
+    probe_q = np.cumsum(np.column_stack(columns[7:]) if k else np.empty((n, 0), np.int32), axis=0)
+    probes = np.round(probe_q * RESOLUTION_F, 2)
+    probes[probe_q == PROBE_NULL] = np.nan
+    return CycleData(ts, temperature, set_temperature, duty, segment, probes)
+
+
+# -------------------------
+# Storage
+# -------------------------
+def _readings_arrays(conn, cycle_id):
+    rows = conn.execute("""
+        SELECT ts, temperature, set_temperature, duty, segment, probes
+        FROM readings
+        WHERE cycle_id = ?
+        ORDER BY ts ASC
+    """, (cycle_id,)).fetchall()
+    data = np.array([tuple(r)[:5] for r in rows], dtype=float).reshape(-1, 5)  # NULLs become NaN
+    return CycleData(*data.T, unpack_probes([r[5] for r in rows]))
+
+
+def archive_cycle(conn, cycle_id):
+    """
+    Moves one cycle's readings into cycle_archive and deletes the rows. The caller commits
+    (in the same transaction, so the readings are never lost or duplicated).
+
+    Returns:
+        int: Size of the blob in bytes, or None if the cycle has no readings.
+    """
+    data = _readings_arrays(conn, cycle_id)
+    if len(data.ts) == 0:
+        return None
+    blob = encode(*data)
+    conn.execute("""
+        INSERT OR REPLACE INTO cycle_archive (cycle_id, readings, first_ts, last_ts, data)
+        VALUES (?, ?, ?, ?, ?)
+    """, (cycle_id, len(data.ts), int(data.ts[0]), int(data.ts[-1]), blob))
+    conn.execute("DELETE FROM readings WHERE cycle_id = ?", (cycle_id,))
+    log.info("Archived cycle %s: %d readings in %d bytes", cycle_id, len(data.ts), len(blob))
+    return len(blob)
+
+
+def load_archived(conn, cycle_id):
+    """Returns the cycle's CycleData from the archive, or None if it is not archived."""
+    row = conn.execute("SELECT data FROM cycle_archive WHERE cycle_id = ?", (cycle_id,)).fetchone()
+    return decode(row[0]) if row is not None else None
+
+
+def load_cycle(conn, cycle_id):
+    """Returns CycleData for any cycle: from the archive if it has been archived, else from readings."""
+    data = load_archived(conn, cycle_id)
+    return data if data is not None else _readings_arrays(conn, cycle_id)
+
+
+def backfill(conn):
+    """Archives every ended cycle whose readings are still in the readings table. Returns their ids."""
+    ids = [row[0] for row in conn.execute("""
+        SELECT DISTINCT r.cycle_id FROM readings r
+        JOIN cycles c ON c.id = r.cycle_id
+        WHERE c.end_time IS NOT NULL
+    """)]
+    for cycle_id in ids:
+        archive_cycle(conn, cycle_id)
+        conn.commit()
+    return ids
+
+
+if __name__ == "__main__":
+    from db import get_db, init_db
+
+    if "--backfill" not in sys.argv:
+        print("Usage: python cycle_archive.py --backfill [--vacuum]")
+        sys.exit(1)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    init_db()
+    with closing(get_db()) as conn:
+        done = backfill(conn)
+        if "--vacuum" in sys.argv:
+            # Deleted rows only become free pages; VACUUM gives the space back to the file system.
+            conn.execute("VACUUM")
+    print(f"Archived {len(done)} cycles: {done}")
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Per-cycle summary metrics, computed once when a cycle ends and stored in cycle_summary.
+
+Run `python cycle_stats.py --backfill` to compute summaries for cycles that ended before
+this table existed (their sensor_faults is left NULL, since fault counts were not kept).
+"""
+import sys
+from contextlib import closing
+
+import numpy as np
+
+from cycle_archive import load_cycle
+
+# Half-width of the "at temperature" band around the setpoint, in °F.
+DEFAULT_BAND = 10.0
+
+SUMMARY_COLUMNS = (
+    "duration_s", "readings", "time_to_setpoint_s", "max_overshoot", "steady_mean_error",
+    "steady_std_error", "time_in_band_s", "heater_seconds", "sensor_faults",
+)
+
+
+def summarize(ts, temperature, set_temperature, duty=None, band=DEFAULT_BAND):
+    """
+    Computes the summary metrics of one cycle in a single vectorized pass.
+
+    Args:
+        ts (np.ndarray): Reading times in epoch milliseconds, ascending.
+        temperature (np.ndarray): Measured temperatures in °F.
+        set_temperature (np.ndarray): Setpoints in °F.
+        duty (np.ndarray): Heater duty in percent (NaN where unknown), or None.
+        band (float): Half-width of the setpoint band in °F.
+
+    Returns:
+        dict: duration_s, readings, time_to_setpoint_s (None if never reached),
+        max_overshoot, steady_mean_error / steady_std_error (temperature minus setpoint
+        after the setpoint was first reached), time_in_band_s and heater_seconds (integral
+        of duty, i.e. equivalent seconds at full power; None if duty was not recorded).
+    """
+    n = len(ts)
+    summary = dict.fromkeys(SUMMARY_COLUMNS)
+    summary["readings"] = n
+    if n == 0:
+        return summary
+    t = (np.asarray(ts, dtype=float) - ts[0]) / 1000.0
+    error = np.asarray(temperature, dtype=float) - np.asarray(set_temperature, dtype=float)
+    # Each reading stands for the interval until the next one.
+    dt = np.diff(t, append=t[-1])
+
+    summary["duration_s"] = float(t[-1])
+    summary["time_in_band_s"] = float(dt[np.abs(error) <= band].sum())
+
+    reached = np.flatnonzero(error >= -band)
+    if len(reached):
+        first = reached[0]
+        steady = error[first:]
+        summary["time_to_setpoint_s"] = float(t[first])
+        summary["max_overshoot"] = float(max(0.0, steady.max()))
+        summary["steady_mean_error"] = float(steady.mean())
+        summary["steady_std_error"] = float(steady.std())
+
+    if duty is not None:
+        duty = np.asarray(duty, dtype=float)
+        if not np.all(np.isnan(duty)):
+            summary["heater_seconds"] = float(np.nansum(duty * dt) / 100.0)
+    return summary
+
+
+def load_cycle_arrays(conn, cycle_id):
+    """Returns (ts, temperature, set_temperature, duty) arrays for one cycle, archived or not."""
+    data = load_cycle(conn, cycle_id)
+    return data.ts, data.temperature, data.set_temperature, data.duty
+
+
+def store_cycle_summary(conn, cycle_id, sensor_faults=None, band=DEFAULT_BAND):
+    """Computes and stores (or replaces) the summary of one cycle. The caller commits."""
+    summary = summarize(*load_cycle_arrays(conn, cycle_id), band=band)
+    summary["sensor_faults"] = sensor_faults
+    conn.execute(f"""
+        INSERT OR REPLACE INTO cycle_summary (cycle_id, {", ".join(SUMMARY_COLUMNS)})
+        VALUES (?, {", ".join("?" for _ in SUMMARY_COLUMNS)})
+    """, (cycle_id, *(summary[c] for c in SUMMARY_COLUMNS)))
+    return summary
+
+
+def backfill(conn, band=DEFAULT_BAND):
+    """Stores summaries for every ended cycle that does not have one yet. Returns their ids."""
+    ids = [row[0] for row in conn.execute("""
+        SELECT c.id FROM cycles c
+        LEFT JOIN cycle_summary s ON s.cycle_id = c.id
+        WHERE c.end_time IS NOT NULL AND s.cycle_id IS NULL
+    """)]
+    for cycle_id in ids:
+        store_cycle_summary(conn, cycle_id, band=band)
+    conn.commit()
+    return ids
+
+
+if __name__ == "__main__":
+    from db import get_db, init_db
+
+    if "--backfill" not in sys.argv:
+        print("Usage: python cycle_stats.py --backfill")
+        sys.exit(1)
+    init_db()
+    with closing(get_db()) as conn:
+        done = backfill(conn)
+    print(f"Backfilled summaries for {len(done)} cycles: {done}")
@@ -1,21 +1,325 @@
 # db.py
+import logging
+import os
+import queue
 import sqlite3
-from contextlib import closing
+import threading
+import time
+from contextlib import closing, contextmanager
+from datetime import datetime
+
+import rollups
+from metrics import Histogram, SIZE_BUCKETS
 
 DB_FILE = "oven_data.db"
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schema.sql")
+
+# Size of the pool of read-only connections used by the HTTP routes.
+READ_POOL_SIZE = 4
+
+log = logging.getLogger(__name__)
+
+
+def configure_connection(conn):
+    """Applies the per-connection pragmas used by every connection we open."""
+    conn.execute("PRAGMA busy_timeout = 5000")
+    conn.execute("PRAGMA cache_size = -4000")  # 4 MB page cache
+    conn.execute("PRAGMA temp_store = MEMORY")
+    return conn
+
 
 def get_db():
     """Returns a connection to the SQLite database."""
     conn = sqlite3.connect(DB_FILE)
     conn.row_factory = sqlite3.Row  # Enable accessing columns by name.
-    return conn
+    return configure_connection(conn)
+
+
+# -------------------------
+# Schema migrations
+# -------------------------
+# schema.sql always describes the current schema. Databases created by older versions are
+# brought up to date by the migrations below, keyed by the version they upgrade *to*; the
+# applied version is tracked in PRAGMA user_version.
+def _migrate_epoch_ts(db):
+    """v1: integer epoch-millisecond `ts` column plus a covering (cycle_id, ts) index."""
+    if not _column_exists(db, "readings", "ts"):
+        db.execute("ALTER TABLE readings ADD COLUMN ts INTEGER")
+    db.execute("""
+        UPDATE readings
+        SET ts = CAST(ROUND((julianday(timestamp, 'utc') - 2440587.5) * 86400000) AS INTEGER)
+    """)
+
+
+def _migrate_duty(db):
+    """v2: heater duty recorded with each reading (used by the cycle summaries)."""
+    if not _column_exists(db, "readings", "duty"):
+        db.execute("ALTER TABLE readings ADD COLUMN duty REAL")
+
+
+def _migrate_profiles(db):
+    """v3: cure profile of each cycle and profile segment of each reading."""
+    if not _column_exists(db, "cycles", "profile_id"):
+        db.execute("ALTER TABLE cycles ADD COLUMN profile_id INTEGER REFERENCES profiles(id)")
+    if not _column_exists(db, "readings", "segment"):
+        db.execute("ALTER TABLE readings ADD COLUMN segment INTEGER")
+
+
+def _migrate_ovens(db):
+    """v4: oven id on cycles, readings and rollups (rollups were keyed by time alone)."""
+    for table in ("cycles", "readings"):
+        if not _column_exists(db, table, "oven_id"):
+            db.execute(f"ALTER TABLE {table} ADD COLUMN oven_id INTEGER NOT NULL DEFAULT 1")
+    if _table_exists(db, "rollups") and not _column_exists(db, "rollups", "oven_id"):
+        db.execute("ALTER TABLE rollups RENAME TO rollups_v3")
+        db.execute("""
+            CREATE TABLE rollups (
+                oven_id INTEGER NOT NULL,
+                resolution INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                temp_min REAL NOT NULL,
+                temp_max REAL NOT NULL,
+                temp_sum REAL NOT NULL,
+                err_min REAL NOT NULL,
+                err_max REAL NOT NULL,
+                err_sum REAL NOT NULL,
+                PRIMARY KEY (oven_id, resolution, bucket)
+            )
+        """)
+        db.execute("INSERT INTO rollups SELECT 1, * FROM rollups_v3")
+        db.execute("DROP TABLE rollups_v3")
+
+
+def _migrate_probes(db):
+    """v5: per-probe temperatures of multi-probe ovens, and the probe names of each cycle."""
+    if not _column_exists(db, "readings", "probes"):
+        db.execute("ALTER TABLE readings ADD COLUMN probes BLOB")
+    if not _column_exists(db, "cycles", "probes"):
+        db.execute("ALTER TABLE cycles ADD COLUMN probes TEXT")
+
+
+MIGRATIONS = {
+    1: _migrate_epoch_ts,
+    2: _migrate_duty,
+    3: _migrate_profiles,
+    4: _migrate_ovens,
+    5: _migrate_probes,
+}
+SCHEMA_VERSION = max(MIGRATIONS)
+
+
+def _column_exists(db, table, column):
+    return any(row["name"] == column for row in db.execute(f"PRAGMA table_info({table})"))
+
+
+def _table_exists(db, table):
+    return db.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone() is not None
+
+
+def migrate(db):
+    """Applies any pending migrations to an existing database."""
+    version = db.execute("PRAGMA user_version").fetchone()[0]
+    for target in sorted(MIGRATIONS):
+        if target > version:
+            log.info("Migrating database schema to version %d", target)
+            MIGRATIONS[target](db)
+            db.execute(f"PRAGMA user_version = {target}")
+
 
 def init_db():
-    """Initializes the database using the schema.sql file."""
+    """
+    Initializes the database using the schema.sql file, migrating older databases first.
+    A database already at SCHEMA_VERSION is left alone, so a normal start costs one query.
+
+    Returns:
+        bool: True if the schema was created or upgraded.
+    """
     with closing(get_db()) as db:
-        with open("schema.sql", "r") as f:
+        if db.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION:
+            return False
+        # WAL is persistent in the database file, so readers never block the writer (and
+        # vice versa) for every connection opened afterwards.
+        db.execute("PRAGMA journal_mode = WAL")
+        if _column_exists(db, "readings", "id"):
+            migrate(db)
+        with open(SCHEMA_FILE, "r") as f:
             db.executescript(f.read())
+        db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
         db.commit()
+        log.info("Database schema set up at version %d", SCHEMA_VERSION)
+        return True
+
+
+# -------------------------
+# Pooled read connections (HTTP routes)
+# -------------------------
+_read_pool = queue.LifoQueue(maxsize=READ_POOL_SIZE)
+
+
+@contextmanager
+def read_db():
+    """
+    Yields a read-only connection from a small pool.
+
+    Connections are opened with check_same_thread disabled so that they can be handed to
+    whichever request thread needs one next; each is used by one thread at a time.
+    """
+    try:
+        conn = _read_pool.get_nowait()
+    except queue.Empty:
+        conn = sqlite3.connect(DB_FILE, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        configure_connection(conn)
+        conn.execute("PRAGMA query_only = ON")
+    try:
+        yield conn
+    finally:
+        try:
+            _read_pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+
+# -------------------------
+# Batched reading writer
+# -------------------------
+class ReadingWriter:
+    """
+    Owns the single long-lived write connection.
+
+    Readings are queued in memory and inserted with executemany() once `batch_size` rows
+    are pending or `flush_interval` seconds have passed, so the SD card sees one commit
+    (and one fsync) per batch instead of one per reading. Each batch also updates the
+    rollup tiers (see rollups.py) in the same transaction. Other writes (cycle start/end,
+    purges) go through execute()/connection() so that there is only ever one writer.
+    """
+
+    INSERT_SQL = """
+        INSERT INTO readings (cycle_id, timestamp, ts, temperature, set_temperature, duty, segment, oven_id, probes)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """
+
+    def __init__(self, db_file=None, batch_size=12, flush_interval=30.0):
+        self.db_file = db_file or DB_FILE
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        self._conn = None
+        self._conn_lock = threading.RLock()
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread = None
+        self.batch_sizes = Histogram(SIZE_BUCKETS)  # Rows per committed batch
+        self.flush_latency = Histogram()  # Seconds per batch insert + commit
+        self.flush_errors = 0
+
+    def _connection(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.db_file, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            configure_connection(conn)
+            conn.execute("PRAGMA journal_mode = WAL")
+            # FULL makes every committed batch durable; with batching that is one fsync
+            # per batch, and only rows still pending in memory can be lost on power loss.
+            conn.execute("PRAGMA synchronous = FULL")
+            self._conn = conn
+        return self._conn
+
+    def add(self, cycle_id, timestamp, temperature, set_temperature, duty=None, segment=None, oven_id=1,
+            probes=None):
+        """
+        Queues one reading for the next batch.
+
+        Args:
+            timestamp (float): Time of the reading in seconds since the epoch.
+            duty (float): Heater duty cycle in percent at the time of the reading.
+            segment (int): Index of the active cure profile segment, if a profile is running.
+            oven_id (int): The oven the reading came from.
+            probes (sequence of float): Per-probe temperatures (None where faulted) of a
+                multi-probe oven, stored packed in the same row.
+        """
+        if probes is not None:
+            from cycle_archive import pack_probes  # Only multi-probe ovens need it (and NumPy)
+            probes = pack_probes(probes)
+        row = (cycle_id, datetime.fromtimestamp(timestamp), int(timestamp * 1000), temperature, set_temperature,
+               duty, segment, oven_id, probes)
+        with self._pending_lock:
+            self._pending.append(row)
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._wake.set()
+
+    def pending_count(self):
+        with self._pending_lock:
+            return len(self._pending)
+
+    def flush(self):
+        """Writes all pending readings in one transaction. Returns the number of rows written."""
+        with self._conn_lock:
+            with self._pending_lock:
+                batch = self._pending
+                self._pending = []
+            if not batch:
+                return 0
+            conn = self._connection()
+            start = time.perf_counter()
+            try:
+                with conn:
+                    conn.executemany(self.INSERT_SQL, batch)
+                    rollups.add_readings(conn, ((row[7], row[2], row[3], row[4]) for row in batch))
+            except sqlite3.Error as e:
+                log.error("Error writing readings batch: %s", e)
+                self.flush_errors += 1
+                with self._pending_lock:
+                    self._pending[:0] = batch
+                return 0
+            self.flush_latency.observe(time.perf_counter() - start)
+            self.batch_sizes.observe(len(batch))
+            return len(batch)
+
+    @contextmanager
+    def connection(self):
+        """
+        Yields the write connection with pending readings already flushed. The caller is
+        responsible for committing.
+        """
+        with self._conn_lock:
+            self.flush()
+            yield self._connection()
+
+    def execute(self, sql, params=()):
+        """Flushes pending readings, runs one write statement and commits it. Returns the cursor."""
+        with self.connection() as conn:
+            with conn:
+                return conn.execute(sql, params)
+
+    def _run(self):
+        while not self._stopping:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Flushes anything pending and closes the write connection."""
+        self._stopping = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        with self._conn_lock:
+            self.flush()
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
 
 if __name__ == "__main__":
     init_db()
@@ -0,0 +1,98 @@
+import numpy as np
+
+MODES = ("lttb", "minmax")
+
+
+def lttb_indices(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets decimation.
+
+    Keeps the first and last points and, from each of the n_out - 2 buckets in between,
+    the point forming the largest triangle with the previously kept point and the mean of
+    the next bucket. The bucket loop is inherently sequential, but each step is a handful
+    of vectorized operations over one bucket.
+
+    Args:
+        x, y (np.ndarray): Sample coordinates, x ascending.
+        n_out (int): Number of points to keep (>= 3).
+
+    Returns:
+        np.ndarray: Sorted indices of the kept points.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    # Mean of every bucket up front; the "next bucket" average for the last bucket is the final point.
+    sums_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1)
+    sums_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1)
+    counts = np.diff(edges)
+    avg_x = np.append(sums_x / counts, x[-1])
+    avg_y = np.append(sums_y / counts, y[-1])
+
+    out = np.empty(n_out, dtype=np.int64)
+    out[0] = 0
+    out[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        bx = x[lo:hi]
+        by = y[lo:hi]
+        cx, cy = avg_x[i + 1], avg_y[i + 1]
+        area = np.abs((x[a] - cx) * (by - y[a]) - (x[a] - bx) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+
+def minmax_indices(y, n_out):
+    """
+    Min/max-per-bucket decimation: splits the series into n_out // 2 buckets of near-equal
+    size and keeps the minimum and maximum of each, so every peak and trough survives.
+    NaN samples (failed reads) are ignored. Fully vectorized.
+
+    Returns:
+        np.ndarray: Sorted, unique indices of the kept points.
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    buckets = max(1, n_out // 2)
+    if 2 * buckets >= n:
+        return np.arange(n)
+    starts = np.linspace(0, n, buckets + 1).astype(np.int64)[:-1]
+    bucket = np.repeat(np.arange(buckets), np.diff(np.append(starts, n)))
+    positions = np.arange(n)
+    kept = [[0, n - 1]]
+    for extreme in (np.fmin, np.fmax):
+        # First index in each bucket holding its extreme; n for a bucket of only NaN.
+        value = extreme.reduceat(y, starts)
+        first = np.minimum.reduceat(np.where(y == value[bucket], positions, n), starts)
+        kept.append(first[first < n])
+    return np.unique(np.concatenate(kept))
+
+
+def decimate(x, y, n_out, mode="lttb", keep=None):
+    """
+    Returns the indices of at most ~n_out points that preserve the shape of (x, y).
+
+    Args:
+        x, y (np.ndarray): Sample coordinates, x ascending.
+        n_out (int): Target number of points.
+        mode (str): "lttb" or "minmax".
+        keep (np.ndarray): Optional extra indices that must be kept (e.g. setpoint changes).
+    """
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {MODES}")
+    if mode == "lttb":
+        idx = lttb_indices(x, y, n_out)
+    else:
+        idx = minmax_indices(y, n_out)
+    if keep is not None and len(keep):
+        idx = np.union1d(idx, keep)
+    return idx
+
+
+def step_change_indices(values):
+    """Indices on both sides of every change in a step-like series (such as the setpoint)."""
+    changes = np.flatnonzero(np.diff(values) != 0)
+    return np.unique(np.concatenate((changes, changes + 1)))
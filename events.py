@@ -0,0 +1,65 @@
+import json
+import queue
+import threading
+
+
+class EventBroker:
+    """
+    Fan-out of server-sent events to every connected browser.
+
+    Producers (the sensor sampler, the logger, the timer and the control routes) call
+    publish(); each message is formatted once and dropped into every subscriber's queue.
+    Publishing never blocks: a subscriber that falls too far behind loses its oldest
+    messages instead of stalling the producer.
+    """
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def format(event, data):
+        """Formats one SSE message."""
+        return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+    def subscribe(self):
+        q = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def publish(self, event, data):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        if not subscribers:
+            return
+        message = self.format(event, data)
+        for q in subscribers:
+            try:
+                q.put_nowait(message)
+            except queue.Full:
+                try:
+                    q.get_nowait()
+                    q.put_nowait(message)
+                except (queue.Empty, queue.Full):
+                    pass
+
+    def stream(self, q, heartbeat=15.0):
+        """
+        Yields messages from a subscriber queue forever, with a comment line every
+        `heartbeat` seconds so proxies keep the connection open and dead clients are noticed.
+        """
+        while True:
+            try:
+                yield q.get(timeout=heartbeat)
+            except queue.Empty:
+                yield ": keepalive\n\n"
@@ -0,0 +1,96 @@
+"""
+HTTP caching helpers: strong ETags for data that never changes once written (finished
+cycles), an in-process LRU of serialized payloads, and content fingerprints of templates
+for the ETags of pages rendered from them.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+# Sent with responses that can never change (finished cycles).
+IMMUTABLE = "public, max-age=31536000, immutable"
+# Sent with responses that may change; the browser keeps them but revalidates every time.
+REVALIDATE = "no-cache"
+
+
+def etag_matches(if_none_match, etag):
+    """
+    True if a request's If-None-Match header (werkzeug ETags, possibly empty) matches the
+    strong `etag` (the unquoted tag).
+    """
+    return if_none_match is not None and if_none_match.contains(etag)
+
+
+class PayloadCache:
+    """
+    Thread-safe LRU of serialized response bodies, bounded by total size in bytes. Keys are
+    tuples whose first element is the cycle id, so a purge can drop every variant (points,
+    mode, segment) of a cycle at once.
+    """
+
+    def __init__(self, max_bytes=8 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, etag, body):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old[1])
+            self._entries[key] = (etag, body)
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def invalidate(self, cycle_ids):
+        """Drops every cached payload of the given cycles."""
+        cycle_ids = set(cycle_ids)
+        with self._lock:
+            for key in [k for k in self._entries if k[0] in cycle_ids]:
+                self.size -= len(self._entries.pop(key)[1])
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class FileFingerprints:
+    """Short content hashes of files under a folder, recomputed only when a file's mtime changes."""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self._hashes = {}
+        self._lock = threading.Lock()
+
+    def fingerprint(self, filename):
+        path = os.path.join(self.folder, filename)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        with self._lock:
+            cached = self._hashes.get(filename)
+            if cached is not None and cached[0] == mtime:
+                return cached[1]
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()[:12]
+        with self._lock:
+            self._hashes[filename] = (mtime, digest)
+        return digest
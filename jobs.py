@@ -0,0 +1,134 @@
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+log = logging.getLogger(__name__)
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when it notices it has been cancelled."""
+
+
+class JobConflict(Exception):
+    """Raised by JobRunner.submit() when a job it must not run alongside is active."""
+
+    def __init__(self, job):
+        super().__init__(f"Job {job.id} ({job.name}) is already running")
+        self.job = job
+
+
+class Job:
+    """
+    Handle passed to a running job function, and the record the status endpoints read.
+
+    The job function reports progress with progress() and should call check_cancelled()
+    regularly (between chunks of work) so cancel requests take effect promptly.
+    """
+
+    def __init__(self, job_id, name):
+        self.id = job_id
+        self.name = name
+        self.state = "pending"  # pending, running, done, failed, cancelled
+        self.progress_fraction = 0.0
+        self.message = ""
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self._cancel = threading.Event()
+
+    def progress(self, fraction, message=None):
+        self.progress_fraction = max(0.0, min(1.0, float(fraction)))
+        if message is not None:
+            self.message = message
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "state": self.state,
+            "progress": round(self.progress_fraction, 3),
+            "message": self.message,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobRunner:
+    """
+    Runs long operations in background threads so HTTP handlers can return immediately
+    with a job id. Finished jobs are kept (up to `keep`) so their results can be fetched.
+    """
+
+    def __init__(self, keep=20):
+        self.keep = keep
+        self._jobs = OrderedDict()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def submit(self, name, fn, *args, on_done=None, exclusive=(), **kwargs):
+        """
+        Starts fn(job, *args, **kwargs) in the background and returns the Job. If given,
+        on_done(job) is called after fn returns successfully (in the job's thread).
+
+        Raises:
+            JobConflict: If a pending or running job has one of the names in `exclusive`.
+                The check and the submit are atomic, so of two racing submits one fails.
+        """
+        with self._lock:
+            exclusive = set(exclusive)
+            for other in self._jobs.values():
+                if other.state in ("pending", "running") and other.name in exclusive:
+                    raise JobConflict(other)
+            job = Job(next(self._ids), name)
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.keep:
+                oldest = next(iter(self._jobs.values()))
+                if oldest.state in ("pending", "running"):
+                    break
+                self._jobs.popitem(last=False)
+        threading.Thread(target=self._run, args=(job, fn, args, kwargs, on_done), daemon=True).start()
+        return job
+
+    def _run(self, job, fn, args, kwargs, on_done):
+        job.state = "running"
+        try:
+            job.result = fn(job, *args, **kwargs)
+            job.state = "done"
+            job.progress(1.0)
+            if on_done is not None:
+                on_done(job)
+        except JobCancelled:
+            job.state = "cancelled"
+        except Exception as e:
+            job.state = "failed"
+            job.error = str(e)
+            log.exception("Job %s (%s) failed", job.id, job.name)
+        finally:
+            job.finished = time.time()
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is not None:
+            job._cancel.set()
+        return job
+
+    def active(self, name=None):
+        """Returns the running/pending jobs, optionally only those with the given name."""
+        with self._lock:
+            return [j for j in self._jobs.values()
+                    if j.state in ("pending", "running") and (name is None or j.name == name)]
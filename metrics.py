@@ -0,0 +1,223 @@
+"""
+Low-overhead in-process metrics (counters, gauges, histograms) and their Prometheus text
+exposition for the /metrics endpoint.
+"""
+import bisect
+import math
+import threading
+from collections import OrderedDict
+
+# Latency buckets in seconds: 10 per decade from 1 µs to 10 s, so a quantile read from the
+# histogram is within about 12% of the true value.
+LATENCY_BUCKETS = tuple(10 ** (e / 10.0) for e in range(-60, 11))
+# Row counts per database batch.
+SIZE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+# Only every n-th latency bucket is exported, to keep /metrics small (about 2 per decade).
+EXPORT_BUCKET_STEP = 5
+
+
+class Counter:
+    """Monotonic count. With `fn`, the value is read from fn() at scrape time instead."""
+
+    def __init__(self, fn=None):
+        self.fn = fn
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        return self.fn() if self.fn is not None else self._value
+
+
+class Gauge:
+    """Current value. With `fn`, the value is read from fn() at scrape time instead."""
+
+    def __init__(self, fn=None):
+        self.fn = fn
+        self._value = 0.0
+
+    def set(self, value):
+        self._value = value
+
+    @property
+    def value(self):
+        return self.fn() if self.fn is not None else self._value
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram for latencies and other non-negative values.
+
+    observe() is a bisect and a few additions under a lock, cheap enough for the control
+    loop's hot path. Quantiles are interpolated within the bucket that contains them.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)  # Last slot: above the largest bucket
+        self._lock = threading.Lock()
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[i] += 1
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+
+    def quantile(self, q):
+        """Estimated q-quantile (0 <= q <= 1), or None before the first observation."""
+        with self._lock:
+            if self.count == 0:
+                return None
+            rank = q * self.count
+            cumulative = 0
+            for i, n in enumerate(self._counts):
+                if n and cumulative + n >= rank:
+                    lower = self.buckets[i - 1] if i > 0 else 0.0
+                    upper = self.buckets[i] if i < len(self.buckets) else self.max
+                    value = lower + (upper - lower) * (rank - cumulative) / n
+                    return min(value, self.max)
+                cumulative += n
+            return self.max
+
+    def cumulative_counts(self, step=1):
+        """(upper bound, observations <= bound) pairs for every `step`-th bucket, ending with (inf, count)."""
+        with self._lock:
+            counts = list(self._counts)
+        result = []
+        total = 0
+        for i, (bound, n) in enumerate(zip(self.buckets + (math.inf,), counts)):
+            total += n
+            if i % step == 0 or bound == math.inf:
+                result.append((bound, total))
+        return result
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean": self.sum / self.count if self.count else None,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+            "max": self.max if self.count else None,
+        }
+
+    def reset(self):
+        with self._lock:
+            self._counts = [0] * (len(self.buckets) + 1)
+            self.count = 0
+            self.sum = 0.0
+            self.max = 0.0
+
+
+class WindowedHistogram(Histogram):
+    """
+    A Histogram that also keeps the observations since the last reset_window() in `window`.
+    The cumulative counts exported on /metrics must never go backwards, so readers that
+    want statistics over their own interval reset the window instead.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        super().__init__(buckets)
+        self.window = Histogram(buckets)
+
+    def observe(self, value):
+        super().observe(value)
+        self.window.observe(value)
+
+    def reset_window(self):
+        self.window.reset()
+
+
+def _format_value(value):
+    if value is None:
+        return "NaN"
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(int(value))
+
+
+def _format_labels(labels, extra=None):
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in items)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + "}"
+
+
+class Registry:
+    """
+    Named metric families, each with any number of label sets.
+
+    counter()/gauge()/histogram() return the metric for a name and label set, creating it
+    on first use, so call sites can look up labeled metrics (e.g. per route) on the fly.
+    register() adds a metric object that already exists elsewhere.
+    """
+
+    def __init__(self):
+        self._families = OrderedDict()  # name -> [type, help, {label tuple: metric}]
+        self._lock = threading.Lock()
+
+    def _get(self, kind, name, help_text, labels, factory):
+        key = tuple(sorted(labels.items()))
+        family = self._families.get(name)
+        if family is not None:
+            metric = family[2].get(key)
+            if metric is not None:
+                return metric
+        with self._lock:
+            family = self._families.setdefault(name, [kind, help_text, {}])
+            if family[0] != kind:
+                raise ValueError(f"metric {name} is already registered as a {family[0]}")
+            return family[2].setdefault(key, factory())
+
+    def counter(self, name, help_text, fn=None, **labels):
+        return self._get("counter", name, help_text, labels, lambda: Counter(fn))
+
+    def gauge(self, name, help_text, fn=None, **labels):
+        return self._get("gauge", name, help_text, labels, lambda: Gauge(fn))
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS, **labels):
+        return self._get("histogram", name, help_text, labels, lambda: Histogram(buckets))
+
+    def register(self, name, help_text, metric, **labels):
+        kind = next(kind for cls, kind in ((Counter, "counter"), (Gauge, "gauge"), (Histogram, "histogram"))
+                    if isinstance(metric, cls))
+        return self._get(kind, name, help_text, labels, lambda: metric)
+
+    def render(self):
+        """The Prometheus text exposition format of every metric."""
+        lines = []
+        with self._lock:
+            families = [(name, kind, help_text, list(metrics.items()))
+                        for name, (kind, help_text, metrics) in self._families.items()]
+        for name, kind, help_text, metrics in families:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, metric in metrics:
+                if kind == "histogram":
+                    step = EXPORT_BUCKET_STEP if metric.buckets == LATENCY_BUCKETS else 1
+                    for bound, count in metric.cumulative_counts(step):
+                        le = "+Inf" if bound == math.inf else f"{bound:.6g}"
+                        lines.append(f"{name}_bucket{_format_labels(labels, ('le', le))} {count}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(float(metric.sum))}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {metric.count}")
+                else:
+                    try:
+                        value = metric.value
+                    except Exception:
+                        value = None
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# The registry behind /metrics.
+REGISTRY = Registry()
@@ -0,0 +1,481 @@
+"""
+Per-oven control.
+
+Every oven (or independently controlled zone of a large oven) is an OvenController with its
+own settings, sensor buffer, heater, PID state, active cycle, cure profile and event stream.
+The only thread an oven runs of its own is its PID control loop, while it is on; everything
+else is shared by all ovens in the process: the sensor sampler thread
+(sensor_sampler.SamplerGroup), the reading logger, the batched DB writer, the
+time-proportioning heater thread (actuators.ProportioningGroup) and the HTTP server.
+
+config.json keeps the first oven's settings at the top level, exactly as before multi-oven
+support. Further ovens are entries of its "ovens" list, e.g.:
+
+    "ovens": [{"id": 2, "name": "Small oven", "ssr_pin": 23, "light_pin": null, "spi_device": 1}]
+
+Any shared setting (pid_period, heater_driver, summary_band, ...) may be overridden per oven.
+
+An oven with several thermocouples (e.g. air, part metal and heater side) lists them under
+"probes" instead of using spi_bus/spi_device; the control loop then runs on their fused
+value (see temperature_sensor.ProbeArray and "probe_fusion"):
+
+    "probes": [{"name": "part", "device": 0}, {"name": "air", "device": 1},
+               {"name": "heater", "device": 2, "weight": 0}],
+    "probe_fusion": "fallback"
+"""
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+
+from events import EventBroker
+from metrics import WindowedHistogram
+from pid import pid_step
+from scheduler import DeadlineScheduler
+from sensor_sampler import SensorSampler
+from temperature_sensor import parse_probes
+
+log = logging.getLogger(__name__)
+
+DEFAULT_OVEN_ID = 1
+
+# Settings that belong to one oven, with their defaults.
+OVEN_DEFAULTS = {
+    "name": None,
+    "ssr_pin": 17,
+    "light_pin": 27,
+    "spi_bus": 0,
+    "spi_device": 0,
+    "probes": None,  # Several thermocouples instead of spi_bus/spi_device; see the module docstring
+    "probe_fusion": "weighted",
+    "target_temperature": 350,
+    "oven_on": False,
+    "light_on": False,
+    "pid_tunings": [1.0, 0.1, 0.05],
+    "calibration_offset": 0.0,
+    "calibration_scale": 1.0,
+}
+# Further ovens have no light unless their entry names a pin.
+EXTRA_OVEN_DEFAULTS = dict(OVEN_DEFAULTS, light_pin=None)
+
+# Per-iteration timings of the control loop, in seconds. "lateness" is how long after its
+# deadline each iteration woke up and "period" the actual time between iterations.
+PID_TIMINGS = ("sensor_read", "compute", "actuate", "iteration", "lateness", "period")
+
+_MISSING = object()
+
+
+class OvenSettings:
+    """
+    One oven's view of the config store. Reads fall back from the oven's own entry to its
+    defaults and then to the shared top-level settings; writes go to the oven's entry. The
+    first oven's entry is the top level itself.
+    """
+
+    def __init__(self, store, entry=None, defaults=OVEN_DEFAULTS):
+        self.store = store
+        self.entry = store if entry is None else entry
+        self.defaults = defaults
+
+    def get(self, key, default=None):
+        if key in self.entry:
+            return self.entry[key]
+        if key in self.defaults:
+            return self.defaults[key]
+        return self.store.get(key, default)
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.entry[key] = value
+
+    def __contains__(self, key):
+        return key in self.entry or key in self.defaults
+
+    def pop(self, key, default=None):
+        return self.entry.pop(key, default)
+
+    def save(self, immediate=False):
+        self.store.save(immediate=immediate)
+
+
+def oven_probes(settings):
+    """The oven's temperature_sensor.Probes, or None for a single thermocouple at spi_bus/spi_device."""
+    entries = settings.get("probes")
+    if not entries:
+        return None
+    return parse_probes(entries, bus=settings["spi_bus"])
+
+
+def chip_selects(settings):
+    probes = oven_probes(settings)
+    if probes is None:
+        return [(settings["spi_bus"], settings["spi_device"])]
+    return [(p.bus, p.device) for p in probes]
+
+
+def load_oven_settings(store):
+    """
+    Returns [(oven_id, OvenSettings)] for every configured oven, the first one first.
+
+    Raises:
+        ValueError: If an extra oven has no id or SSR pin, an oven's probes are invalid,
+            or two ovens share an id, an SSR pin or a thermocouple.
+    """
+    ovens = [(DEFAULT_OVEN_ID, OvenSettings(store))]
+    for entry in store.get("ovens", []):
+        if "id" not in entry or "ssr_pin" not in entry:
+            raise ValueError(f"Every entry of 'ovens' needs an id and an ssr_pin: {entry}")
+        ovens.append((int(entry["id"]), OvenSettings(store, entry, EXTRA_OVEN_DEFAULTS)))
+    for what, key in (("id", lambda s: [oven_id]), ("SSR pin", lambda s: [s["ssr_pin"]]),
+                      ("thermocouple", chip_selects)):
+        seen = set()
+        for oven_id, settings in ovens:
+            for value in key(settings):
+                if value in seen:
+                    raise ValueError(f"Two ovens have the same {what}: {value}")
+                seen.add(value)
+    return ovens
+
+
+def sample_event(sample, probe_names=None):
+    """The SSE payload of a Sample; multi-probe ovens add each probe's temperature and fault."""
+    event = {"t": int(sample.timestamp * 1000), "temperature": sample.temperature, "fault": sample.fault,
+             "cold_junction": sample.internal}
+    if probe_names and sample.probes is not None:
+        event["probes"] = {name: {"temperature": r.temperature, "fault": r.fault}
+                           for name, r in zip(probe_names, sample.probes)}
+    return event
+
+
+class OvenController:
+    """One oven: see the module docstring."""
+
+    def __init__(self, oven_id, settings, read_sensor, writer, clock=time, on_sample=None, on_cycle_end=None,
+                 probe_names=None):
+        """
+        Args:
+            oven_id (int): Stored with the oven's cycles and readings.
+            settings (OvenSettings): The oven's settings.
+            read_sensor (callable): Returns the oven's temperature_sensor.Reading (fused, for
+                a ProbeArray).
+            writer (db.ReadingWriter): The shared writer.
+            clock: The `time` module or a simulated clock.
+            on_sample (callable): Optional; called with (oven, sample) for every sensor sample.
+            on_cycle_end (callable): Optional; called after a cycle has been closed and archived.
+            probe_names (list of str): Names of the probes when read_sensor is a ProbeArray.
+        """
+        self.id = oven_id
+        self.settings = settings
+        self.name = settings.get("name") or f"Oven {oven_id}"
+        self.writer = writer
+        self.clock = clock
+        self.on_sample = on_sample
+        self.on_cycle_end = on_cycle_end
+        self.probe_names = probe_names
+        self.broker = EventBroker()
+        self.sampler = SensorSampler(
+            read_sensor,
+            self.calibrate,
+            interval=settings.get("sample_interval", 0.5),
+            size=settings.get("sample_buffer_size", 1200),
+            on_sample=self._publish_sample,
+            clock=clock,
+        )
+        self.heater = None  # actuators.Actuator, set up by the app's init_gpio()
+        self.light = None  # write(level) for the light pin, if the oven has one
+
+        self.current_cycle_id = None
+        self.cycle_fault_base = 0  # sampler.fault_count when the current cycle started
+        self.profile_run = None  # The running profiles.ProfileRun, if any
+
+        self.integral = 0.0
+        self.last_error = 0.0
+        self.current_duty = 0.0  # Last duty cycle (%) sent to the heater
+        self.pid_thread = None
+        self._halt = threading.Event()  # Set by stop_control() to end the loop without turning the oven off
+        self.scheduler = None
+        self.timing = {name: WindowedHistogram() for name in PID_TIMINGS}
+
+    def __repr__(self):
+        return f"<OvenController {self.id} {self.name!r}>"
+
+    # -------------------------
+    # Sensor
+    # -------------------------
+    def calibrate(self, raw):
+        offset = self.settings.get("calibration_offset", 0.0)
+        scale = self.settings.get("calibration_scale", 1.0)
+        return (raw - offset) / scale
+
+    def _publish_sample(self, sample):
+        if self.on_sample is not None:
+            self.on_sample(self, sample)
+        self.broker.publish("sample", sample_event(sample, self.probe_names))
+
+    def temperature(self):
+        """Returns the latest calibrated temperature from the sampler (None if the last read failed)."""
+        sample = self.sampler.latest()
+        return sample.temperature if sample is not None else None
+
+    def raw_temperature(self):
+        """Returns the latest uncalibrated temperature from the sampler (None if the last read failed)."""
+        sample = self.sampler.latest()
+        return sample.raw if sample is not None else None
+
+    # -------------------------
+    # State
+    # -------------------------
+    @property
+    def on(self):
+        return self.settings.get("oven_on", False)
+
+    def state(self):
+        return {"oven_on": self.on, "light_on": self.settings.get("light_on", False)}
+
+    def current_setpoint(self):
+        """The setpoint in effect: the running profile's, else the manual target temperature."""
+        run = self.profile_run
+        if run is not None and run.setpoint is not None:
+            return run.setpoint
+        return self.settings["target_temperature"]
+
+    def current_segment(self):
+        run = self.profile_run
+        return run.segment if run is not None and not run.finished else None
+
+    def profile_state(self):
+        run = self.profile_run
+        return run.state() if run is not None else {"profile_id": None}
+
+    def set_target(self, temperature):
+        """Sets the manual target temperature; a running profile is released without holding."""
+        self.stop_profile(hold=False)
+        self.settings["target_temperature"] = temperature
+        self.settings.save()
+        self.broker.publish("setpoint", {"target_temperature": temperature})
+
+    def set_light(self, on):
+        self.settings["light_on"] = on
+        self.settings.save()
+        if self.light is not None:
+            try:
+                self.light(on)
+            except Exception as e:
+                log.error("Error toggling light output: %s", e)
+        self.broker.publish("state", self.state())
+
+    # -------------------------
+    # Cycles
+    # -------------------------
+    def start_new_cycle(self, profile_id=None):
+        cur = self.writer.execute(
+            "INSERT INTO cycles (start_time, profile_id, oven_id, probes) VALUES (?, ?, ?, ?)",
+            (datetime.fromtimestamp(self.clock.time()), profile_id, self.id,
+             json.dumps(self.probe_names) if self.probe_names else None))
+        self.current_cycle_id = cur.lastrowid
+        self.cycle_fault_base = self.sampler.fault_count
+        log.info("%s: started new cycle, id %s", self.name, self.current_cycle_id)
+        return self.current_cycle_id
+
+    def end_current_cycle(self):
+        cycle_id = self.current_cycle_id
+        if cycle_id is None:
+            return
+        # Both need NumPy; loading them here keeps it off the startup path.
+        import cycle_archive
+        from cycle_stats import store_cycle_summary
+
+        # connection() flushes the cycle's pending readings before closing it.
+        with self.writer.connection() as conn:
+            with conn:
+                conn.execute("UPDATE cycles SET end_time = ? WHERE id = ?",
+                             (datetime.fromtimestamp(self.clock.time()), cycle_id))
+                summary = store_cycle_summary(conn, cycle_id,
+                                              sensor_faults=self.sampler.fault_count - self.cycle_fault_base,
+                                              band=self.settings.get("summary_band", 10.0))
+                cycle_archive.archive_cycle(conn, cycle_id)
+        log.info("%s: ended cycle, id %s: %s", self.name, cycle_id, summary)
+        self.current_cycle_id = None
+        if self.on_cycle_end is not None:
+            self.on_cycle_end(self, cycle_id)
+
+    def log_reading(self):
+        """Queues one reading of the active cycle; called by the shared logger thread."""
+        sample = self.sampler.latest()
+        current_temp = sample.temperature if sample is not None else None
+        if current_temp is None:
+            log.debug("[Logger] %s: not logging because the last sensor read failed.", self.name)
+            return
+        cycle_id = self.current_cycle_id
+        if not self.on or cycle_id is None:
+            return
+        now = self.clock.time()
+        setpoint = self.current_setpoint()
+        probes = [r.temperature for r in sample.probes] if self.probe_names and sample.probes else None
+        self.writer.add(cycle_id, now, current_temp, setpoint, self.current_duty, self.current_segment(), self.id,
+                        probes)
+        self.broker.publish("reading", {
+            "cycle_id": cycle_id,
+            "x": int(now * 1000),
+            "y_actual": current_temp,
+            "y_set": setpoint
+        })
+
+    # -------------------------
+    # Power and profiles
+    # -------------------------
+    def set_power(self, on, run=None):
+        """
+        Turns the oven on (starting a cycle and the PID loop) or off (ending the cycle). With
+        `run`, the new cycle follows that profiles.ProfileRun.
+        """
+        self.settings["oven_on"] = on
+        if on:
+            self.profile_run = run
+            self.start_new_cycle(run.profile_id if run is not None else None)
+            if self.pid_thread is None or not self.pid_thread.is_alive():
+                self.pid_thread = threading.Thread(target=self.pid_control_loop, daemon=True,
+                                                   name=f"pid-oven-{self.id}")
+                self.pid_thread.start()
+        else:
+            self.profile_run = None
+            self.end_current_cycle()
+        self.settings.save(immediate=True)
+        self.broker.publish("state", self.state())
+        self.broker.publish("profile", self.profile_state())
+        log.info("%s status now: %s", self.name, on)
+
+    def stop_profile(self, hold=True):
+        """Stops the running profile. With hold, the oven keeps its current setpoint under manual control."""
+        run = self.profile_run
+        if run is None:
+            return
+        self.profile_run = None
+        if hold and run.setpoint is not None:
+            self.settings["target_temperature"] = round(run.setpoint, 1)
+            self.settings.save()
+            self.broker.publish("setpoint", {"target_temperature": self.settings["target_temperature"]})
+        self.broker.publish("profile", self.profile_state())
+        log.info("%s: profile %s stopped at segment %d", self.name, run.name, run.segment)
+
+    # -------------------------
+    # PID Control for the heater (using calibrated temperature and tuned PID parameters)
+    # -------------------------
+    def pid_control_loop(self):
+        settings = self.settings
+        scheduler = DeadlineScheduler(settings.get("pid_period", 1.0), clock=self.clock,
+                                      overrun=settings.get("pid_overrun", "skip"))
+        self.scheduler = scheduler
+        timing = self.timing
+        elapsed = 0.0  # Time since the last PID step; spans iterations without a valid sample
+        published_setpoint = None  # Last profile setpoint sent to the dashboards
+        try:
+            while True:
+                dt, lateness = scheduler.wait()
+                if not self.on or self._halt.is_set():
+                    break
+                timing["lateness"].observe(lateness)
+                timing["period"].observe(dt)
+                elapsed += dt
+                # Retrieve tuned PID parameters from configuration; default if not set
+                Kp, Ki, Kd = settings.get("pid_tunings", [1.0, 0.1, 0.05])
+
+                start = time.perf_counter_ns()
+                current_temp = self.temperature()
+                read_done = time.perf_counter_ns()
+
+                run = self.profile_run
+                if run is not None:
+                    # Profile time advances even without a valid sample; soaks just do not count it.
+                    segment = run.segment
+                    setpoint = run.tick(current_temp, dt)
+                    if setpoint is None:
+                        log.info("%s: profile %s finished; turning the oven off.", self.name, run.name)
+                        self.set_power(False)
+                        break
+                    if published_setpoint is None or round(setpoint) != round(published_setpoint):
+                        published_setpoint = setpoint
+                        self.broker.publish("setpoint", {"target_temperature": round(setpoint, 1)})
+                    if run.segment != segment or scheduler.ticks % 15 == 0:
+                        self.broker.publish("profile", run.state())
+                else:
+                    setpoint = settings["target_temperature"]
+
+                if current_temp is None:
+                    # No valid reading: keep the heater off rather than act on stale data.
+                    self.current_duty = 0.0
+                    if self.heater is not None:
+                        self.heater.off()
+                    log.debug("PID %s: no valid temperature sample; heater off.", self.id)
+                    continue
+                error = setpoint - current_temp
+
+                duty_cycle, self.integral = pid_step(error, self.last_error, self.integral, elapsed, Kp, Ki, Kd)
+                self.current_duty = duty_cycle
+                self.last_error = error
+                elapsed = 0.0
+                compute_done = time.perf_counter_ns()
+                if self.heater is not None:
+                    self.heater.set_duty(duty_cycle)
+                done = time.perf_counter_ns()
+
+                timing["sensor_read"].observe((read_done - start) / 1e9)
+                timing["compute"].observe((compute_done - read_done) / 1e9)
+                timing["actuate"].observe((done - compute_done) / 1e9)
+                timing["iteration"].observe((done - start) / 1e9)
+                log.debug("PID %s: setpoint=%s, calibrated_current=%.2f, error=%.2f, duty=%.2f",
+                          self.id, setpoint, current_temp, error, duty_cycle)
+        except Exception:
+            # The oven stays "on" without control; turning it off and on again restarts the loop.
+            log.exception("%s: PID control loop failed; heater off.", self.name)
+        finally:
+            # Never leave the SSR at its last duty, however the loop ends.
+            self.current_duty = 0.0
+            if self.heater is not None:
+                self.heater.off()
+        log.info("%s: PID control loop ended.", self.name)
+
+    def stop_control(self, timeout=5.0):
+        """
+        Ends the PID loop, which turns the heater off on its way out, and waits for it.
+        Unlike set_power(False) the oven keeps its persisted on/off setting and its cycle;
+        used on shutdown, before the heater outputs are closed.
+        """
+        thread = self.pid_thread
+        if thread is None:
+            return
+        self._halt.set()
+        thread.join(timeout)
+        if thread.is_alive():
+            log.warning("%s: PID control loop did not stop within %.0f s", self.name, timeout)
+            return
+        self._halt.clear()
+        self.pid_thread = None
+
+    def pid_timing(self, reset=False):
+        """
+        Control loop scheduling statistics: the configured period, deadlines missed (skipped
+        or run late) and p50/p99/max of each timing in seconds, since startup or since the
+        last call with reset=True. The histograms exported on /metrics are never reset.
+        """
+        scheduler = self.scheduler
+        result = {
+            "period_s": scheduler.period if scheduler else self.settings.get("pid_period", 1.0),
+            "overrun_policy": scheduler.overrun if scheduler else self.settings.get("pid_overrun", "skip"),
+            "running": self.pid_thread is not None and self.pid_thread.is_alive(),
+            "iterations": scheduler.ticks if scheduler else 0,
+            "missed_deadlines": scheduler.missed if scheduler else 0,
+            "skipped_deadlines": scheduler.skipped if scheduler else 0,
+            "late_iterations": scheduler.late if scheduler else 0,
+            "timings": {name: h.window.summary() for name, h in self.timing.items()},
+        }
+        if reset:
+            for h in self.timing.values():
+                h.reset_window()
+        return result
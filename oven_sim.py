@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Simulated oven for running the controller without hardware.
+
+A two-mass thermal model (heater element + oven air/load) is driven by the same duty
+cycle that pid_control_loop sends to the heater actuator, and read back through a sensor
+model with lag, dead time, noise and MAX31855 quantization. Time comes from a SimClock
+that can run faster than real time, so the app's own loops (sampler, PID, logger, timer)
+run unchanged but accelerated.
+
+Enable it for the app with environment variables:
+    PCOVEN_SIMULATE=1        use the simulated sensor, heater and clock
+    PCOVEN_SIM_SPEED=100     simulated seconds per real second (default 1)
+
+Or run a whole cure cycle through the real app code from the command line:
+    python oven_sim.py --minutes 120 --setpoint 400 --speed 1000 [--tunings 10 5 1]
+"""
+import argparse
+import bisect
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from actuators import Actuator, clamp_duty
+from temperature_sensor import RESOLUTION_F, FakeSpiDev, Reading
+
+
+class SimClock:
+    """
+    Drop-in for the parts of the `time` module the app uses, running `speed` times faster
+    than real time. time() starts at the real wall-clock time when the clock is created.
+    """
+
+    def __init__(self, speed=1.0):
+        self.speed = float(speed)
+        self._real_start = time.monotonic()
+        self._wall_start = time.time()
+
+    def _elapsed(self):
+        return (time.monotonic() - self._real_start) * self.speed
+
+    def time(self):
+        return self._wall_start + self._elapsed()
+
+    def monotonic(self):
+        return self._elapsed()
+
+    def monotonic_ns(self):
+        return int(self._elapsed() * 1e9)
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds / self.speed)
+
+
+class ThermalOven:
+    """
+    Two-mass oven model, integrated lazily up to the clock's current time.
+
+    Heater element (temperature Th, heat capacity heater_capacity) receives
+    duty% * heater_power and passes heat to the oven air/load (Ta, air_capacity) through
+    `coupling`; the load loses heat to ambient through `loss`. The thermocouple follows Ta
+    with a first-order lag of `sensor_lag` seconds, seen through `dead_time` seconds of
+    transport delay. Units: W, J/°F, W/°F, °F, seconds.
+
+    With the defaults the oven tops out near 700 °F and reaches 400 °F in about 20 minutes
+    at full power.
+    """
+
+    def __init__(self, clock, ambient=70.0, heater_power=5000.0, heater_capacity=1000.0,
+                 air_capacity=12000.0, coupling=40.0, loss=8.0, sensor_lag=5.0,
+                 dead_time=3.0, noise=0.3, max_step=0.5):
+        self.clock = clock
+        self.ambient = ambient
+        self.heater_power = heater_power
+        self.heater_capacity = heater_capacity
+        self.air_capacity = air_capacity
+        self.coupling = coupling
+        self.loss = loss
+        self.sensor_lag = sensor_lag
+        self.dead_time = dead_time
+        self.noise = noise
+        self.max_step = max_step
+        self.duty = 0.0
+        self.heater_temp = ambient
+        self.air_temp = ambient
+        self.probe_temp = ambient
+        self._t = clock.monotonic()
+        self._history_t = []
+        self._history_temp = []
+        self._lock = threading.Lock()
+
+    def _advance(self):
+        now = self.clock.monotonic()
+        power = self.heater_power * self.duty / 100.0
+        while self._t < now:
+            h = min(self.max_step, now - self._t)
+            to_air = self.coupling * (self.heater_temp - self.air_temp)
+            self.heater_temp += h * (power - to_air) / self.heater_capacity
+            self.air_temp += h * (to_air - self.loss * (self.air_temp - self.ambient)) / self.air_capacity
+            self.probe_temp += h * (self.air_temp - self.probe_temp) / self.sensor_lag
+            self._t += h
+        self._history_t.append(self._t)
+        self._history_temp.append(self.probe_temp)
+        # Keep just enough history to look back one dead time.
+        cutoff = bisect.bisect_left(self._history_t, self._t - self.dead_time - self.max_step)
+        if cutoff > 64:
+            del self._history_t[:cutoff]
+            del self._history_temp[:cutoff]
+
+    def set_duty(self, duty):
+        with self._lock:
+            self._advance()
+            self.duty = clamp_duty(duty)
+
+    def measured_temperature(self):
+        """Probe temperature as seen `dead_time` seconds ago, with noise and quantization."""
+        with self._lock:
+            self._advance()
+            i = bisect.bisect_right(self._history_t, self._t - self.dead_time) - 1
+            temp = self._history_temp[max(0, i)]
+        if self.noise:
+            temp += random.gauss(0.0, self.noise)
+        return round(temp / RESOLUTION_F) * RESOLUTION_F
+
+
+class SimulatedHeater(Actuator):
+    """Heater actuator that feeds the duty straight into the oven model."""
+
+    def __init__(self, oven):
+        self.oven = oven
+
+    def set_duty(self, duty):
+        self.duty = clamp_duty(duty)
+        self.oven.set_duty(self.duty)
+
+
+class Simulation:
+    """Bundles the clock, oven model and the sensor/heater stand-ins the app plugs in."""
+
+    def __init__(self, speed=1.0, clock=None, **oven_params):
+        self.clock = clock if clock is not None else SimClock(speed)
+        self.oven = ThermalOven(self.clock, **oven_params)
+        self.heater = SimulatedHeater(self.oven)
+
+    def add_oven(self, **oven_params):
+        """Another simulated oven on the same clock, for multi-oven setups."""
+        return Simulation(clock=self.clock, **oven_params)
+
+    @classmethod
+    def from_env(cls):
+        return cls(speed=float(os.environ.get("PCOVEN_SIM_SPEED", "1")))
+
+    def read_sensor(self):
+        """Same contract as temperature_sensor.read_sensor()."""
+        return Reading(self.oven.measured_temperature(), self.oven.ambient, None)
+
+    def read_temperature(self):
+        """Same contract as temperature_sensor.read_temperature()."""
+        return self.oven.measured_temperature()
+
+    def spi_factory(self):
+        """
+        A FakeSpiDev serving this oven's measured temperature, for multi-probe setups
+        (temperature_sensor.open_probe_array); every probe sees the same oven.
+        """
+        return FakeSpiDev(temperature_c=lambda: (self.oven.measured_temperature() - 32.0) * 5.0 / 9.0,
+                          internal_c=(self.oven.ambient - 32.0) * 5.0 / 9.0)
+
+
+def enabled():
+    return os.environ.get("PCOVEN_SIMULATE", "") not in ("", "0")
+
+
+def run_cure(minutes, setpoint, speed, tunings=None):
+    """
+    Runs one cure cycle through the real app (sampler, PID loop, logger, writer and cycle
+    summary) in a scratch directory and returns the stored cycle summary.
+    """
+    os.environ["PCOVEN_SIMULATE"] = "1"
+    os.environ["PCOVEN_SIM_SPEED"] = str(speed)
+    workdir = tempfile.mkdtemp(prefix="pcoven-sim-")
+    os.chdir(workdir)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import app
+
+    app.create_app()
+    if tunings is not None:
+        app.config["pid_tunings"] = list(tunings)
+    app.start()
+    client = app.app.test_client()
+    client.post("/set_temperature", json={"temperature": setpoint})
+    client.post("/power")
+    app.clock.sleep(minutes * 60)
+    client.post("/power")
+    with app.read_db() as conn:
+        row = conn.execute("SELECT * FROM cycle_summary ORDER BY cycle_id DESC LIMIT 1").fetchone()
+    print(f"Simulation data written to {workdir}")
+    return dict(row) if row else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a simulated cure cycle through the app.")
+    parser.add_argument("--minutes", type=float, default=120.0, help="simulated cycle length")
+    parser.add_argument("--setpoint", type=float, default=400.0, help="target temperature in °F")
+    parser.add_argument("--speed", type=float, default=1000.0, help="simulated seconds per real second")
+    parser.add_argument("--tunings", type=float, nargs=3, metavar=("KP", "KI", "KD"),
+                        help="PID gains to use instead of the defaults")
+    args = parser.parse_args()
+    start = time.perf_counter()
+    summary = run_cure(args.minutes, args.setpoint, args.speed, args.tunings)
+    print(f"Simulated {args.minutes:.0f} min in {time.perf_counter() - start:.1f} s")
+    print(summary)
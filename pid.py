@@ -0,0 +1,33 @@
+"""
+The PID control law used by pid_control_loop, shared with the replay/tuning tools so that
+offline evaluations run exactly the same arithmetic as the oven.
+"""
+
+MAX_INTEGRAL = 500  # Anti-windup limit
+DUTY_MIN = 0
+DUTY_MAX = 100
+# Steps closer together than this (catch-up ticks after an overrun, or two reads within one
+# tick of a coarse monotonic clock) carry no usable rate of change, so the D term is skipped.
+MIN_DERIVATIVE_DT = 0.05
+
+
+def clamp(value, lo, hi):
+    return max(min(value, hi), lo)
+
+
+def pid_step(error, last_error, integral, dt, Kp, Ki, Kd, clip=clamp):
+    """
+    One step of the controller.
+
+    Works on plain floats or, with clip=numpy.clip, on arrays of candidates at once (dt is
+    always a scalar). A non-positive dt is taken as 1 s, as the original loop did.
+
+    Returns:
+        tuple: (duty_cycle, integral) with the duty in percent and the updated integral.
+    """
+    if dt <= 0:
+        dt = 1
+    integral = clip(integral + error * dt, -MAX_INTEGRAL, MAX_INTEGRAL)
+    derivative = (error - last_error) / dt if dt >= MIN_DERIVATIVE_DT else 0.0
+    output = Kp * error + Ki * integral + Kd * derivative
+    return clip(output, DUTY_MIN, DUTY_MAX), integral
@@ -1,86 +1,433 @@
+import logging
 import time
 import math
-from temperature_sensor import read_temperature
+import multiprocessing
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
+import numpy as np
 
-def auto_tune_pid():
+import replay
+import temperature_sensor
+from temperature_sensor import RESOLUTION_F
+
+log = logging.getLogger(__name__)
+
+
+# -------------------------
+# Oscillation analysis
+# -------------------------
+# Pu        - ultimate period in seconds (mean of full periods between alternate crossings)
+# amplitude - oscillation amplitude in °F (half the mean peak-to-trough swing)
+# cycles    - number of full periods measured after the transient
+# period_cv / amplitude_cv - relative spread of the per-cycle values (std / mean)
+# noise     - robust estimate of the measurement noise in °F
+# converged - enough cycles, with both spreads within the tolerance
+OscillationEstimate = namedtuple(
+    "OscillationEstimate", ["Pu", "amplitude", "cycles", "period_cv", "amplitude_cv", "noise", "converged"])
+
+
+def _hysteresis_sign(x, h):
+    """+1/-1 once x leaves the ±h band, holding the previous state inside it (0 before the first exit)."""
+    state = np.where(x > h, 1, np.where(x < -h, -1, 0))
+    last = np.where(state != 0, np.arange(len(x)), 0)
+    np.maximum.accumulate(last, out=last)
+    return state[last]
+
+
+def _crossings(x, h):
+    """Indices where the hysteresis state of x flips."""
+    state = _hysteresis_sign(x, h)
+    return np.flatnonzero((state[1:] != state[:-1]) & (state[:-1] != 0)) + 1
+
+
+def _detrend(t, x):
+    """x minus its least-squares line, i.e. the oscillation about the (drifting) mean."""
+    if len(t) < 2:
+        return x - x.mean()
+    slope, intercept = np.polyfit(t, x, 1)
+    return x - (slope * t + intercept)
+
+
+def analyze_oscillation(t, temperature, smoothing=10.0, prominence=0.3, transient_crossings=2,
+                        min_cycles=3, tolerance=0.05):
+    """
+    Estimates the period and amplitude of a relay-test oscillation.
+
+    The samples are resampled to a uniform grid and smoothed with a moving average of
+    `smoothing` seconds. The first `transient_crossings` mean-crossings (the initial heat-up)
+    are discarded and the rest is detrended, so crossings are taken about the drifting mean.
+    A crossing only counts once the signal leaves a hysteresis band of at least three times
+    the noise (and one quantization step); a second pass raises the band so half-cycles must
+    swing at least `prominence` times the median swing, which removes noise-induced extrema.
+
+    Args:
+        t (array-like): Sample times in seconds, ascending.
+        temperature (array-like): Temperatures in °F.
+
+    Returns:
+        OscillationEstimate, or None if fewer than one full period was found.
+    """
+    t = np.asarray(t, dtype=float)
+    temperature = np.asarray(temperature, dtype=float)
+    if len(t) < 10:
+        return None
+    dt = float(np.median(np.diff(t)))
+    if dt <= 0:
+        return None
+    grid = np.arange(t[0], t[-1] + dt / 2, dt)
+    raw = np.interp(grid, t, temperature)
+    window = max(1, int(round(smoothing / dt))) | 1
+    if len(raw) <= window + 10:
+        return None
+    x = np.convolve(raw, np.ones(window) / window, mode="valid")
+    grid = grid[window // 2:window // 2 + len(x)]
+    residual = raw[window // 2:window // 2 + len(x)] - x
+    noise = 1.4826 * float(np.median(np.abs(residual - np.median(residual))))
+    band = max(3.0 * noise, RESOLUTION_F)  # Never below the sensor's own resolution
+
+    # Drop the heat-up transient, then look at the oscillation about the trend of the rest.
+    crossings = _crossings(_detrend(grid, x), band)
+    if len(crossings) <= transient_crossings:
+        return None
+    start = crossings[transient_crossings - 1] if transient_crossings else 0
+    grid, x = grid[start:], _detrend(grid[start:], x[start:])
+
+    crossings = _crossings(x, band)
+    if len(crossings) < 3:
+        return None
+    # Peak-to-trough swing of each half-cycle pair sets the prominence threshold.
+    segment_max = np.maximum.reduceat(x, crossings)[:-1]
+    segment_min = np.minimum.reduceat(x, crossings)[:-1]
+    swings = np.abs(segment_max[1:] - segment_min[:-1]) if len(crossings) > 2 else segment_max - segment_min
+    band = max(band, 0.5 * prominence * float(np.median(swings)))
+    crossings = _crossings(x, band)
+    if len(crossings) < 3:
+        return None
+
+    # Sub-sample crossing times: the last sign change of x before each hysteresis flip.
+    zeros = np.flatnonzero(np.signbit(x[1:]) != np.signbit(x[:-1]))
+    j = zeros[np.maximum(np.searchsorted(zeros, crossings, side="right") - 1, 0)]
+    times = grid[j] + dt * x[j] / (x[j] - x[j + 1])
+
+    # One extremum per half-cycle between consecutive crossings.
+    positive = x[crossings[:-1]] > 0
+    extrema = np.where(positive, np.maximum.reduceat(x, crossings)[:-1], np.minimum.reduceat(x, crossings)[:-1])
+    periods = times[2:] - times[:-2]
+    amplitudes = 0.5 * (np.abs(extrema[1:]) + np.abs(extrema[:-1]))
+
+    Pu = float(periods.mean())
+    amplitude = float(amplitudes.mean())
+    period_cv = float(periods.std() / Pu)
+    amplitude_cv = float(amplitudes.std() / amplitude)
+    cycles = (len(crossings) - 1) // 2
+    converged = cycles >= min_cycles and period_cv <= tolerance and amplitude_cv <= tolerance
+    return OscillationEstimate(Pu, amplitude, cycles, period_cv, amplitude_cv, noise, converged)
+
+
+class OscillationAnalyzer:
+    """
+    Incremental front end to analyze_oscillation() for use while a relay test is running.
+
+    Samples are added one at a time; the estimate is refreshed every `update_every`
+    samples (the analysis is a handful of array passes, so re-running it on the whole
+    test is cheap) and `converged` tells the caller it can stop the test early.
+    """
+
+    def __init__(self, update_every=10, **analysis_options):
+        self.update_every = update_every
+        self.analysis_options = analysis_options
+        self.t = []
+        self.temperature = []
+        self.estimate = None
+
+    @property
+    def converged(self):
+        return self.estimate is not None and self.estimate.converged
+
+    def add(self, t, temperature):
+        """Adds one sample. Returns the new estimate when it was refreshed, else None."""
+        self.t.append(t)
+        self.temperature.append(temperature)
+        if len(self.t) % self.update_every:
+            return None
+        return self.update()
+
+    def update(self):
+        self.estimate = analyze_oscillation(self.t, self.temperature, **self.analysis_options)
+        return self.estimate
+
+
+def analyze_stream(samples, **options):
+    """
+    Consumes (t, temperature) samples from any iterable or generator, yielding each refreshed
+    OscillationEstimate, and stops pulling samples as soon as the estimate has converged.
+    """
+    analyzer = OscillationAnalyzer(**options)
+    for t, temperature in samples:
+        estimate = analyzer.add(t, temperature)
+        if estimate is not None:
+            yield estimate
+            if estimate.converged:
+                return
+
+
+def auto_tune_pid(read_temperature=temperature_sensor.read_temperature, set_output=None, clock=time, job=None):
     """
-    Performs a relay-feedback based auto-tuning algorithm over 10 minutes.
+    Performs a relay-feedback based auto-tuning algorithm over up to 10 minutes.
+
+    The algorithm toggles the heater output (relay mode) while recording temperature
+    readings every second. The relay is ON for 60 seconds and OFF for 60 seconds. The
+    readings are analyzed as they arrive (see OscillationAnalyzer) and the test stops
+    early once the period and amplitude estimates have converged.
 
-    The algorithm toggles the heater output (relay mode) for 10 minutes while recording
-    temperature readings every second. The relay is ON for 60 seconds and OFF for 60 seconds.
+    If `set_output` is given it is called with the heater duty (100 or 0) at every relay toggle.
+    `read_temperature` and `clock` default to the real sensor and the `time` module; the oven
+    simulator passes its own so the test can run off-Pi and faster than real time. When run
+    as a background job (see jobs.py), `job` gets progress updates and cancelling it stops
+    the test with the heater off.
 
-    After the test period, the algorithm detects peaks and troughs to estimate the oscillation period (Pu)
-    and amplitude (A). Then, using a relay half-swing (h=50, assuming a 0-100% output swing),
-    it computes the ultimate gain Ku and uses Ziegler–Nichols rules:
+    From the oscillation period (Pu) and amplitude (a), using a relay half-swing (h=50,
+    assuming a 0-100% output swing), it computes the ultimate gain Ku = 4h / (pi * a) and
+    uses Ziegler–Nichols rules:
 
         Kp = 0.6 * Ku
         Ki = 1.2 * Ku / Pu
         Kd = 0.075 * Ku * Pu
 
     Returns:
-        dict: Tuned PID parameters (Kp, Ki, Kd)
+        dict: Tuned PID parameters (Kp, Ki, Kd), plus the oscillation estimate they came
+        from under "analysis". Check analysis["converged"] before using the gains: an
+        estimate from too few or too irregular cycles is returned for review only.
+
+    Raises:
+        ValueError: If no oscillation could be measured at all.
     """
     tuning_duration = 600  # seconds (10 minutes)
     relay_on_time = 60  # seconds heater is ON
     relay_off_time = 60  # seconds heater is OFF
     sample_interval = 1  # seconds between samples
 
-    readings = []  # List to store (time, temperature) readings
-    start_time = time.time()
+    analyzer = OscillationAnalyzer()
+    start_time = clock.time()
     current_time = start_time
     relay_state = True  # Start with heater ON
     next_toggle = current_time + relay_on_time
 
-    print("Starting PID auto-tuning relay test for 10 minutes...")
-    while current_time - start_time < tuning_duration:
-        t = time.time() - start_time  # relative time in seconds
-        temp = read_temperature()  # raw sensor reading
-        readings.append((t, temp))
-
-        if time.time() >= next_toggle:
-            relay_state = not relay_state
-            # In an actual system, you would toggle the heater output here.
-            print(f"Relay toggled to {'ON' if relay_state else 'OFF'} at t={time.time() - start_time:.1f}s")
-            next_toggle = time.time() + (relay_on_time if relay_state else relay_off_time)
-        time.sleep(sample_interval)
-        current_time = time.time()
-
-    # Detect peaks and troughs in the readings
-    peaks = []
-    troughs = []
-    for i in range(1, len(readings) - 1):
-        prev_temp = readings[i - 1][1]
-        curr_temp = readings[i][1]
-        next_temp = readings[i + 1][1]
-        if curr_temp > prev_temp and curr_temp > next_temp:
-            peaks.append((readings[i][0], curr_temp))
-        if curr_temp < prev_temp and curr_temp < next_temp:
-            troughs.append((readings[i][0], curr_temp))
-
-    if len(peaks) < 2 or len(troughs) < 2:
-        print("Not enough oscillation detected for auto-tuning.")
-        return {"Kp": 1.0, "Ki": 0.0, "Kd": 0.0}
-
-    # Compute average period Pu from peak-to-peak differences
-    peak_periods = [peaks[i][0] - peaks[i - 1][0] for i in range(1, len(peaks))]
-    Pu = sum(peak_periods) / len(peak_periods)
-
-    # Compute average amplitude A from peaks and troughs (pairwise)
-    amplitudes = []
-    for i in range(min(len(peaks), len(troughs))):
-        amplitudes.append(peaks[i][1] - troughs[i][1])
-    A = sum(amplitudes) / len(amplitudes)
+    log.info("Starting PID auto-tuning relay test for up to 10 minutes...")
+    if set_output is not None:
+        set_output(100)
+    try:
+        while current_time - start_time < tuning_duration:
+            t = clock.time() - start_time  # relative time in seconds
+            if job is not None:
+                job.check_cancelled()
+                job.progress(t / tuning_duration, f"Relay test: at most {int(tuning_duration - t)} s remaining")
+            temp = read_temperature()
+            if temp is not None:
+                analyzer.add(t, temp)
+                if analyzer.converged:
+                    log.info("Oscillation estimate converged at t=%.0fs; stopping the relay test early.", t)
+                    break
+
+            if clock.time() >= next_toggle:
+                relay_state = not relay_state
+                if set_output is not None:
+                    set_output(100 if relay_state else 0)
+                log.info("Relay toggled to %s at t=%.1fs", "ON" if relay_state else "OFF", clock.time() - start_time)
+                next_toggle = clock.time() + (relay_on_time if relay_state else relay_off_time)
+            clock.sleep(sample_interval)
+            current_time = clock.time()
+    finally:
+        if set_output is not None:
+            set_output(0)
+
+    estimate = analyzer.update()
+    if estimate is None:
+        raise ValueError("Not enough oscillation detected for auto-tuning.")
+    log.info("Oscillation: %s", estimate)
 
     # h is half the output swing; assuming a 0-100% output, h = 50.
     h = 50.0
-    Ku = (4 * h) / (math.pi * A)
+    Pu = estimate.Pu
+    Ku = (4 * h) / (math.pi * estimate.amplitude)
 
     Kp = 0.6 * Ku
     Ki = 1.2 * Ku / Pu
     Kd = 0.075 * Ku * Pu
 
-    print(f"Auto-tuning complete. Ku={Ku:.2f}, Pu={Pu:.2f}")
-    print(f"Tuned parameters: Kp={Kp:.2f}, Ki={Ki:.2f}, Kd={Kd:.2f}")
+    log.info("Auto-tuning complete. Ku=%.2f, Pu=%.2f", Ku, Pu)
+    log.info("Tuned parameters: Kp=%.2f, Ki=%.2f, Kd=%.2f", Kp, Ki, Kd)
+    if not estimate.converged:
+        log.warning("Oscillation estimate did not converge (%d cycles, period CV %.2f, amplitude CV %.2f); "
+                    "the gains are unreliable.", estimate.cycles, estimate.period_cv, estimate.amplitude_cv)
+
+    return {"Kp": Kp, "Ki": Ki, "Kd": Kd, "analysis": estimate._asdict()}
+
+
+# -------------------------
+# Model-based auto-tune
+# -------------------------
+# Instead of a 10-minute relay test, identify a FOPDT plant model (from a short step test
+# or from recorded cycles) and search the gain space against that model, spread across a
+# process pool. Candidates are scored with the replay engine, which runs the exact
+# control law of pid_control_loop.
+COARSE_KP = np.geomspace(0.5, 50.0, 10)
+COARSE_KI = np.concatenate(([0.0], np.geomspace(0.005, 2.0, 9)))
+COARSE_KD = np.concatenate(([0.0], np.geomspace(0.5, 100.0, 7)))
+OVERSHOOT_WEIGHT = 0.5  # °F of mean absolute error one °F of overshoot is worth
+
+
+def step_test(read_temperature, set_output, clock=time, duty=50.0, duration=300.0, baseline=30.0,
+              sample_interval=1.0, job=None):
+    """
+    Holds the heater off for `baseline` seconds, then at `duty` percent until `duration`
+    seconds have passed, recording the temperature every `sample_interval` seconds. Start
+    from a settled oven: drift left over from a previous run is fitted as plant dynamics.
+
+    Returns:
+        tuple of np.ndarray: (t, temperature, duty)
+    """
+    t_log, temp_log, duty_log = [], [], []
+    start = clock.time()
+    applied = None
+    try:
+        while True:
+            t = clock.time() - start
+            if t >= duration:
+                break
+            if job is not None:
+                job.check_cancelled()
+                job.progress(0.3 * t / duration, f"Step test: {int(duration - t)} s remaining")
+            wanted = 0.0 if t < baseline else duty
+            if wanted != applied:
+                set_output(wanted)
+                applied = wanted
+            temp = read_temperature()
+            if temp is not None:
+                t_log.append(t)
+                temp_log.append(temp)
+                duty_log.append(applied)
+            clock.sleep(sample_interval)
+    finally:
+        set_output(0)
+    return np.array(t_log), np.array(temp_log), np.array(duty_log)
+
+
+def plant_from_step(t, temperature, duty, setpoint, hold_minutes=60.0):
+    """
+    Fits a plant model to step-test data and pairs it with a nominal cure (heat from the
+    current temperature to `setpoint` and hold) to evaluate candidates against.
+    """
+    model = replay.fit_fopdt(t, temperature, duty, step=1.0)
+    if model is None:
+        return []
+    steps = np.full(int(hold_minutes * 60 / replay.CONTROL_PERIOD), float(setpoint))
+    return [{"cycle_id": None, "model": model, "setpoint": steps, "start_temperature": float(temperature[0])}]
+
+
+def score_candidates(cycles, candidates, overshoot_weight=OVERSHOOT_WEIGHT):
+    """
+    Cost per candidate, averaged over the cycles: mean absolute error (°F) plus
+    overshoot_weight times the overshoot (°F). Lower is better. Runs in worker processes.
+    """
+    cost = np.zeros(len(candidates))
+    for c in cycles:
+        metrics = replay.simulate(c["model"], c["setpoint"], candidates, c["start_temperature"])
+        duration = len(c["setpoint"]) * replay.CONTROL_PERIOD
+        cost += metrics["iae"] / duration + overshoot_weight * metrics["overshoot"]
+    return cost / len(cycles)
+
+
+def _refine_grid(best, factor=1.6, points=5):
+    """Log-spaced grid around the best (Kp, Ki, Kd); zero gains also try small values."""
+    axes = []
+    for value, floor in zip(best, (0.05, 0.001, 0.1)):
+        if value <= 0:
+            axes.append(np.concatenate(([0.0], np.geomspace(floor, floor * factor ** 2, points - 1))))
+        else:
+            axes.append(value * np.geomspace(1 / factor, factor, points))
+    return replay.candidate_grid(*axes)
+
+
+def search_gains(cycles, job=None, workers=None, chunks_per_worker=4):
+    """
+    Grid search over (Kp, Ki, Kd) against the plant models in `cycles`, followed by a finer
+    grid around the best coarse candidate. Chunks of candidates are scored in parallel on
+    all cores.
+
+    Returns:
+        dict: Kp, Ki, Kd and their cost, overshoot, settling_time and iae (mean over cycles).
+    """
+    workers = workers or os.cpu_count() or 1
+    # Spawn rather than fork: this runs inside the server, and a forked child could inherit a
+    # lock (logging, SQLite, the metrics registry) held by one of its threads. The workers
+    # only need the picklable models and candidates, and spawn also works off Linux.
+    context = multiprocessing.get_context("spawn")
+    passes = [replay.candidate_grid(COARSE_KP, COARSE_KI, COARSE_KD), None]
+    best = None
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        for pass_index in range(len(passes)):
+            grid = passes[pass_index] if passes[pass_index] is not None else _refine_grid(best)
+            chunks = np.array_split(grid, min(len(grid), workers * chunks_per_worker))
+            futures = {pool.submit(score_candidates, cycles, chunk): chunk for chunk in chunks}
+            costs = []
+            done_count = 0
+            try:
+                for future in as_completed(futures):
+                    if job is not None:
+                        job.check_cancelled()
+                    costs.append((futures[future], future.result()))
+                    done_count += 1
+                    if job is not None:
+                        fraction = 0.3 + 0.7 * (pass_index + done_count / len(futures)) / len(passes)
+                        job.progress(fraction, f"Search pass {pass_index + 1}/{len(passes)}: "
+                                               f"{done_count}/{len(futures)} chunks")
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+            candidates = np.vstack([c for c, _ in costs])
+            scores = np.concatenate([s for _, s in costs])
+            best = candidates[int(np.argmin(scores))]
+    metrics = replay.evaluate(cycles, best[np.newaxis, :])
+    result = {"Kp": float(best[0]), "Ki": float(best[1]), "Kd": float(best[2]),
+              "cost": float(score_candidates(cycles, best[np.newaxis, :])[0])}
+    for name in ("overshoot", "settling_time", "iae"):
+        value = float(metrics[name][0])
+        result[name] = None if np.isnan(value) else value
+    return result
 
-    return {"Kp": Kp, "Ki": Ki, "Kd": Kd}
+
+def model_based_tune(job, cycles_loader, step=None):
+    """
+    Job body for the model-based auto-tune (see jobs.JobRunner).
+
+    Args:
+        cycles_loader (callable): Returns the recorded cycles with fitted plant models
+            (replay.load_recorded_cycles); used when no step test is requested.
+        step (dict): Optional keyword arguments for step_test() plus "setpoint"; when
+            given, the model is identified from a fresh step test instead of history.
+
+    Returns:
+        dict: The tuned gains and their predicted performance, plus the identified models.
+    """
+    if step is not None:
+        step = dict(step)
+        setpoint = step.pop("setpoint")
+        job.progress(0.0, "Running step test")
+        data = step_test(job=job, **step)
+        cycles = plant_from_step(*data, setpoint=setpoint)
+    else:
+        job.progress(0.0, "Fitting plant models to recorded cycles")
+        cycles = cycles_loader()
+    if not cycles:
+        raise ValueError("Could not identify a plant model from the available data.")
+    job.check_cancelled()
+    job.progress(0.3, f"Identified {len(cycles)} plant model(s); searching gains")
+    log.info("Model-based auto-tune: models %s", [c["model"] for c in cycles])
+    result = search_gains(cycles, job=job)
+    result["models"] = [c["model"]._asdict() for c in cycles]
+    log.info("Model-based auto-tune complete: %s", result)
+    return result
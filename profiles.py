@@ -0,0 +1,241 @@
+"""
+Ramp/soak cure profiles.
+
+A profile is an ordered list of segments stored in the profiles/profile_segments tables:
+
+    ramp - move the setpoint to `target` at `rate` °F/min (no rate: step straight to it).
+           Ramping down is a controlled cool-down.
+    soak - hold `target` (default: where the previous segment ended) for `duration_s`
+           seconds, counting only the time the measured temperature is within `band` °F,
+           so the soak starts when the part is actually at temperature.
+
+ProfileRun precomputes each ramp's setpoint trajectory on the control-loop period when the
+profile starts; pid_control_loop calls tick() once per iteration to get its setpoint, and
+the oven is turned off when tick() reports the profile has finished.
+"""
+from collections import namedtuple
+
+SEGMENT_KINDS = ("ramp", "soak")
+DEFAULT_SOAK_BAND = 10.0  # °F
+
+# One step of a profile; see the module docstring. Unused fields are None.
+Segment = namedtuple("Segment", ["kind", "target", "rate", "duration_s", "band"])
+
+
+def parse_segments(data):
+    """
+    Validates a list of segment dicts (as posted by the profile editor).
+
+    Returns:
+        list of Segment
+
+    Raises:
+        ValueError: If the list is empty or a segment is incomplete, or a rate, soak
+            duration or band is not positive.
+    """
+    if not isinstance(data, list) or not data:
+        raise ValueError("A profile needs at least one segment")
+    segments = []
+    for i, item in enumerate(data, 1):
+        kind = item.get("kind")
+        if kind not in SEGMENT_KINDS:
+            raise ValueError(f"Segment {i}: kind must be one of {SEGMENT_KINDS}")
+
+        def number(key, required=False, positive=False):
+            value = item.get(key)
+            if value in (None, ""):
+                if required:
+                    raise ValueError(f"Segment {i}: {key} is required")
+                return None
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"Segment {i}: {key} must be a number")
+            if positive and value <= 0:
+                raise ValueError(f"Segment {i}: {key} must be positive")
+            return value
+
+        if kind == "ramp":
+            segments.append(Segment("ramp", number("target", required=True), number("rate", positive=True),
+                                    None, None))
+        else:
+            duration = number("duration_s", required=True, positive=True)
+            band = number("band", positive=True)
+            segments.append(Segment("soak", number("target"), None, duration,
+                                    band if band is not None else DEFAULT_SOAK_BAND))
+    return segments
+
+
+# -------------------------
+# Storage
+# -------------------------
+class ProfileNotFound(LookupError):
+    """Raised when replacing a profile id that does not exist."""
+
+
+def save_profile(conn, name, segments, profile_id=None):
+    """
+    Inserts (or, with profile_id, replaces) a profile. The caller commits. Returns its id.
+
+    Raises:
+        ProfileNotFound: If profile_id is given but there is no such profile (nothing is written).
+    """
+    if profile_id is None:
+        profile_id = conn.execute("INSERT INTO profiles (name) VALUES (?)", (name,)).lastrowid
+    else:
+        if conn.execute("UPDATE profiles SET name = ? WHERE id = ?", (name, profile_id)).rowcount == 0:
+            raise ProfileNotFound(f"No profile with id {profile_id}")
+        conn.execute("DELETE FROM profile_segments WHERE profile_id = ?", (profile_id,))
+    conn.executemany("""
+        INSERT INTO profile_segments (profile_id, position, kind, target, rate, duration_s, band)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, [(profile_id, i, *s) for i, s in enumerate(segments)])
+    return profile_id
+
+
+def load_profile(conn, profile_id):
+    """Returns (name, [Segment]) or None if there is no such profile."""
+    row = conn.execute("SELECT name FROM profiles WHERE id = ?", (profile_id,)).fetchone()
+    if row is None:
+        return None
+    segments = [Segment(*r) for r in conn.execute("""
+        SELECT kind, target, rate, duration_s, band
+        FROM profile_segments
+        WHERE profile_id = ?
+        ORDER BY position
+    """, (profile_id,))]
+    return row[0], segments
+
+
+def list_profiles(conn):
+    """Returns [{"id", "name", "segments": [segment dicts]}] for every profile, by name."""
+    profiles = {}
+    for row in conn.execute("SELECT id, name FROM profiles ORDER BY name"):
+        profiles[row[0]] = {"id": row[0], "name": row[1], "segments": []}
+    for row in conn.execute("""
+        SELECT profile_id, kind, target, rate, duration_s, band
+        FROM profile_segments
+        ORDER BY profile_id, position
+    """):
+        if row[0] in profiles:
+            profiles[row[0]]["segments"].append(Segment(*row[1:])._asdict())
+    return list(profiles.values())
+
+
+def delete_profile(conn, profile_id):
+    """Deletes a profile. Cycles keep their profile_id for history. The caller commits."""
+    conn.execute("DELETE FROM profile_segments WHERE profile_id = ?", (profile_id,))
+    return conn.execute("DELETE FROM profiles WHERE id = ?", (profile_id,)).rowcount > 0
+
+
+# -------------------------
+# Execution
+# -------------------------
+def ramp_trajectory(start, target, rate, period):
+    """
+    Setpoints at 0, period, 2*period, ... of a ramp from start to target at rate °F/min;
+    the last element is the target.
+    """
+    import numpy as np  # Only needed once a profile runs; keeps NumPy off the startup path
+
+    if rate is None or start == target:
+        return np.array([target], dtype=float)
+    step = rate / 60.0 * period
+    n = int(np.ceil(abs(target - start) / step))
+    trajectory = start + np.sign(target - start) * step * np.arange(n + 1)
+    trajectory[-1] = target
+    return trajectory
+
+
+class ProfileRun:
+    """
+    One execution of a profile. Not thread-safe: only the control loop calls tick(); other
+    threads only read state().
+    """
+
+    def __init__(self, profile_id, name, segments, start_temperature, period=1.0):
+        """
+        Args:
+            segments (list of Segment): The profile.
+            start_temperature (float): Where the first ramp starts (the current oven temperature).
+            period (float): Control loop period in seconds; ramp trajectories use this step.
+        """
+        self.profile_id = profile_id
+        self.name = name
+        self.segments = list(segments)
+        self.period = period
+        # Precompute every ramp's trajectory and every soak's hold temperature.
+        self._plans = []
+        level = float(start_temperature)
+        for seg in self.segments:
+            if seg.kind == "ramp":
+                plan = ramp_trajectory(level, seg.target, seg.rate, period)
+                level = float(plan[-1])
+            else:
+                level = seg.target if seg.target is not None else level
+                plan = level
+            self._plans.append(plan)
+        self.segment = 0
+        self.setpoint = None
+        self.finished = False
+        self._segment_elapsed = 0.0
+        self._soak_elapsed = 0.0
+
+    def _advance(self):
+        self.segment += 1
+        self._segment_elapsed = 0.0
+        self._soak_elapsed = 0.0
+        if self.segment >= len(self.segments):
+            self.finished = True
+
+    def tick(self, temperature, dt):
+        """
+        Advances the profile by dt seconds of control time.
+
+        Args:
+            temperature (float): Measured temperature, for the soak band.
+            dt (float): Seconds of control time since the previous tick; pid_control_loop
+                passes one loop period on the first tick.
+
+        Returns:
+            float: The setpoint for this tick, or None once the profile has finished.
+        """
+        while not self.finished:
+            seg = self.segments[self.segment]
+            plan = self._plans[self.segment]
+            if seg.kind == "ramp":
+                self._segment_elapsed += dt
+                index = int(self._segment_elapsed / self.period)
+                if index >= len(plan) - 1:
+                    # Ramp done; carry the leftover time into the next segment.
+                    dt = self._segment_elapsed - (len(plan) - 1) * self.period
+                    self.setpoint = float(plan[-1])
+                    self._advance()
+                    continue
+                self.setpoint = float(plan[index])
+                return self.setpoint
+            self.setpoint = plan
+            if temperature is not None and abs(temperature - plan) <= seg.band:
+                self._soak_elapsed += dt
+            if self._soak_elapsed >= seg.duration_s:
+                self._advance()
+                dt = 0.0
+                continue
+            return self.setpoint
+        return None
+
+    def state(self):
+        seg = self.segments[self.segment] if not self.finished else None
+        state = {
+            "profile_id": self.profile_id,
+            "name": self.name,
+            "segment": self.segment,
+            "segments": len(self.segments),
+            "kind": seg.kind if seg else None,
+            "setpoint": self.setpoint,
+            "finished": self.finished,
+            "soak_remaining": None,
+        }
+        if seg is not None and seg.kind == "soak":
+            state["soak_remaining"] = max(0.0, seg.duration_s - self._soak_elapsed)
+        return state
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Faster-than-real-time backtesting of PID gains against recorded cycles.
+
+For every recorded cycle a first-order-plus-dead-time (FOPDT) plant model is fitted to the
+logged temperature and heater duty. Candidate gains are then run in closed loop against
+that model with the exact control law of pid_control_loop (pid.pid_step, including the
+±500 anti-windup clamp and 0-100% duty clamp), following the cycle's recorded setpoint.
+All candidates are simulated together as NumPy vectors, so the per-step cost is a few
+array operations no matter how many candidates are being compared.
+
+Example:
+    python replay.py --kp 2 5 10 20 --ki 0.05 0.1 0.5 1 --kd 0 1 5
+"""
+import argparse
+import itertools
+import json
+import sys
+from collections import namedtuple
+from contextlib import closing
+
+import numpy as np
+
+from cycle_stats import load_cycle_arrays
+from pid import pid_step
+
+# dT/dt = (gain * duty(t - dead_time) - (T - ambient)) / time_constant
+#   gain          - °F of steady-state rise per % duty
+#   time_constant - seconds
+#   dead_time     - seconds
+#   ambient       - °F the oven settles to with the heater off
+#   rmse          - fit error of the one-step prediction, °F
+PlantModel = namedtuple("PlantModel", ["gain", "time_constant", "dead_time", "ambient", "rmse"])
+
+CONTROL_PERIOD = 1.0  # pid_control_loop runs once a second
+FIT_STEP = 5.0  # Resample recorded cycles to this grid (the logger interval) before fitting
+
+
+def fit_fopdt(t, temperature, duty, step=FIT_STEP, max_dead_time=120.0):
+    """
+    Fits a FOPDT model by linear least squares.
+
+    The discretized model T[k+1] - T[k] = a*u[k-d] - b*T[k] + c is linear in (a, b, c) for
+    a fixed delay d, so each candidate delay is one lstsq solve; the delay with the smallest
+    residual wins.
+
+    Args:
+        t (np.ndarray): Sample times in seconds, ascending.
+        temperature (np.ndarray): Measured temperature in °F.
+        duty (np.ndarray): Heater duty in percent.
+
+    Returns:
+        PlantModel, or None if the data does not identify a stable model.
+    """
+    if len(t) < 10 or t[-1] - t[0] < 20 * step:
+        return None
+    grid = np.arange(t[0], t[-1], step)
+    temp = np.interp(grid, t, temperature)
+    u = np.interp(grid, t, duty)
+    dT = np.diff(temp)
+    best = None
+    for d in range(int(max_dead_time // step) + 1):
+        rows = len(dT) - d
+        if rows < 10:
+            break
+        X = np.column_stack((u[:rows], temp[d:d + rows], np.ones(rows)))
+        y = dT[d:]
+        coef, _, rank, _ = np.linalg.lstsq(X, y, rcond=None)
+        if rank < 3:
+            continue
+        a, b, c = coef[0], -coef[1], coef[2]
+        if a <= 0 or b <= 0:
+            continue
+        rmse = float(np.sqrt(np.mean((X @ coef - y) ** 2)))
+        if best is None or rmse < best.rmse:
+            best = PlantModel(gain=float(a / b), time_constant=float(step / b), dead_time=d * step,
+                              ambient=float(c / b), rmse=rmse)
+    return best
+
+
+def reconstruct_duty(t, temperature, set_temperature, gains):
+    """
+    Re-runs the control law over a recorded cycle to estimate the duty it applied, for
+    cycles logged before duty was stored. `gains` should be the gains used at the time.
+    """
+    Kp, Ki, Kd = gains
+    duty = np.empty(len(t))
+    integral = 0.0
+    last_error = 0.0
+    last_t = t[0] - CONTROL_PERIOD
+    for i in range(len(t)):
+        error = set_temperature[i] - temperature[i]
+        dt = t[i] - last_t if t[i] > last_t else 1
+        duty[i], integral = pid_step(error, last_error, integral, dt, Kp, Ki, Kd)
+        last_error = error
+        last_t = t[i]
+    return duty
+
+
+def simulate(model, setpoint, candidates, start_temperature=None, dt=CONTROL_PERIOD, band=5.0):
+    """
+    Runs every candidate in closed loop against `model`.
+
+    Args:
+        model (PlantModel): Plant to control.
+        setpoint (np.ndarray): Setpoint in °F for each control step.
+        candidates (np.ndarray): Shape (n, 3) array of (Kp, Ki, Kd).
+        start_temperature (float): Initial oven temperature; defaults to the model's ambient.
+        dt (float): Control period in seconds.
+        band (float): Settling band in °F.
+
+    Returns:
+        dict of np.ndarray (one value per candidate): overshoot (°F above setpoint after
+        first reaching it), settling_time (s after which |error| stays within band, NaN if
+        never), iae, itae and energy (equivalent seconds at full heater power).
+    """
+    candidates = np.asarray(candidates, dtype=float)
+    n = len(candidates)
+    Kp, Ki, Kd = candidates[:, 0], candidates[:, 1], candidates[:, 2]
+    delay = max(0, int(round(model.dead_time / dt)))
+    alpha = dt / model.time_constant
+    temp = np.full(n, model.ambient if start_temperature is None else start_temperature, dtype=float)
+    # Ring buffer of applied duties, so the plant sees duty from `delay` steps ago.
+    history = np.zeros((delay + 1, n))
+    integral = np.zeros(n)
+    last_error = np.zeros(n)
+    reached = np.zeros(n, dtype=bool)
+    overshoot = np.zeros(n)
+    last_outside = np.zeros(n)
+    iae = np.zeros(n)
+    itae = np.zeros(n)
+    energy = np.zeros(n)
+    for k, sp in enumerate(setpoint):
+        error = sp - temp
+        duty, integral = pid_step(error, last_error, integral, dt, Kp, Ki, Kd, clip=np.clip)
+        last_error = error
+        history[k % (delay + 1)] = duty
+        applied = history[(k + 1) % (delay + 1)] if delay else duty
+        t = k * dt
+        abs_error = np.abs(error)
+        iae += abs_error * dt
+        itae += t * abs_error * dt
+        energy += duty * (dt / 100.0)
+        reached |= error <= 0
+        np.maximum(overshoot, np.where(reached, -error, 0.0), out=overshoot)
+        last_outside = np.where(abs_error > band, t + dt, last_outside)
+        temp = temp + alpha * (model.gain * applied - (temp - model.ambient))
+    settling = np.where(last_outside < len(setpoint) * dt, last_outside, np.nan)
+    return {"overshoot": overshoot, "settling_time": settling, "iae": iae, "itae": itae, "energy": energy}
+
+
+def load_recorded_cycles(conn, assumed_gains=None, oven_id=None):
+    """
+    Loads every finished cycle (of one oven, if `oven_id` is given) and fits its plant model.
+
+    Returns:
+        list of dict: cycle_id, model (PlantModel), setpoint (per control step) and start
+        temperature, for each cycle where a model could be fitted.
+    """
+    cycles = []
+    condition, params = ("AND oven_id = ?", (oven_id,)) if oven_id is not None else ("", ())
+    ids = [row[0] for row in conn.execute(f"SELECT id FROM cycles WHERE end_time IS NOT NULL {condition} ORDER BY id",
+                                          params)]
+    for cycle_id in ids:
+        ts, temperature, set_temperature, duty = load_cycle_arrays(conn, cycle_id)
+        if len(ts) < 10:
+            continue
+        t = (ts - ts[0]) / 1000.0
+        if np.isnan(duty).any():
+            if assumed_gains is None:
+                continue
+            duty = reconstruct_duty(t, temperature, set_temperature, assumed_gains)
+        model = fit_fopdt(t, temperature, duty)
+        if model is None:
+            continue
+        steps = np.arange(0.0, t[-1], CONTROL_PERIOD)
+        setpoint = np.interp(steps, t, set_temperature)
+        cycles.append({"cycle_id": cycle_id, "model": model, "setpoint": setpoint,
+                       "start_temperature": float(temperature[0])})
+    return cycles
+
+
+def evaluate(cycles, candidates):
+    """
+    Backtests candidates against every recorded cycle and averages the metrics.
+
+    Returns:
+        dict of np.ndarray: Metric name to mean value per candidate (settling_time ignores
+        cycles where a candidate never settled).
+    """
+    per_cycle = [simulate(c["model"], c["setpoint"], candidates, c["start_temperature"]) for c in cycles]
+    metrics = {}
+    for name in per_cycle[0]:
+        stacked = np.vstack([m[name] for m in per_cycle])
+        if name == "settling_time":
+            settled = ~np.isnan(stacked)
+            metrics[name] = np.where(settled.any(axis=0),
+                                     np.nansum(stacked, axis=0) / np.maximum(settled.sum(axis=0), 1), np.nan)
+        else:
+            metrics[name] = stacked.mean(axis=0)
+    return metrics
+
+
+def candidate_grid(kps, kis, kds):
+    return np.array(list(itertools.product(kps, kis, kds)), dtype=float)
+
+
+if __name__ == "__main__":
+    from db import get_db, init_db
+
+    parser = argparse.ArgumentParser(description="Backtest PID gains against recorded cycles.")
+    parser.add_argument("--kp", type=float, nargs="+", required=True)
+    parser.add_argument("--ki", type=float, nargs="+", required=True)
+    parser.add_argument("--kd", type=float, nargs="+", required=True)
+    parser.add_argument("--assume-gains", type=float, nargs=3, metavar=("KP", "KI", "KD"),
+                        help="gains used when recording cycles that have no stored duty")
+    parser.add_argument("--top", type=int, default=10, help="number of candidates to print")
+    parser.add_argument("--json", action="store_true", help="print all results as JSON")
+    args = parser.parse_args()
+
+    init_db()
+    with closing(get_db()) as conn:
+        recorded = load_recorded_cycles(conn, args.assume_gains)
+    if not recorded:
+        print("No recorded cycles with enough data to fit a plant model.")
+        sys.exit(1)
+    for c in recorded:
+        print(f"Cycle {c['cycle_id']}: {c['model']}", file=sys.stderr)
+    grid = candidate_grid(args.kp, args.ki, args.kd)
+    results = evaluate(recorded, grid)
+    order = np.argsort(results["itae"])
+    if args.json:
+        print(json.dumps([{"Kp": grid[i, 0], "Ki": grid[i, 1], "Kd": grid[i, 2],
+                           **{k: (None if np.isnan(v[i]) else float(v[i])) for k, v in results.items()}}
+                          for i in order], indent=2))
+    else:
+        print(f"{'Kp':>8} {'Ki':>8} {'Kd':>8} {'overshoot':>10} {'settle(s)':>10} {'IAE':>12} {'ITAE':>14} {'energy(s)':>10}")
+        for i in order[:args.top]:
+            print(f"{grid[i, 0]:8.3g} {grid[i, 1]:8.3g} {grid[i, 2]:8.3g} {results['overshoot'][i]:10.1f} "
+                  f"{results['settling_time'][i]:10.0f} {results['iae'][i]:12.0f} {results['itae'][i]:14.3g} "
+                  f"{results['energy'][i]:10.0f}")
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Multi-resolution rollups of the readings, for history that spans many cycles.
+
+Every batch ReadingWriter commits also folds its readings into fixed per-oven time buckets
+at each resolution in TIERS (count plus min/max/sum of temperature and of error, i.e. temperature
+minus setpoint), in the same transaction. Long-range queries read the coarsest tier that
+still resolves the requested step and merge its buckets further in SQL, so a chart costs a
+few hundred rows no matter how much raw data exists.
+
+Run `python rollups.py --rebuild` to recompute the rollups from every recorded cycle (for
+databases from before this existed).
+"""
+import sys
+from contextlib import closing
+
+TIERS = (60, 3600)  # Bucket sizes in seconds: 1 minute and 1 hour
+DEFAULT_POINTS = 300
+
+UPSERT_SQL = """
+    INSERT INTO rollups (oven_id, resolution, bucket, count, temp_min, temp_max, temp_sum, err_min, err_max,
+                         err_sum)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (oven_id, resolution, bucket) DO UPDATE SET
+        count = count + excluded.count,
+        temp_min = MIN(temp_min, excluded.temp_min),
+        temp_max = MAX(temp_max, excluded.temp_max),
+        temp_sum = temp_sum + excluded.temp_sum,
+        err_min = MIN(err_min, excluded.err_min),
+        err_max = MAX(err_max, excluded.err_max),
+        err_sum = err_sum + excluded.err_sum
+"""
+
+
+def aggregate(readings, tiers=TIERS):
+    """
+    Folds readings into per-bucket aggregates.
+
+    Args:
+        readings: Iterable of (oven_id, ts, temperature, set_temperature) with ts in epoch
+            milliseconds.
+
+    Returns:
+        list of tuple: UPSERT_SQL parameters, one per (oven_id, resolution, bucket).
+    """
+    buckets = {}
+    for oven_id, ts, temperature, set_temperature in readings:
+        error = temperature - set_temperature
+        for resolution in tiers:
+            key = (oven_id, resolution, int(ts // 1000) // resolution * resolution)
+            agg = buckets.get(key)
+            if agg is None:
+                buckets[key] = [1, temperature, temperature, temperature, error, error, error]
+            else:
+                agg[0] += 1
+                agg[1] = min(agg[1], temperature)
+                agg[2] = max(agg[2], temperature)
+                agg[3] += temperature
+                agg[4] = min(agg[4], error)
+                agg[5] = max(agg[5], error)
+                agg[6] += error
+    return [(*key, *agg) for key, agg in buckets.items()]
+
+
+def add_readings(conn, readings):
+    """Folds readings (see aggregate) into the rollup tables. The caller commits."""
+    conn.executemany(UPSERT_SQL, aggregate(readings))
+
+
+def choose_tier(step, tiers=TIERS):
+    """The coarsest tier no coarser than `step` seconds (the finest tier if step is finer than all)."""
+    fitting = [r for r in tiers if r <= step]
+    return max(fitting) if fitting else min(tiers)
+
+
+def query(conn, start, end, points=DEFAULT_POINTS, oven_id=1):
+    """
+    Returns one oven's history between two times at about `points` points.
+
+    Args:
+        start (int): Range start in epoch milliseconds.
+        end (int): Range end in epoch milliseconds.
+        points (int): Maximum number of buckets to return.
+
+    Returns:
+        tuple: (resolution, step, rows) where resolution is the tier read (seconds), step the
+        bucket size returned (a multiple of the tier) and rows dicts with x (bucket start in
+        epoch ms), count and min/max/mean of temperature and error. Empty buckets are omitted.
+    """
+    points = max(1, points)
+    span = max(1, (end - start) // 1000)
+    resolution = choose_tier(span / points)
+    # Round the step up to a whole number of tier buckets so no more than `points` come back.
+    step = max(1, -(-span // (points * resolution))) * resolution
+    rows = conn.execute("""
+        SELECT bucket / :step * :step AS b, SUM(count) AS n,
+               MIN(temp_min), MAX(temp_max), SUM(temp_sum) / SUM(count),
+               MIN(err_min), MAX(err_max), SUM(err_sum) / SUM(count)
+        FROM rollups
+        WHERE oven_id = :oven AND resolution = :resolution AND bucket >= :start AND bucket < :end
+        GROUP BY b
+        ORDER BY b
+    """, {"step": step, "resolution": resolution, "oven": oven_id,
+          "start": start // 1000 // resolution * resolution, "end": end // 1000}).fetchall()
+    return resolution, step, [{
+        "x": r[0] * 1000, "count": r[1],
+        "temp_min": r[2], "temp_max": r[3], "temp_mean": r[4],
+        "err_min": r[5], "err_max": r[6], "err_mean": r[7],
+    } for r in rows]
+
+
+def rebuild(conn):
+    """Recomputes every rollup from the recorded cycles. Returns the number of readings folded in."""
+    from cycle_archive import load_cycle  # NumPy; the writer's per-batch path does not need it
+
+    conn.execute("DELETE FROM rollups")
+    total = 0
+    for cycle_id, oven_id in conn.execute("SELECT id, oven_id FROM cycles ORDER BY id").fetchall():
+        data = load_cycle(conn, cycle_id)
+        add_readings(conn, zip([oven_id] * len(data.ts), data.ts.tolist(), data.temperature.tolist(),
+                               data.set_temperature.tolist()))
+        total += len(data.ts)
+    conn.commit()
+    return total
+
+
+if __name__ == "__main__":
+    from db import get_db, init_db
+
+    if "--rebuild" not in sys.argv:
+        print("Usage: python rollups.py --rebuild")
+        sys.exit(1)
+    init_db()
+    with closing(get_db()) as conn:
+        n = rebuild(conn)
+    print(f"Rebuilt rollups from {n} readings.")
@@ -0,0 +1,75 @@
+import time
+
+OVERRUN_POLICIES = ("skip", "catchup")
+
+
+class DeadlineScheduler:
+    """
+    Runs a loop at a fixed rate against absolute deadlines on the monotonic clock.
+
+    Deadlines are start + k * period, so the time spent in the loop body does not add up
+    as drift and wall-clock jumps (NTP at boot) have no effect. When the body overruns
+    by a whole period or more, the missed deadlines are handled by `overrun`:
+        skip    - drop them (counted in `skipped`) and carry on from the latest deadline
+        catchup - run them back to back, late (counted in `late`), at most `max_catchup`
+                  in a row, then skip the rest
+    """
+
+    def __init__(self, period, clock=time, overrun="skip", max_catchup=3):
+        """
+        Args:
+            period (float): Loop period in seconds.
+            clock: Provides monotonic_ns() and sleep(); the `time` module or a simulated clock.
+            overrun (str): One of OVERRUN_POLICIES.
+            max_catchup (int): Limit on back-to-back ticks under the catchup policy.
+        """
+        if overrun not in OVERRUN_POLICIES:
+            raise ValueError(f"overrun must be one of {OVERRUN_POLICIES}")
+        self.period_ns = int(period * 1e9)
+        self.clock = clock
+        self.overrun = overrun
+        self.max_catchup = max_catchup
+        self.skipped = 0
+        self.late = 0
+        self.ticks = 0
+        self._deadline = None
+        self._last_tick = None
+        self._catchup = 0
+
+    @property
+    def period(self):
+        return self.period_ns / 1e9
+
+    @property
+    def missed(self):
+        """Deadlines that were not met: skipped plus run late."""
+        return self.skipped + self.late
+
+    def wait(self):
+        """
+        Sleeps until the next deadline and returns (dt, lateness): seconds since the previous
+        tick (one period on the first) and how long after its deadline this tick woke up.
+        """
+        now = self.clock.monotonic_ns()
+        if self._deadline is None:
+            self._deadline = now
+        else:
+            self._deadline += self.period_ns
+            behind = now - self._deadline
+            if behind >= self.period_ns:
+                if self.overrun == "catchup" and self._catchup < self.max_catchup:
+                    self._catchup += 1
+                    self.late += 1
+                else:
+                    skipped = behind // self.period_ns
+                    self.skipped += skipped
+                    self._deadline += skipped * self.period_ns
+                    self._catchup = 0
+            elif behind <= 0:
+                self._catchup = 0
+                self.clock.sleep(-behind / 1e9)
+                now = self.clock.monotonic_ns()
+        dt = (now - self._last_tick) / 1e9 if self._last_tick is not None else self.period
+        self._last_tick = now
+        self.ticks += 1
+        return dt, max(0, now - self._deadline) / 1e9
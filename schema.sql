@@ -4,14 +4,92 @@ CREATE TABLE IF NOT EXISTS cycles (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     start_time DATETIME NOT NULL,
     end_time DATETIME,
-    notes TEXT
+    notes TEXT,
+    profile_id INTEGER,  -- cure profile the cycle ran, NULL for manual control
+    oven_id INTEGER NOT NULL DEFAULT 1,  -- which oven (see oven.py) ran the cycle
+    probes TEXT,  -- JSON list of probe names for multi-probe ovens, in readings.probes order
+    FOREIGN KEY (profile_id) REFERENCES profiles(id)
 );
 
+CREATE INDEX IF NOT EXISTS idx_cycles_profile ON cycles (profile_id);
+CREATE INDEX IF NOT EXISTS idx_cycles_oven ON cycles (oven_id, end_time);
+
 CREATE TABLE IF NOT EXISTS readings (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     cycle_id INTEGER NOT NULL,
     timestamp DATETIME NOT NULL,
+    ts INTEGER,  -- epoch milliseconds; what history queries sort and filter on
     temperature REAL NOT NULL,
     set_temperature REAL NOT NULL,
+    duty REAL,  -- heater duty cycle (%) when the reading was logged
+    segment INTEGER,  -- 0-based profile segment active at the time, NULL for manual control
+    oven_id INTEGER NOT NULL DEFAULT 1,
+    probes BLOB,  -- per-probe temperatures of multi-probe ovens (cycle_archive.pack_probes)
+    FOREIGN KEY (cycle_id) REFERENCES cycles(id)
+);
+
+-- Covering index: chart queries read (ts, temperature, set_temperature) for one cycle
+-- straight off the index, already in time order.
+CREATE INDEX IF NOT EXISTS idx_readings_cycle_ts
+    ON readings (cycle_id, ts, temperature, set_temperature);
+
+-- One row per finished cycle, written once by end_current_cycle() (see cycle_stats.py),
+-- so the cycle list never has to scan readings.
+CREATE TABLE IF NOT EXISTS cycle_summary (
+    cycle_id INTEGER PRIMARY KEY,
+    duration_s REAL,
+    readings INTEGER,
+    time_to_setpoint_s REAL,
+    max_overshoot REAL,
+    steady_mean_error REAL,
+    steady_std_error REAL,
+    time_in_band_s REAL,
+    heater_seconds REAL,  -- integral of duty: equivalent seconds at full heater power
+    sensor_faults INTEGER,
+    FOREIGN KEY (cycle_id) REFERENCES cycles(id)
+);
+
+-- Readings of finished cycles, packed into one compressed blob per cycle by
+-- cycle_archive.archive_cycle(); the cycle's rows in readings are deleted once archived.
+CREATE TABLE IF NOT EXISTS cycle_archive (
+    cycle_id INTEGER PRIMARY KEY,
+    readings INTEGER NOT NULL,
+    first_ts INTEGER NOT NULL,  -- epoch milliseconds
+    last_ts INTEGER NOT NULL,
+    data BLOB NOT NULL,  -- see cycle_archive.py for the layout
     FOREIGN KEY (cycle_id) REFERENCES cycles(id)
 );
+
+-- Per-oven, per-bucket aggregates of the readings at each resolution in rollups.TIERS
+-- (seconds), maintained by ReadingWriter as batches are committed. Means are sum / count.
+CREATE TABLE IF NOT EXISTS rollups (
+    oven_id INTEGER NOT NULL,
+    resolution INTEGER NOT NULL,  -- bucket size in seconds
+    bucket INTEGER NOT NULL,  -- bucket start, epoch seconds
+    count INTEGER NOT NULL,
+    temp_min REAL NOT NULL,
+    temp_max REAL NOT NULL,
+    temp_sum REAL NOT NULL,
+    err_min REAL NOT NULL,  -- error is temperature minus setpoint
+    err_max REAL NOT NULL,
+    err_sum REAL NOT NULL,
+    PRIMARY KEY (oven_id, resolution, bucket)
+);
+
+-- Ramp/soak cure profiles (see profiles.py); segments run in `position` order.
+CREATE TABLE IF NOT EXISTS profiles (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS profile_segments (
+    profile_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    kind TEXT NOT NULL,  -- 'ramp' or 'soak'
+    target REAL,  -- °F: ramp end point or soak temperature (NULL soak: hold the previous level)
+    rate REAL,  -- ramp rate in °F/min; NULL steps straight to the target
+    duration_s REAL,  -- soak time, counted only while within band
+    band REAL,  -- soak band half-width in °F
+    PRIMARY KEY (profile_id, position),
+    FOREIGN KEY (profile_id) REFERENCES profiles(id)
+);
@@ -0,0 +1,152 @@
+import logging
+import threading
+import time
+from collections import deque, namedtuple
+
+from metrics import Histogram
+
+log = logging.getLogger(__name__)
+
+# One timestamped reading from the thermocouple.
+#   timestamp   - wall-clock time of the read (seconds since the epoch)
+#   raw         - uncalibrated sensor value in °F (None if the read failed)
+#   temperature - calibrated value in °F (None if the read failed)
+#   fault       - None, or the fault name reported by the sensor driver
+#   internal    - cold-junction temperature in °F, if the sensor reported one
+#   probes      - per-probe calibrated Readings when the sensor is a ProbeArray, else None
+Sample = namedtuple("Sample", ["timestamp", "raw", "temperature", "fault", "internal", "probes"],
+                    defaults=(None, None))
+
+
+class SensorSampler:
+    """
+    Owns the temperature sensor and samples it at a fixed rate into a ring buffer.
+
+    Only the sampler thread ever talks to the sensor. Every other consumer (the PID loop,
+    the logger, the HTTP routes) reads the latest sample or a window of recent samples from
+    the buffer, so the number of SPI transactions does not depend on how many clients are
+    polling the web UI.
+    """
+
+    def __init__(self, read_sensor, calibrate, interval=0.5, size=1200, on_sample=None, clock=time):
+        """
+        Args:
+            read_sensor (callable): Returns a temperature_sensor.Reading (raw °F plus fault).
+            calibrate (callable): Maps a raw reading to a calibrated reading.
+            interval (float): Seconds between samples.
+            size (int): Number of samples kept in the ring buffer.
+            on_sample (callable): Optional; called with each new Sample from the sampler thread.
+            clock: Provides time()/monotonic()/sleep(); the `time` module or a simulated clock.
+        """
+        self.read_sensor = read_sensor
+        self.fault_count = 0
+        self.read_latency = Histogram()  # Seconds per read_sensor() call
+        self.calibrate = calibrate
+        self.interval = interval
+        self.on_sample = on_sample
+        self.clock = clock
+        self._buffer = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def sample_once(self):
+        """Reads the sensor once and appends the result to the buffer."""
+        start = time.perf_counter()
+        reading = self.read_sensor()
+        self.read_latency.observe(time.perf_counter() - start)
+        raw = reading.temperature
+        temperature = self.calibrate(raw) if raw is not None else None
+        sample = Sample(self.clock.time(), raw, temperature, reading.fault, reading.internal, reading.probes)
+        with self._lock:
+            self._buffer.append(sample)
+            if reading.fault is not None:
+                self.fault_count += 1
+        if self.on_sample is not None:
+            self.on_sample(sample)
+        return sample
+
+    def start(self):
+        """
+        Takes an initial sample synchronously, then starts a background sampler thread for
+        this sensor alone. To sample several sensors from one thread use a SamplerGroup.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        group = SamplerGroup([self], self.interval, self.clock)
+        group.start()
+        self._thread = group._thread
+
+    def latest(self):
+        """Returns the most recent Sample, or None if nothing has been sampled yet."""
+        with self._lock:
+            return self._buffer[-1] if self._buffer else None
+
+    def window(self, seconds):
+        """Returns the samples taken during the last `seconds` seconds, oldest first."""
+        cutoff = self.clock.time() - seconds
+        recent = []
+        with self._lock:
+            for s in reversed(self._buffer):
+                if s.timestamp < cutoff:
+                    break
+                recent.append(s)
+        recent.reverse()
+        return recent
+
+
+class SamplerGroup:
+    """
+    Samples several SensorSamplers from a single thread: each round reads every sensor once,
+    in order, so adding a sensor (or a whole oven) adds no thread. The group's interval
+    applies to all of its samplers.
+    """
+
+    def __init__(self, samplers=(), interval=0.5, clock=time):
+        self.interval = interval
+        self.clock = clock
+        self._samplers = list(samplers)
+        self._thread = None
+        self._stopping = False
+
+    def add(self, sampler):
+        """Adds a sampler; it takes its first sample synchronously if the group is running."""
+        if self._thread is not None:
+            self._sample(sampler)
+        self._samplers = self._samplers + [sampler]
+
+    @staticmethod
+    def _sample(sampler):
+        try:
+            sampler.sample_once()
+        except Exception as e:
+            log.error("Error sampling temperature: %s", e)
+
+    def _run(self):
+        next_tick = self.clock.monotonic()
+        while not self._stopping:
+            for sampler in self._samplers:
+                self._sample(sampler)
+            next_tick += self.interval
+            delay = next_tick - self.clock.monotonic()
+            if delay > 0:
+                self.clock.sleep(delay)
+            else:
+                # We fell behind (e.g. a slow read); resynchronize instead of bursting.
+                next_tick = self.clock.monotonic()
+
+    def start(self):
+        """Takes an initial sample from every sensor synchronously, then starts the thread."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        for sampler in self._samplers:
+            self._sample(sampler)
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops the thread after the round in progress."""
+        self._stopping = True
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
@@ -1,84 +1,401 @@
 #!/usr/bin/env python3
+import logging
+import random
+import statistics
 import sys
 import time
+from collections import namedtuple
 
 # Calibration offset in °F (adjust as needed)
 CALIBRATION_OFFSET = 0.0
 
-if sys.platform.startswith("linux"):
-    import spidev  # Raspberry Pi SPI library
+# SPI Configuration for MAX31855
+SPI_BUS = 0
+SPI_DEVICE = 0
+SPI_MAX_SPEED_HZ = 5000000
 
-    # SPI Configuration for MAX31855
-    SPI_BUS = 0
-    SPI_DEVICE = 0
+log = logging.getLogger(__name__)
 
+# MAX31855 thermocouple resolution: one bit of the 14-bit temperature is 0.25 °C.
+RESOLUTION_C = 0.25
+RESOLUTION_F = RESOLUTION_C * 9.0 / 5.0
 
-    def read_max31855():
+# Fault names decoded from the MAX31855 status bits (D2..D0).
+FAULT_OPEN_CIRCUIT = "open_circuit"
+FAULT_SHORT_GND = "short_to_gnd"
+FAULT_SHORT_VCC = "short_to_vcc"
+FAULT_UNKNOWN = "fault"
+FAULT_IO_ERROR = "io_error"
+
+# One decoded sensor frame.
+#   temperature - thermocouple temperature in °F (None if faulted)
+#   internal    - cold-junction (die) temperature in °F
+#   fault       - None, or one of the FAULT_* names above
+#   probes      - for a ProbeArray, the calibrated Reading of every probe; otherwise None
+Reading = namedtuple("Reading", ["temperature", "internal", "fault", "probes"], defaults=(None,))
+
+
+def c_to_f(temp_c):
+    return temp_c * 9.0 / 5.0 + 32.0
+
+
+def decode_max31855(raw):
+    """
+    Decodes a 4-byte MAX31855 frame.
+
+    Args:
+        raw (sequence of int): The four bytes read from the sensor, MSB first.
+
+    Returns:
+        Reading: Thermocouple and cold-junction temperatures in °F plus any fault.
+    """
+    # Combine the 4 bytes into a single 32-bit integer
+    raw_data = (raw[0] << 24) | (raw[1] << 16) | (raw[2] << 8) | raw[3]
+
+    # Cold-junction temperature: bits 15..4, 12-bit signed, 0.0625°C per bit
+    internal_raw = (raw_data >> 4) & 0xFFF
+    if internal_raw & 0x800:
+        internal_raw -= 4096
+    internal_f = c_to_f(internal_raw * 0.0625)
+
+    # Bit 16 is set whenever any of the fault bits D2..D0 is set
+    if raw_data & 0x10000:
+        if raw_data & 0x1:
+            fault = FAULT_OPEN_CIRCUIT
+        elif raw_data & 0x2:
+            fault = FAULT_SHORT_GND
+        elif raw_data & 0x4:
+            fault = FAULT_SHORT_VCC
+        else:
+            fault = FAULT_UNKNOWN
+        return Reading(None, internal_f, fault)
+
+    # The temperature data is in the top 14 bits (after shifting right by 18)
+    temp_raw = raw_data >> 18
+    # Check for negative temperature (if sign bit is set)
+    if temp_raw & 0x2000:
+        temp_raw -= 16384
+
+    # Convert raw data to Celsius (each bit is 0.25°C), then to Fahrenheit
+    return Reading(c_to_f(temp_raw * RESOLUTION_C), internal_f, None)
+
+
+def encode_max31855(temp_c, internal_c=25.0, fault=None):
+    """
+    Builds a 4-byte MAX31855 frame; the inverse of decode_max31855().
+
+    Args:
+        temp_c (float): Thermocouple temperature in °C.
+        internal_c (float): Cold-junction temperature in °C.
+        fault (str): Optional FAULT_* name to encode instead of a valid reading.
+
+    Returns:
+        list of int: The four frame bytes, MSB first.
+    """
+    temp_raw = int(round(temp_c / RESOLUTION_C)) & 0x3FFF
+    internal_raw = int(round(internal_c / 0.0625)) & 0xFFF
+    value = (temp_raw << 18) | (internal_raw << 4)
+    if fault is not None:
+        value |= 0x10000 | {FAULT_OPEN_CIRCUIT: 0x1, FAULT_SHORT_GND: 0x2, FAULT_SHORT_VCC: 0x4}.get(fault, 0)
+    return [(value >> 24) & 0xFF, (value >> 16) & 0xFF, (value >> 8) & 0xFF, value & 0xFF]
+
+
+class FakeSpiDev:
+    """
+    Stand-in for spidev.SpiDev that serves synthetic MAX31855 frames.
+
+    Used off-Pi and for benchmarking/testing the driver. `temperature_c` may be a number or
+    a callable returning the current temperature in °C. Faults and I/O errors can be
+    injected by setting `fault` or `fail_next` (number of transfers that raise OSError).
+    """
+
+    def __init__(self, temperature_c=25.0, internal_c=25.0, noise_c=0.0, fault=None):
+        self.temperature_c = temperature_c
+        self.internal_c = internal_c
+        self.noise_c = noise_c
+        self.fault = fault
+        self.fail_next = 0
+        self.max_speed_hz = 0
+        self.is_open = False
+        self.open_count = 0
+        self.transfer_count = 0
+
+    def open(self, bus, device):
+        self.is_open = True
+        self.open_count += 1
+
+    def close(self):
+        self.is_open = False
+
+    def readbytes(self, n):
+        if not self.is_open:
+            raise OSError("SPI device not open")
+        if self.fail_next > 0:
+            self.fail_next -= 1
+            raise OSError("Simulated SPI I/O error")
+        self.transfer_count += 1
+        temp = self.temperature_c() if callable(self.temperature_c) else self.temperature_c
+        if self.noise_c:
+            temp += random.gauss(0.0, self.noise_c)
+        return encode_max31855(temp, self.internal_c, self.fault)[:n]
+
+
+class MAX31855:
+    """
+    MAX31855 thermocouple driver that keeps its SPI handle open between reads.
+
+    The device is opened lazily on the first read and reopened once if a transfer raises an
+    I/O error. With `oversample` > 1, that many frames are read back-to-back per call and
+    the valid ones are reduced with the median or mean. (The chip converts roughly every
+    100 ms, so oversampling mostly filters bus noise at fast sample rates.)
+    """
+
+    def __init__(self, bus=SPI_BUS, device=SPI_DEVICE, max_speed_hz=SPI_MAX_SPEED_HZ,
+                 oversample=1, reduce="median", spi_factory=None):
+        if reduce not in ("median", "mean"):
+            raise ValueError("reduce must be 'median' or 'mean'")
+        self.bus = bus
+        self.device = device
+        self.max_speed_hz = max_speed_hz
+        self.oversample = max(1, int(oversample))
+        self.reduce = reduce
+        self.spi_factory = spi_factory
+        self.spi = None
+
+    def open(self):
+        spi = self.spi_factory()
+        spi.open(self.bus, self.device)
+        spi.max_speed_hz = self.max_speed_hz
+        self.spi = spi
+
+    def close(self):
+        if self.spi is not None:
+            try:
+                self.spi.close()
+            except OSError:
+                pass
+            self.spi = None
+
+    def _read_frame(self):
+        if self.spi is None:
+            self.open()
+        try:
+            return self.spi.readbytes(4)
+        except OSError:
+            # The handle may have gone bad (e.g. the bus was reset); reopen and retry once.
+            self.close()
+            self.open()
+            return self.spi.readbytes(4)
+
+    def read(self):
         """
-        Reads temperature from the MAX31855 sensor using spidev.
+        Reads `oversample` frames and reduces them to a single Reading.
 
         Returns:
-            float: Temperature in °F.
-        """
-        spi = spidev.SpiDev()
-        spi.open(SPI_BUS, SPI_DEVICE)
-        spi.max_speed_hz = 5000000  # Set SPI clock speed
-
-        # Read 4 bytes from the sensor
-        raw = spi.readbytes(4)
-        spi.close()
-
-        # Combine the 4 bytes into a single 32-bit integer
-        raw_data = (raw[0] << 24) | (raw[1] << 16) | (raw[2] << 8) | raw[3]
-        # The temperature data is in the top 14 bits (after shifting right by 18)
-        temp_raw = raw_data >> 18
-        # Check for negative temperature (if sign bit is set)
-        if temp_raw & 0x2000:
-            temp_raw -= 16384
-
-        # Convert raw data to Celsius (each bit is 0.25°C)
-        temp_c = temp_raw * 0.25
-        # Convert Celsius to Fahrenheit
-        temp_f = temp_c * 9.0 / 5.0 + 32.0
-        return temp_f
-
-
-    def read_temperature():
+            Reading: The reduced reading. If every frame faulted, the last fault is returned;
+            if the bus could not be read at all, the fault is FAULT_IO_ERROR.
         """
-        Returns the calibrated temperature reading in °F.
-        """
-        try:
-            temp_f = read_max31855()
-            return temp_f + CALIBRATION_OFFSET
-        except Exception as e:
-            print("Error reading temperature:", e)
-            return None
+        temps = []
+        internals = []
+        fault = None
+        for _ in range(self.oversample):
+            try:
+                reading = decode_max31855(self._read_frame())
+            except OSError:
+                self.close()
+                return Reading(None, None, FAULT_IO_ERROR)
+            internals.append(reading.internal)
+            if reading.fault is None:
+                temps.append(reading.temperature)
+            else:
+                fault = reading.fault
+        if not temps:
+            return Reading(None, internals[-1], fault)
+        if len(temps) == 1:
+            return Reading(temps[0], internals[0], None)
+        if self.reduce == "median":
+            return Reading(statistics.median(temps), statistics.median(internals), None)
+        return Reading(sum(temps) / len(temps), sum(internals) / len(internals), None)
+
+
+def default_spi_factory():
+    """
+    Opens the platform's SPI device. spidev is imported on the first sensor read rather
+    than at import time, so tools and the simulator never load it.
+    """
+    if sys.platform.startswith("linux"):
+        import spidev  # Raspberry Pi SPI library
+        return spidev.SpiDev()
+    # For non-Linux systems (e.g., Windows development), use a fake SPI device at 25°C (77°F).
+    return FakeSpiDev()
+
+
+sensor = MAX31855(spi_factory=default_spi_factory)
+
 
-else:
-    # For non-Linux systems (e.g., Windows development), use a mock sensor.
-    class MockMAX31855:
-        def read_temp_f(self):
-            return 77.0  # Dummy temperature for testing
+def open_sensor(bus=SPI_BUS, device=SPI_DEVICE, oversample=1, reduce="median", spi_factory=default_spi_factory):
+    """
+    Returns a new MAX31855 driver on the given SPI bus/chip select with its own read
+    settings, so every oven (or probe) keeps its oversampling however many are configured.
+    The module-level `sensor` is only for the standalone read functions below.
+    """
+    return MAX31855(bus, device, oversample=oversample, reduce=reduce, spi_factory=spi_factory)
 
 
-    mock_sensor = MockMAX31855()
+# -------------------------
+# Multiple Probes
+# -------------------------
+# One thermocouple of a ProbeArray.
+#   name          - label shown in the UI and stored with each cycle (e.g. "part", "air")
+#   bus, device   - SPI bus and chip select of its MAX31855
+#   offset, scale - per-probe calibration: calibrated = (raw - offset) / scale
+#   weight        - share in the fused control value; 0 records the probe without using it
+Probe = namedtuple("Probe", ["name", "bus", "device", "offset", "scale", "weight"])
 
+FUSION_MODES = ("weighted", "fallback")
 
-    def read_temperature():
+
+def parse_probes(entries, bus=SPI_BUS):
+    """
+    Builds Probes from config entries: dicts with `name` and `device` (chip select) and
+    optionally `bus`, `offset`, `scale` and `weight` (default 1).
+
+    Raises:
+        ValueError: If an entry is incomplete, two probes share a name or chip select, or
+            no probe has a positive weight.
+    """
+    probes = []
+    for entry in entries:
+        if "name" not in entry or "device" not in entry:
+            raise ValueError(f"Every probe needs a name and a device: {entry}")
+        probes.append(Probe(str(entry["name"]), int(entry.get("bus", bus)), int(entry["device"]),
+                            float(entry.get("offset", 0.0)), float(entry.get("scale", 1.0)),
+                            float(entry.get("weight", 1.0))))
+    if len({p.name for p in probes}) != len(probes):
+        raise ValueError("Probe names must be unique")
+    if len({(p.bus, p.device) for p in probes}) != len(probes):
+        raise ValueError("Two probes use the same chip select")
+    if not any(p.weight > 0 for p in probes):
+        raise ValueError("At least one probe needs a positive weight")
+    return probes
+
+
+class ProbeArray:
+    """
+    Several MAX31855s read as one sensor. Each read() scans every probe back-to-back through
+    its persistent SPI handle, calibrates each one and fuses them into the control value:
+
+        weighted - weighted mean of the probes that read successfully
+        fallback - the first probe (in configured order) that read successfully, e.g. the
+                   part probe with the air probe as fallback
+
+    Probes with weight 0 are recorded but never used for control. The fused Reading
+    carries the cold-junction temperature of the first probe that answered and the
+    per-probe Readings in `probes`; it only faults if every control probe did.
+    """
+
+    def __init__(self, probes, drivers, fusion="weighted"):
         """
-        Returns a mocked temperature reading in °F.
+        Args:
+            probes (list of Probe): The probes, in priority order for "fallback".
+            drivers (list of MAX31855): One driver per probe.
+            fusion (str): One of FUSION_MODES.
         """
-        return mock_sensor.read_temp_f() + CALIBRATION_OFFSET
+        if fusion not in FUSION_MODES:
+            raise ValueError(f"fusion must be one of {FUSION_MODES}")
+        self.probes = list(probes)
+        self.drivers = list(drivers)
+        self.fusion = fusion
+
+    @property
+    def names(self):
+        return [p.name for p in self.probes]
+
+    def fuse(self, readings):
+        """Returns (temperature, fault) of the control value for calibrated per-probe readings."""
+        used = [(p.weight, r) for p, r in zip(self.probes, readings) if p.weight > 0]
+        valid = [(w, r.temperature) for w, r in used if r.fault is None]
+        if not valid:
+            return None, next((r.fault for _, r in used if r.fault is not None), FAULT_IO_ERROR)
+        if self.fusion == "fallback":
+            return valid[0][1], None
+        return sum(w * t for w, t in valid) / sum(w for w, _ in valid), None
+
+    def read(self):
+        readings = []
+        for probe, driver in zip(self.probes, self.drivers):
+            reading = driver.read()
+            if reading.fault is None:
+                raw = reading.temperature + CALIBRATION_OFFSET
+                reading = reading._replace(temperature=(raw - probe.offset) / probe.scale)
+            else:
+                log.debug("Probe %s fault: %s", probe.name, reading.fault)
+            readings.append(reading)
+        temperature, fault = self.fuse(readings)
+        internal = next((r.internal for r in readings if r.internal is not None), None)
+        return Reading(temperature, internal, fault, tuple(readings))
+
+
+def open_probe_array(probes, fusion="weighted", spi_factory=None, oversample=1, reduce="median"):
+    """
+    Returns a ProbeArray over the given Probes, with a driver from open_sensor() per probe
+    (using `spi_factory` if given).
+    """
+    drivers = [open_sensor(probe.bus, probe.device, oversample, reduce, spi_factory or default_spi_factory)
+               for probe in probes]
+    return ProbeArray(probes, drivers, fusion)
+
+
+def read_max31855():
+    """
+    Reads temperature from the MAX31855 sensor.
+
+    Returns:
+        float: Temperature in °F, or None if the sensor reported a fault.
+    """
+    return sensor.read().temperature
+
+
+def read_sensor(device=None):
+    """
+    Returns the full Reading (temperature in °F with CALIBRATION_OFFSET applied, cold-junction
+    temperature and fault) from `device` (a MAX31855), by default the shared sensor.
+    """
+    reading = (device or sensor).read()
+    if reading.fault is not None:
+        log.debug("Temperature sensor fault: %s", reading.fault)
+        return reading
+    return reading._replace(temperature=reading.temperature + CALIBRATION_OFFSET)
+
+
+def read_temperature():
+    """
+    Returns the calibrated temperature reading in °F, or None on a sensor fault.
+    """
+    return read_sensor().temperature
+
+
+def benchmark(reads=10000, oversample=1):
+    """Times `reads` driver reads against FakeSpiDev and returns reads per second."""
+    fake = MAX31855(spi_factory=FakeSpiDev, oversample=oversample)
+    start = time.perf_counter()
+    for _ in range(reads):
+        fake.read()
+    return reads / (time.perf_counter() - start)
+
 
 if __name__ == '__main__':
+    if "--bench" in sys.argv:
+        print("Fake driver: {:.0f} reads/s".format(benchmark()))
+        sys.exit(0)
     print("Starting temperature sensor read loop. Press Ctrl+C to exit.")
     try:
         while True:
-            temperature = read_temperature()
-            if temperature is not None:
-                print("Current Temperature: {:.2f} °F".format(temperature))
+            reading = read_sensor()
+            if reading.fault is None:
+                print("Current Temperature: {:.2f} °F".format(reading.temperature))
             else:
-                print("Temperature reading failed.")
+                print("Temperature reading failed: {}".format(reading.fault))
             time.sleep(1)
     except KeyboardInterrupt:
         print("\nExiting temperature sensor read loop.")
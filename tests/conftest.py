@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    """A connection to a fresh database with the current schema."""
+    import db
+
+    monkeypatch.setattr(db, "DB_FILE", str(tmp_path / "oven_data.db"))
+    db.init_db()
+    connection = db.get_db()
+    yield connection
+    connection.close()
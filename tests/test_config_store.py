@@ -0,0 +1,34 @@
+import json
+import os
+
+import pytest
+
+from config_store import ConfigStore
+
+
+def test_flush_writes_nested_values(tmp_path):
+    path = str(tmp_path / "config.json")
+    store = ConfigStore(path, defaults={"pid_tunings": [1.0, 0.1, 0.05]})
+    store["pid_tunings"][0] = 2.0
+    store.save(immediate=True)
+    with open(path) as f:
+        assert json.load(f)["pid_tunings"] == [2.0, 0.1, 0.05]
+    assert not os.path.exists(path + ".tmp")
+
+
+def test_failed_write_keeps_the_store_dirty(tmp_path, monkeypatch):
+    path = str(tmp_path / "config.json")
+    store = ConfigStore(path, defaults={"target_temperature": 350}, debounce=60)
+    store["target_temperature"] = 400
+    store.save()
+
+    def fail(src, dst):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(os, "replace", fail)
+    with pytest.raises(OSError):
+        store.flush()
+    monkeypatch.undo()
+    store.close()
+    with open(path) as f:
+        assert json.load(f)["target_temperature"] == 400
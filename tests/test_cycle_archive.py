@@ -0,0 +1,72 @@
+import struct
+import zlib
+
+import numpy as np
+
+import cycle_archive
+from temperature_sensor import RESOLUTION_F
+
+
+def make_cycle(n=600, probes=0, seed=0):
+    rng = np.random.default_rng(seed)
+    ts = 1_700_000_000_000 + np.cumsum(rng.integers(990, 1010, n))
+    temperature = np.round(70.0 + np.cumsum(rng.normal(0.4, 0.3, n)), 2)
+    set_temperature = np.round(np.minimum(70.0 + np.arange(n) * 0.37, 350.0), 2)
+    duty = np.round(rng.uniform(0, 100, n), 2)
+    duty[::7] = np.nan
+    segment = np.repeat([np.nan, 0, 1, 2], n // 4).astype(float)
+    probe_temps = None
+    if probes:
+        probe_temps = temperature[:, None] + rng.normal(0, 2, (n, probes))
+        probe_temps[5:9, 0] = np.nan
+        probe_temps[-1, -1] = np.nan
+    return ts, temperature, set_temperature, duty, segment, probe_temps
+
+
+def test_round_trip_keeps_readings_within_the_quantization():
+    ts, temperature, set_temperature, duty, segment, _ = make_cycle()
+    data = cycle_archive.decode(cycle_archive.encode(ts, temperature, set_temperature, duty, segment))
+    np.testing.assert_array_equal(data.ts, ts)
+    assert np.max(np.abs(data.temperature - temperature)) <= RESOLUTION_F / 2 + 1e-9
+    np.testing.assert_allclose(data.set_temperature, set_temperature, atol=cycle_archive.SETPOINT_QUANTUM / 2)
+    np.testing.assert_array_equal(np.isnan(data.duty), np.isnan(duty))
+    np.testing.assert_allclose(data.duty, duty, atol=cycle_archive.DUTY_QUANTUM / 2)
+    np.testing.assert_array_equal(data.segment, segment)
+    assert data.probes.shape == (len(ts), 0)
+
+
+def test_round_trip_without_duty_or_segment():
+    ts, temperature, set_temperature, *_ = make_cycle(n=10)
+    data = cycle_archive.decode(cycle_archive.encode(ts, temperature, set_temperature))
+    assert np.all(np.isnan(data.duty)) and np.all(np.isnan(data.segment))
+
+
+def test_round_trip_of_probe_columns_keeps_faults():
+    ts, temperature, set_temperature, duty, segment, probes = make_cycle(probes=3)
+    data = cycle_archive.decode(cycle_archive.encode(ts, temperature, set_temperature, duty, segment, probes))
+    assert data.probes.shape == probes.shape
+    np.testing.assert_array_equal(np.isnan(data.probes), np.isnan(probes))
+    ok = ~np.isnan(probes)
+    assert np.max(np.abs(data.probes[ok] - probes[ok])) <= RESOLUTION_F / 2 + 1e-9
+
+
+def test_empty_cycle():
+    data = cycle_archive.decode(cycle_archive.encode([], [], []))
+    assert len(data.ts) == 0 and data.probes.shape == (0, 0)
+
+
+def test_decodes_version_1_blobs():
+    ts = np.array([1000, 2000, 3500], dtype=np.int64)
+    temp_delta = np.array([156, 1, -2], dtype=np.int32)  # 156, 157, 155 sensor steps
+    duty_q = np.array([0, 5000, cycle_archive.DUTY_NULL], dtype=np.uint16)
+    columns = [np.diff(ts, prepend=ts[0]).astype(np.int32), temp_delta, duty_q,
+               np.array([35000], np.int32), np.array([3], np.uint32),
+               np.array([-1], np.int32), np.array([3], np.uint32)]
+    body = b"".join(cycle_archive._shuffle(c) for c in columns)
+    blob = struct.pack("<BIqII", 1, 3, 1000, 1, 1) + zlib.compress(body)
+    data = cycle_archive.decode(blob)
+    np.testing.assert_array_equal(data.ts, ts)
+    np.testing.assert_allclose(data.temperature, np.array([156, 157, 155]) * RESOLUTION_F)
+    np.testing.assert_array_equal(data.duty, [0.0, 50.0, np.nan])
+    np.testing.assert_array_equal(data.set_temperature, [350.0] * 3)
+    assert np.all(np.isnan(data.segment)) and data.probes.shape == (3, 0)
@@ -0,0 +1,107 @@
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+import db
+
+# schema.sql as it was before user_version was tracked (version 0).
+SCHEMA_V0 = """
+CREATE TABLE cycles (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    start_time DATETIME NOT NULL,
+    end_time DATETIME,
+    notes TEXT
+);
+CREATE TABLE readings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    cycle_id INTEGER NOT NULL,
+    timestamp DATETIME NOT NULL,
+    temperature REAL NOT NULL,
+    set_temperature REAL NOT NULL,
+    FOREIGN KEY (cycle_id) REFERENCES cycles(id)
+);
+"""
+
+# The rollups table of version 3, keyed by time alone.
+ROLLUPS_V3 = """
+CREATE TABLE rollups (
+    resolution INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    temp_min REAL NOT NULL,
+    temp_max REAL NOT NULL,
+    temp_sum REAL NOT NULL,
+    err_min REAL NOT NULL,
+    err_max REAL NOT NULL,
+    err_sum REAL NOT NULL,
+    PRIMARY KEY (resolution, bucket)
+);
+"""
+
+TIMESTAMPS = [datetime(2024, 3, 9, 14, 0, 0), datetime(2024, 3, 9, 14, 0, 1, 500000)]
+
+
+@pytest.fixture
+def db_file(tmp_path, monkeypatch):
+    path = str(tmp_path / "oven_data.db")
+    monkeypatch.setattr(db, "DB_FILE", path)
+    return path
+
+
+def create_v0(path):
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA_V0)
+    conn.execute("INSERT INTO cycles (start_time) VALUES (?)", (TIMESTAMPS[0],))
+    conn.executemany("INSERT INTO readings (cycle_id, timestamp, temperature, set_temperature) VALUES (1, ?, ?, ?)",
+                     [(ts, 70.0 + i, 350.0) for i, ts in enumerate(TIMESTAMPS)])
+    conn.commit()
+    return conn
+
+
+def columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def test_migrates_a_version_0_database_and_backfills_ts(db_file):
+    create_v0(db_file).close()
+    assert db.init_db() is True
+    conn = db.get_db()
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == db.SCHEMA_VERSION
+    assert {"ts", "duty", "segment", "oven_id", "probes"} <= columns(conn, "readings")
+    assert {"profile_id", "oven_id", "probes"} <= columns(conn, "cycles")
+    rows = conn.execute("SELECT ts, temperature, duty, segment, oven_id, probes FROM readings ORDER BY id").fetchall()
+    assert [r["ts"] for r in rows] == [round(ts.timestamp() * 1000) for ts in TIMESTAMPS]
+    assert [r["temperature"] for r in rows] == [70.0, 71.0]
+    assert all(r["oven_id"] == 1 and r["duty"] is None and r["segment"] is None and r["probes"] is None
+               for r in rows)
+    assert conn.execute("SELECT oven_id FROM cycles").fetchone()[0] == 1
+    # The indexes and tables added since version 0 come from schema.sql.
+    names = {row[0] for row in conn.execute("SELECT name FROM sqlite_master")}
+    assert {"idx_readings_cycle_ts", "idx_cycles_oven", "cycle_archive", "rollups", "profiles"} <= names
+    conn.close()
+
+
+def test_moves_version_3_rollups_to_oven_1(db_file):
+    conn = create_v0(db_file)
+    conn.row_factory = sqlite3.Row
+    for target in (1, 2, 3):
+        db.MIGRATIONS[target](conn)
+    conn.executescript(ROLLUPS_V3)
+    conn.execute("INSERT INTO rollups VALUES (60, 1710000000, 2, 70.0, 71.0, 141.0, -280.0, -279.0, -559.0)")
+    conn.execute("PRAGMA user_version = 3")
+    conn.commit()
+    conn.close()
+
+    assert db.init_db() is True
+    conn = db.get_db()
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == db.SCHEMA_VERSION
+    assert tuple(conn.execute("SELECT * FROM rollups").fetchone()) == (
+        1, 60, 1710000000, 2, 70.0, 71.0, 141.0, -280.0, -279.0, -559.0)
+    assert not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'rollups_v3'").fetchone()
+    conn.close()
+
+
+def test_current_database_is_left_alone(conn):
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == db.SCHEMA_VERSION
+    assert db.init_db() is False
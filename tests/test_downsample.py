@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+import downsample
+
+
+@pytest.mark.parametrize("n, n_out", [(1000, 300), (1440, 300), (128, 50), (101, 10)])
+def test_minmax_keeps_extremes_when_n_is_not_a_multiple_of_the_buckets(n, n_out):
+    y = np.random.default_rng(n).normal(350.0, 5.0, n)
+    idx = downsample.minmax_indices(y, n_out)
+    assert idx[0] == 0 and idx[-1] == n - 1
+    assert np.all(np.diff(idx) > 0)
+    assert len(idx) <= n_out + 2
+    assert y.argmin() in idx and y.argmax() in idx
+    # Every bucket contributes its own minimum and maximum.
+    edges = np.linspace(0, n, n_out // 2 + 1).astype(int)
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        bucket = np.arange(lo, hi)
+        assert bucket[y[bucket].argmin()] in idx
+        assert bucket[y[bucket].argmax()] in idx
+
+
+def test_minmax_skips_failed_reads():
+    y = np.full(50, np.nan)
+    y[3], y[30] = 1.0, 2.0
+    assert list(downsample.minmax_indices(y, 10)) == [0, 3, 30, 49]
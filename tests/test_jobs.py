@@ -0,0 +1,33 @@
+import threading
+
+import pytest
+
+from jobs import JobConflict, JobRunner
+
+
+def test_exclusive_submits_race_to_a_single_job():
+    runner = JobRunner()
+    release = threading.Event()
+    started, conflicts = [], []
+    barrier = threading.Barrier(8)
+
+    def submit():
+        barrier.wait()
+        try:
+            started.append(runner.submit("autotune-relay-1", lambda job: release.wait(5),
+                                         exclusive={"autotune-relay-1", "test-pwm-1"}))
+        except JobConflict as e:
+            conflicts.append(e)
+
+    threads = [threading.Thread(target=submit) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(started) == 1 and len(conflicts) == 7
+    assert all(e.job is started[0] for e in conflicts)
+    with pytest.raises(JobConflict):
+        runner.submit("test-pwm-1", lambda job: None, exclusive={"autotune-relay-1", "test-pwm-1"})
+    # Other ovens' jobs are not affected.
+    runner.submit("test-pwm-2", lambda job: None, exclusive={"test-pwm-2"})
+    release.set()
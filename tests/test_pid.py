@@ -0,0 +1,21 @@
+import numpy as np
+
+from pid import pid_step
+
+
+def test_zero_dt_does_not_divide_by_zero():
+    duty, integral = pid_step(5.0, 4.0, 0.0, 0.0, 1.0, 0.1, 0.05)
+    assert duty == pid_step(5.0, 4.0, 0.0, 1.0, 1.0, 0.1, 0.05)[0]
+    assert integral == 5.0
+
+
+def test_back_to_back_ticks_skip_the_derivative_kick():
+    # A catch-up tick 1 ms after the last one: only P and I act.
+    duty, _ = pid_step(5.0, 0.0, 0.0, 0.001, 1.0, 0.0, 10.0)
+    assert duty == 5.0
+
+
+def test_vectorized_candidates():
+    kd = np.array([0.0, 1.0])
+    duty, _ = pid_step(np.full(2, 5.0), np.full(2, 4.0), np.zeros(2), 1.0, 1.0, 0.0, kd, clip=np.clip)
+    assert list(duty) == [5.0, 6.0]
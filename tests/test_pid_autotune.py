@@ -0,0 +1,21 @@
+import pytest
+
+from pid_autotune import auto_tune_pid
+
+
+class ManualClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_relay_test_without_oscillation_fails():
+    outputs = []
+    with pytest.raises(ValueError, match="Not enough oscillation"):
+        auto_tune_pid(read_temperature=lambda: 300.0, set_output=outputs.append, clock=ManualClock())
+    assert outputs[-1] == 0
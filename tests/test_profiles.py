@@ -0,0 +1,30 @@
+import pytest
+
+import profiles
+
+
+def test_parse_segments():
+    segments = profiles.parse_segments([
+        {"kind": "ramp", "target": "400", "rate": "10"},
+        {"kind": "soak", "duration_s": 600},
+    ])
+    assert segments[0] == profiles.Segment("ramp", 400.0, 10.0, None, None)
+    assert segments[1].duration_s == 600.0
+    assert segments[1].band == profiles.DEFAULT_SOAK_BAND
+
+
+@pytest.mark.parametrize("duration", [0, -60, "0"])
+def test_soak_duration_must_be_positive(duration):
+    with pytest.raises(ValueError, match="Segment 2: duration_s must be positive"):
+        profiles.parse_segments([{"kind": "ramp", "target": 400}, {"kind": "soak", "duration_s": duration}])
+
+
+def test_replacing_an_unknown_profile_writes_nothing(conn):
+    segments = profiles.parse_segments([{"kind": "soak", "target": 400, "duration_s": 600}])
+    with pytest.raises(profiles.ProfileNotFound):
+        profiles.save_profile(conn, "Missing", segments, profile_id=999)
+    assert conn.execute("SELECT COUNT(*) FROM profile_segments").fetchone()[0] == 0
+
+    profile_id = profiles.save_profile(conn, "Cure", segments)
+    assert profiles.save_profile(conn, "Cure 2", segments, profile_id=profile_id) == profile_id
+    assert profiles.load_profile(conn, profile_id)[0] == "Cure 2"
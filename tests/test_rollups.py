@@ -0,0 +1,90 @@
+import pytest
+
+import rollups
+
+T0 = 1_699_999_200  # epoch seconds, on an hour boundary
+
+
+def readings(oven_id, seconds, every):
+    """One reading every `every` seconds: a slow ramp against a flat 300 °F setpoint."""
+    return [(oven_id, (T0 + s) * 1000, 300.0 + (s % 977) / 10, 300.0) for s in range(0, seconds, every)]
+
+
+def expected(rows, step):
+    """Buckets `step` seconds wide computed straight from the readings."""
+    buckets = {}
+    for _, ts, temperature, set_temperature in rows:
+        buckets.setdefault(ts // 1000 // step * step, []).append((temperature, temperature - set_temperature))
+    return [{
+        "x": b * 1000, "count": len(v),
+        "temp_min": min(t for t, _ in v), "temp_max": max(t for t, _ in v),
+        "temp_mean": sum(t for t, _ in v) / len(v),
+        "err_min": min(e for _, e in v), "err_max": max(e for _, e in v),
+        "err_mean": sum(e for _, e in v) / len(v),
+    } for b, v in sorted(buckets.items())]
+
+
+def assert_rows(actual, wanted):
+    assert len(actual) == len(wanted)
+    for a, w in zip(actual, wanted):
+        assert a == pytest.approx(w)
+
+
+@pytest.mark.parametrize("tiers, step, resolution", [
+    ((60,), 3600, 60), ((3600,), 3600, 3600), ((60, 3600), 7200, 3600), ((60, 3600), 600, 60)])
+def test_choose_tier(tiers, step, resolution):
+    assert rollups.choose_tier(step, tiers) == resolution
+
+
+def test_choose_tier_falls_back_to_the_finest():
+    assert rollups.choose_tier(5) == min(rollups.TIERS)
+
+
+def test_short_range_reads_the_minute_tier(conn):
+    data = readings(1, 2 * 3600, 1)
+    rollups.add_readings(conn, data)
+    resolution, step, rows = rollups.query(conn, T0 * 1000, (T0 + 2 * 3600) * 1000, points=300)
+    assert (resolution, step) == (60, 60)
+    assert_rows(rows, expected(data, 60))
+
+
+def test_minute_buckets_are_merged_up_to_the_requested_points(conn):
+    data = readings(1, 2 * 3600, 1)
+    rollups.add_readings(conn, data)
+    resolution, step, rows = rollups.query(conn, T0 * 1000, (T0 + 2 * 3600) * 1000, points=10)
+    assert (resolution, step) == (60, 720)
+    assert [r["count"] for r in rows] == [720] * 10
+    assert_rows(rows, expected(data, 720))
+
+
+def test_long_range_merges_hour_buckets(conn):
+    days = 10
+    data = readings(1, days * 86400, 600)
+    rollups.add_readings(conn, data)
+    resolution, step, rows = rollups.query(conn, T0 * 1000, (T0 + days * 86400) * 1000, points=100)
+    assert (resolution, step) == (3600, 10800)
+    assert len(rows) <= 100
+    assert_rows(rows, expected(data, 10800))
+
+
+def test_batches_fold_into_the_same_buckets(conn):
+    data = readings(1, 3 * 3600, 7)
+    for i in range(0, len(data), 100):
+        rollups.add_readings(conn, data[i:i + 100])
+    for resolution in rollups.TIERS:
+        rows = conn.execute("""
+            SELECT bucket * 1000, count, temp_min, temp_max, temp_sum / count, err_min, err_max, err_sum / count
+            FROM rollups WHERE resolution = ? ORDER BY bucket
+        """, (resolution,)).fetchall()
+        keys = ["x", "count", "temp_min", "temp_max", "temp_mean", "err_min", "err_max", "err_mean"]
+        assert_rows([dict(zip(keys, r)) for r in rows], expected(data, resolution))
+
+
+def test_query_is_per_oven_and_includes_the_bucket_the_range_starts_in(conn):
+    rollups.add_readings(conn, readings(1, 3600, 10) + readings(2, 3600, 5))
+    start = (T0 + 90) * 1000  # in the middle of the second minute
+    _, step, rows = rollups.query(conn, start, (T0 + 3600) * 1000, points=1000, oven_id=2)
+    assert step == 60
+    assert rows[0]["x"] == (T0 + 60) * 1000
+    assert all(r["count"] == 12 for r in rows)
+    assert len(rows) == 59
@@ -0,0 +1,72 @@
+import pytest
+
+from scheduler import DeadlineScheduler
+
+
+class FakeClock:
+    """Monotonic clock that only advances when slept on or when a loop body 'runs'."""
+
+    def __init__(self):
+        self.now_ns = 0
+
+    def monotonic_ns(self):
+        return self.now_ns
+
+    def sleep(self, seconds):
+        self.now_ns += int(round(seconds * 1e9))
+
+    def work(self, seconds):
+        self.sleep(seconds)
+
+
+def run(scheduler, clock, bodies):
+    """Runs one tick per body duration and returns (time of tick, dt, lateness) for each."""
+    ticks = []
+    for body in bodies:
+        dt, lateness = scheduler.wait()
+        ticks.append((clock.now_ns / 1e9, round(dt, 6), round(lateness, 6)))
+        clock.work(body)
+    return ticks
+
+
+def test_ticks_on_the_deadline_grid_without_drift():
+    clock = FakeClock()
+    scheduler = DeadlineScheduler(1.0, clock=clock)
+    ticks = run(scheduler, clock, [0.2, 0.7, 0.05, 0.99])
+    assert ticks == [(0.0, 1.0, 0.0), (1.0, 1.0, 0.0), (2.0, 1.0, 0.0), (3.0, 1.0, 0.0)]
+    assert scheduler.missed == 0 and scheduler.ticks == 4
+
+
+def test_skip_drops_missed_deadlines_and_stays_on_the_grid():
+    clock = FakeClock()
+    scheduler = DeadlineScheduler(1.0, clock=clock, overrun="skip")
+    ticks = run(scheduler, clock, [0.2, 3.5, 0.1, 0.1])
+    # The 3.5 s body misses the deadlines at 2 and 3 s; the next tick runs at once,
+    # 0.5 s after the 4 s deadline, and the one after that is back on time at 5 s.
+    assert ticks == [(0.0, 1.0, 0.0), (1.0, 1.0, 0.0), (4.5, 3.5, 0.5), (5.0, 0.5, 0.0)]
+    assert scheduler.skipped == 2 and scheduler.late == 0
+
+
+def test_catchup_runs_missed_deadlines_back_to_back():
+    clock = FakeClock()
+    scheduler = DeadlineScheduler(1.0, clock=clock, overrun="catchup")
+    ticks = run(scheduler, clock, [0.2, 3.5, 0.0, 0.0, 0.0, 0.0])
+    # The deadlines at 2, 3 and 4 s all run at 4.5 s; only 2 and 3 s were a whole period
+    # behind and count as late. The tick at 5 s is back on time.
+    assert ticks == [(0.0, 1.0, 0.0), (1.0, 1.0, 0.0), (4.5, 3.5, 2.5), (4.5, 0.0, 1.5), (4.5, 0.0, 0.5),
+                     (5.0, 0.5, 0.0)]
+    assert scheduler.late == 2 and scheduler.skipped == 0
+
+
+def test_catchup_skips_what_is_left_after_max_catchup():
+    clock = FakeClock()
+    scheduler = DeadlineScheduler(1.0, clock=clock, overrun="catchup", max_catchup=3)
+    ticks = run(scheduler, clock, [0.0, 10.0, 0.0, 0.0, 0.0, 0.0, 0.0])
+    assert [lateness for _, _, lateness in ticks] == [0.0, 0.0, 9.0, 8.0, 7.0, 0.0, 0.0]
+    assert ticks[-1][0] == 12.0
+    assert scheduler.late == 3 and scheduler.skipped == 6
+
+
+def test_rejects_unknown_overrun_policy():
+    with pytest.raises(ValueError):
+        DeadlineScheduler(1.0, overrun="drop")
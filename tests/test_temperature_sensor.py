@@ -0,0 +1,12 @@
+import temperature_sensor
+from temperature_sensor import FakeSpiDev
+
+
+def test_each_oven_gets_its_own_driver_settings():
+    first = temperature_sensor.open_sensor(0, 0, oversample=4, reduce="mean", spi_factory=FakeSpiDev)
+    second = temperature_sensor.open_sensor(0, 0, spi_factory=FakeSpiDev)
+    assert first is not second
+    assert (first.oversample, first.reduce) == (4, "mean")
+    assert (second.oversample, second.reduce) == (1, "median")
+    assert temperature_sensor.sensor.oversample == 1
+    assert first.read().fault is None